@@ -1,10 +1,21 @@
-from fastapi import FastAPI
-from pydantic import BaseModel
+from fastapi import FastAPI, HTTPException, Response
+from pydantic import BaseModel, Field
 import joblib
+import json
+import os
+import threading
+import time
 import pandas as pd
 import uvicorn
+from pathlib import Path
 from src.etl.build_features import preprocess_input  # Import preprocessing
-from typing import Dict, Any
+from src.features.online_store import LagFeatures, OnlineFeatureStore, store_exists
+from src.features.serving_bundle import load_sources
+from src.features.serving_index import ServingIndex
+from src.models.recursive_forecast import RecursiveForecaster
+from src.models.registry import RegistryWatcher, current_version, list_versions, load_version
+from src.api.metrics import Metrics
+from typing import Dict, Any, List, Optional
 from starlette.responses import JSONResponse
 
 # Initialize FastAPI app
@@ -12,7 +23,24 @@ app = FastAPI(title="Retail Sales Forecasting API", version="1.0")
 
 # Load model & preprocessing info
 MODEL_PATH = "models/baseline_lightgbm.joblib"
-model = joblib.load(MODEL_PATH)
+FEATURE_PATH = "models/feature_columns.json"
+CAT_PATH = "models/cat_mappings.json"
+DATA_RAW = Path(__file__).resolve().parent / "data" / "raw"
+DATA_PROCESSED = Path(__file__).resolve().parent / "data" / "processed"
+
+# Online feature store (python -m src.features.online_store): with it, /predict and /predict_batch score
+# the lag model on its real lag / rolling features instead of the placeholder preprocess_input columns
+FEATURE_STORE_DIR = Path(os.environ.get("FEATURE_STORE_DIR", Path(__file__).resolve().parent / "data" / "feature_store"))
+feature_store = OnlineFeatureStore.load(FEATURE_STORE_DIR) if store_exists(FEATURE_STORE_DIR) else None
+
+# Model registry (python -m src.models.registry): lag/CURRENT, when set, is served instead of MODEL_PATH;
+# promoting another version swaps it in within REGISTRY_POLL_S (0: only on POST /registry/reload)
+MODEL_REGISTRY_DIR = Path(os.environ.get("MODEL_REGISTRY_DIR", "models/registry"))
+REGISTRY_POLL_S = float(os.environ.get("REGISTRY_POLL_S", "10"))
+
+# Request metrics on GET /metrics (Prometheus text); SERVER_TIMING=1 adds a per-stage Server-Timing header
+SERVER_TIMING = os.environ.get("SERVER_TIMING", "0") == "1"
+metrics = Metrics("lag")
 
 # Example: Categorical encoding info (if needed later)
 # We could store these during training for reproducibility
@@ -25,6 +53,129 @@ class PredictionRequest(BaseModel):
     features: Dict[str, Any]
 
 
+class BatchPredictionRequest(BaseModel):
+    rows: List[Dict[str, Any]]  # many {"store_id", "item_id", "date"} rows scored in one call
+
+
+class ForecastRequest(BaseModel):
+    ids: Optional[List[str]] = None  # series ids like "FOODS_1_001_CA_1_validation"; omit for every series
+    horizon: int = Field(28, ge=1)  # days after the last sales day
+
+
+class LagModel:
+    """
+    One lag model version. /predict and /forecast read `active` once, so a
+    hot swap is a single assignment and running requests keep their version.
+    """
+
+    def __init__(self, model, model_path, feature_path, cat_path, version: Optional[str] = None,
+                 index: Optional[ServingIndex] = None):
+        self.model = model
+        self.model_path = model_path
+        self.feature_path = feature_path
+        self.cat_path = cat_path
+        self.version = version
+        self._index = index  # registry bundles bring their own; otherwise built from data/ on first use
+        self._forecaster = None
+        self._features = None
+        self._no_tables = False  # category levels missing: /predict keeps the preprocess_input path
+        self._lock = threading.Lock()
+
+    def forecaster(self) -> RecursiveForecaster:
+        # Recursive multi-day forecaster (lag features from the sales history), built on first use
+        with self._lock:
+            if self._forecaster is None:
+                # needs models/cat_mappings.json from train_model.py (or the registry version's copy)
+                self._forecaster = RecursiveForecaster.from_files(self.model_path, self.feature_path, self.cat_path)
+        return self._forecaster
+
+    def features(self) -> LagFeatures:
+        """Request rows for this version: a ServingIndex with its category levels plus the online store."""
+        with self._lock:
+            if self._features is None:
+                with open(self.feature_path, "r", encoding="utf-8") as f:
+                    train_cols = json.load(f)
+                with open(self.cat_path, "r", encoding="utf-8") as f:
+                    cat_maps = json.load(f)
+                index = self._index or ServingIndex.build(*load_sources(DATA_RAW, DATA_PROCESSED), cat_maps)
+                self._features = LagFeatures(feature_store, index, train_cols, cat_maps)
+                if self._features.missing:
+                    print(f"[startup] Feature store has no {self._features.missing}; those features are -1")
+        return self._features
+
+    def lag_ready(self) -> bool:
+        """Whether requests can be scored with lag_features: store built and this version's category levels present."""
+        if feature_store is None or self._no_tables:
+            return False
+        try:
+            self.features()
+        except FileNotFoundError as e:
+            self._no_tables = True
+            print(f"[startup] Lag features unavailable for {self.version or MODEL_PATH} ({e}); "
+                  f"/predict uses preprocess_input and /predict_batch returns 503")
+            return False
+        return True
+
+
+def load_model(version: Optional[str] = None) -> LagModel:
+    if version is None:
+        return LagModel(joblib.load(MODEL_PATH), MODEL_PATH, FEATURE_PATH, CAT_PATH)
+    loaded = load_version("lag", version, MODEL_REGISTRY_DIR)
+    path = loaded["path"]
+    return LagModel(loaded["model"], path / "model.joblib", path / "feature_columns.json",
+                    path / "cat_mappings.json", f"lag/{version}", loaded["index"])
+
+
+def lag_features(raw_df: pd.DataFrame, serving: LagModel, timer=None) -> pd.DataFrame:
+    """
+    Lag model rows for raw {"store_id", "item_id", "date"} requests (see LagFeatures).
+    Dates the online store doesn't cover are a 400: /forecast predicts further ahead.
+    """
+    f = serving.features()
+    store_ids = raw_df["store_id"] if "store_id" in raw_df.columns else [None] * len(raw_df)
+    try:
+        X = f.transform(store_ids, raw_df["item_id"], raw_df["date"], timer)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=f"{e}; use /forecast for later days")
+    return pd.DataFrame(X, columns=f.train_cols)
+
+
+def activate(version: str) -> None:
+    """RegistryWatcher callback: load the version next to the running one, then swap it in."""
+    global active
+    t = time.perf_counter()
+    new = load_model(version)
+    if active._forecaster is not None:
+        new.forecaster()  # warm, so the first /forecast after the swap is not a cold build
+    if active._features is not None:
+        new.lag_ready()
+    previous, active = active, new
+    print(f"[registry] Swapped {previous.version or MODEL_PATH} -> {new.version} in {time.perf_counter() - t:.2f}s")
+
+
+_startup_version = current_version("lag", MODEL_REGISTRY_DIR)
+active = load_model(_startup_version)
+watcher = RegistryWatcher("lag", activate, _startup_version, MODEL_REGISTRY_DIR, REGISTRY_POLL_S)
+
+
+@app.on_event("startup")
+def start_watcher():
+    if feature_store is not None:
+        t = time.perf_counter()
+        if active.lag_ready():
+            print(f"[startup] Online feature store {FEATURE_STORE_DIR} ({len(feature_store.ids)} series, "
+                  f"{feature_store.date_of(feature_store.first_day)}..{feature_store.date_of(feature_store.end_day)}, "
+                  f"{feature_store.end_day - feature_store.last_day} days past the ETL) ready in "
+                  f"{time.perf_counter() - t:.2f}s")
+    if REGISTRY_POLL_S > 0:
+        watcher.start()
+
+
+@app.on_event("shutdown")
+def stop_watcher():
+    watcher.stop()
+
+
 # Root endpoint
 @app.get("/")
 def read_root():
@@ -46,9 +197,24 @@ def debug_preprocess(request: PredictionRequest):
 
 # Prediction endpoint
 @app.post("/predict")
-def predict(request: PredictionRequest):
+def predict(request: PredictionRequest, response: Response):
+    timer = metrics.timer("predict")
+    try:
+        out = _predict(request, timer)
+    except Exception as e:
+        timer.finish(1, e)
+        raise
+    timer.finish(1)
+    if SERVER_TIMING:
+        response.headers["Server-Timing"] = timer.server_timing()
+    return out
+
+
+def _predict(request: PredictionRequest, timer):
+    serving = active  # one version for the whole request, even if a swap lands meanwhile
     # Convert input to DataFrame
     input_df = pd.DataFrame([request.features])
+    timer.mark("parse")
 
     # # Apply same preprocessing steps as training
     # for col in input_df.select_dtypes(include=["object"]).columns:
@@ -57,10 +223,13 @@ def predict(request: PredictionRequest):
     # if "date" in input_df.columns:
     #     input_df["date"] = pd.to_datetime(input_df["date"]).astype("int64") // 10**9
 
-    # Apply preprocessing
-    processed_df = preprocess_input(input_df)
-
-    print(processed_df.columns.tolist())
+    # Apply preprocessing: real lag features from the online store when it is built
+    missing = []
+    if serving.lag_ready():
+        processed_df = lag_features(input_df, serving, timer)
+        missing = serving.features().missing_features(input_df["date"])
+    else:
+        processed_df = preprocess_input(input_df, timer)
 
 
     # # Make prediction
@@ -69,8 +238,104 @@ def predict(request: PredictionRequest):
     # return {"prediction": float(prediction)}
 
     # Make prediction
-    prediction = model.predict(processed_df)
-    return {"prediction": prediction.tolist()}
+    prediction = serving.model.predict(processed_df)
+    timer.mark("model")
+    out = {"prediction": prediction.tolist()}
+    if missing:
+        out["missing_features"] = missing  # window features not known that far past the ETL, scored as NaN
+    return out
+
+
+# Batched predictions (needs the online feature store)
+@app.post("/predict_batch")
+def predict_batch(request: BatchPredictionRequest, response: Response):
+    serving = active
+    if not serving.lag_ready():
+        raise HTTPException(status_code=503, detail="Batch scoring needs the online feature store "
+                                                    "(python -m src.features.online_store) and the model's "
+                                                    "category levels (models/cat_mappings.json from train_model.py)")
+    if not request.rows:
+        return {"predictions": []}
+    timer = metrics.timer("predict_batch")
+    try:
+        raw_df = pd.DataFrame(request.rows)
+        missing = [c for c in ("store_id", "item_id", "date") if c not in raw_df.columns or raw_df[c].isna().any()]
+        if missing:
+            raise HTTPException(status_code=400, detail=f"Every row needs {missing}")
+        timer.mark("parse")
+        preds = serving.model.predict(lag_features(raw_df, serving, timer))
+        timer.mark("model")
+        out = {"predictions": preds.round(4).tolist()}
+        missing = serving.features().missing_features(raw_df["date"])
+        if missing:
+            out["missing_features"] = missing
+        timer.mark("serialize")
+    except Exception as e:
+        timer.finish(len(request.rows), e)
+        raise
+    timer.finish(len(request.rows))
+    if SERVER_TIMING:
+        response.headers["Server-Timing"] = timer.server_timing()
+    return out
+
+# Multi-day forecast endpoint
+@app.post("/forecast")
+def forecast(request: ForecastRequest, response: Response):
+    timer = metrics.timer("forecast")
+    try:
+        out, rows = _forecast(request, timer)
+    except Exception as e:
+        timer.finish(len(request.ids or []) or None, e)
+        raise
+    timer.finish(rows)
+    if SERVER_TIMING:
+        response.headers["Server-Timing"] = timer.server_timing()
+    return out
+
+
+def _forecast(request: ForecastRequest, timer):
+    try:
+        f = active.forecaster()
+    except FileNotFoundError as e:
+        raise HTTPException(status_code=503, detail=f"Forecasting unavailable: {e}")
+    timer.mark("load")
+    ids = request.ids if request.ids is not None else f.ids
+    unknown = [i for i in ids if i not in f.row_of]
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"Unknown series ids: {unknown[:10]}")
+    try:
+        preds = f.forecast(request.horizon, ids)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    timer.mark("model")
+    out = {"dates": f.dates(request.horizon), "forecasts": dict(zip(ids, preds.round(4).tolist()))}
+    timer.mark("serialize")
+    return out, len(ids)
+
+
+@app.get("/metrics")
+def prometheus_metrics():
+    return Response(metrics.render(), media_type="text/plain; version=0.0.4")
+
+
+@app.get("/registry")
+def registry_status():
+    return {
+        "active": active.version,  # None: MODEL_PATH, no registry version yet
+        "current": current_version("lag", MODEL_REGISTRY_DIR),
+        "versions": [v["version"] for v in list_versions("lag", MODEL_REGISTRY_DIR)],
+        "poll_seconds": REGISTRY_POLL_S,
+    }
+
+
+@app.post("/registry/reload")
+def registry_reload():
+    # this worker only; other workers pick CURRENT up on their next poll
+    try:
+        swapped = watcher.check()
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Could not load {current_version('lag', MODEL_REGISTRY_DIR)}: {e}")
+    return {"swapped": swapped, "active": active.version}
 
 if __name__ == "__main__":
     uvicorn.run(app, host="0.0.0.0", port=8000)
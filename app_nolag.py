@@ -1,143 +1,426 @@
 # app.py (or app_nolag.py)
-from bootstrap_data import ensure_data
-ensure_data()  # download data if missing
-from fastapi import FastAPI, HTTPException
+from fastapi import FastAPI, HTTPException, Response
 from pydantic import BaseModel
-import joblib, json
+from typing import Any, Dict, List
+import joblib, json, os, time
+import numpy as np
 import pandas as pd
 from pathlib import Path
+from src.features.online_store import LagFeatures, OnlineFeatureStore, store_exists
+from src.features.serving_index import ServingIndex
+from src.features.serving_bundle import (bundle_exists, ensure_bundle, load_bundle, load_sources, memory_usage,
+                                         stale_sources)
+from src.models.fast_predict import FastPredictor
+from src.api.batching import MicroBatcher
+from src.api.cache import PredictionCache, model_fingerprint
+from src.api.shard_router import ShardRouter
+from src.api.metrics import NULL_TIMER, Metrics
+from src.api.shadow import ShadowScorer
+from src.models.registry import RegistryWatcher, current_version, list_versions, load_version, resolve
+from starlette.concurrency import run_in_threadpool
 
 app = FastAPI(title="Retail Forecasting (no-lag)")
 
 # Global variables (lazy-loaded at startup)
-model = None
-TRAIN_COLS = None
-CAT_MAPS = None
-calendar = None
-sell_prices = None
-item_to_meta = None
+active = None  # ServingModel: the model version in service, replaced whole on a hot swap
+batcher = None  # MicroBatcher coalescing concurrent /predict calls (MICROBATCH_ENABLED=1)
+shadow = None  # ShadowScorer for the candidate model (SHADOW_MODEL)
+watcher = None  # RegistryWatcher following models/registry/nolag/CURRENT
+
+# Micro-batching config: collect up to MAX_SIZE rows or wait at most MAX_WAIT_MS
+MICROBATCH_ENABLED = os.environ.get("MICROBATCH_ENABLED", "0") == "1"
+MICROBATCH_MAX_SIZE = int(os.environ.get("MICROBATCH_MAX_SIZE", "256"))
+MICROBATCH_MAX_WAIT_MS = float(os.environ.get("MICROBATCH_MAX_WAIT_MS", "2"))
+
+# Prediction cache: LRU over (model, store, item, date); size 0 disables, TTL unset = no expiry
+PREDICTION_CACHE_SIZE = int(os.environ.get("PREDICTION_CACHE_SIZE", "100000"))
+PREDICTION_CACHE_TTL_S = float(os.environ.get("PREDICTION_CACHE_TTL_S", "0")) or None
+cache = PredictionCache(PREDICTION_CACHE_SIZE, PREDICTION_CACHE_TTL_S)
+
+# Shard routing: per-store / store x dept models from python -m src.models.train_shards,
+# loaded lazily with at most SHARD_MAX_RESIDENT in memory; rows without a shard use the global model
+SHARD_ROUTING = os.environ.get("SHARD_ROUTING", "0") == "1"
+SHARD_MAX_RESIDENT = int(os.environ.get("SHARD_MAX_RESIDENT", "8"))
+
+# Request metrics on GET /metrics (Prometheus text); SERVER_TIMING=1 adds a per-stage Server-Timing header
+SERVER_TIMING = os.environ.get("SERVER_TIMING", "0") == "1"
+metrics = Metrics("nolag")
 
 MODELS = Path("models")
+MODEL_PATH = MODELS / "baseline_lightgbm_nolag.joblib"
 # BASE_DIR = Path(__file__).resolve().parent
 DATA_RAW = Path(__file__).resolve().parent / "data" / "raw"
 DATA_PROCESSED = Path(__file__).resolve().parent / "data" / "processed"
-# DATA_RAW = BASE_DIR / "data" / "raw"
-# DATA_PROCESSED = BASE_DIR / "data" / "processed"
+# Prebuilt serving bundle (python -m src.features.serving_bundle); mapped at startup when present
+BUNDLE_DIR = Path(os.environ.get("SERVING_BUNDLE_DIR", Path(__file__).resolve().parent / "data" / "serving_bundle"))
+# SHARED_BUNDLE=1: without a bundle, the first worker builds one (file-locked) and every worker maps it,
+# so the lookup tables are shared through the page cache instead of rebuilt in each process
+SHARED_BUNDLE = os.environ.get("SHARED_BUNDLE", "0") == "1"
+SHARD_REGISTRY_DIR = Path(os.environ.get("SHARD_REGISTRY_DIR", MODELS / "shards"))
+# Model registry (python -m src.models.registry): nolag/CURRENT, when set, is served instead of the bundle or
+# models/ files; promoting another version swaps it in within REGISTRY_POLL_S (0: only on POST /registry/reload)
+MODEL_REGISTRY_DIR = Path(os.environ.get("MODEL_REGISTRY_DIR", MODELS / "registry"))
+REGISTRY_POLL_S = float(os.environ.get("REGISTRY_POLL_S", "10"))
+# Shadow scoring: a registry model ("lag", "nolag/v20260101-120000") scores SHADOW_SAMPLE_RATE of the
+# requests in the background; latency and deltas on GET /registry, every sample in SHADOW_LOG (JSONL) if set.
+# A lag shadow reads its lag / rolling features from the online feature store (FEATURE_STORE_DIR, as in app.py)
+SHADOW_MODEL = os.environ.get("SHADOW_MODEL")
+FEATURE_STORE_DIR = Path(os.environ.get("FEATURE_STORE_DIR", Path(__file__).resolve().parent / "data" / "feature_store"))
+SHADOW_SAMPLE_RATE = float(os.environ.get("SHADOW_SAMPLE_RATE", "0.1"))
+SHADOW_LOG = os.environ.get("SHADOW_LOG")
+
+
+class ServingModel:
+    """
+    One model version with everything scoring needs. Handlers read `active`
+    once per request and pass it down, so a hot swap is a single assignment:
+    requests already running finish on the version they started with.
+    """
 
-# # Load model + artifacts
-# model = joblib.load(MODELS / "baseline_lightgbm_nolag.joblib")
-# with open(MODELS / "feature_columns_nolag.json", "r", encoding="utf-8") as f:
-#     TRAIN_COLS = json.load(f)
-# with open(MODELS / "cat_mappings_nolag.json", "r", encoding="utf-8") as f:
-#     CAT_MAPS = json.load(f)
+    def __init__(self, model, train_cols, cat_maps, index, fingerprint, version=None, shards=SHARD_ROUTING):
+        self.model = model
+        self.train_cols = train_cols
+        self.cat_maps = cat_maps
+        self.index = index  # ServingIndex: calendar/price/meta lookups, pre-encoded with cat_maps
+        self.fingerprint = fingerprint  # hash of model file + train_cols + cat_maps, part of every cache key
+        self.version = version  # "nolag/<version>" when loaded from the registry
+        self.row_plan = index.row_plan(train_cols)  # train_cols resolved against the index for the single-row path
+        self.predictor = FastPredictor(model, len(train_cols))  # single-row scoring on raw arrays
+        self.router = None  # ShardRouter to per-store / store x dept models (SHARD_ROUTING=1)
+        if shards:
+            router = ShardRouter(SHARD_REGISTRY_DIR, train_cols, cat_maps, model, self.predictor, SHARD_MAX_RESIDENT)
+            if router:
+                self.router = router
+                self.fingerprint = f"{fingerprint}+{router.fingerprint}"
+                print(f"[startup] Shard routing on ({router.stats()['levels']}, max {SHARD_MAX_RESIDENT} resident)")
+            else:
+                print(f"[startup] SHARD_ROUTING=1 but no shard manifests under {SHARD_REGISTRY_DIR}; "
+                      f"using the global model")
 
-# # Preload lookups
-# calendar = pd.read_csv(DATA_RAW / "calendar.csv")  # has date, wm_yr_wk, event_name_1, ...
-# sell_prices = pd.read_csv(DATA_RAW / "sell_prices.csv")  # has store_id,item_id,wm_yr_wk,sell_price
 
-# # create item->meta lookup from original processed dataset if needed
-# # we assume train_features.parquet has columns item_id, dept_id, cat_id, state_id
-# # meta = pd.read_parquet("data/processed/train_features.parquet")[["item_id","dept_id","cat_id","store_id","state_id"]].drop_duplicates()
-# meta = pd.read_parquet(DATA_PROCESSED / "train_features.parquet")[["item_id","dept_id","cat_id","store_id","state_id"]].drop_duplicates()
+def load_registry_model(spec: str, shards: bool = SHARD_ROUTING) -> ServingModel:
+    kind, version = resolve(spec, MODEL_REGISTRY_DIR)
+    if version is None:
+        raise FileNotFoundError(f"No CURRENT {kind} version in {MODEL_REGISTRY_DIR}")
+    loaded = load_version(kind, version, MODEL_REGISTRY_DIR)
+    index = loaded["index"]
+    if index is None:  # model-only version: encode the lookup tables with its own category levels
+        index = ServingIndex.build(*load_sources(DATA_RAW, DATA_PROCESSED), loaded["cat_maps"])
+    return ServingModel(loaded["model"], loaded["train_cols"], loaded["cat_maps"], index, loaded["fingerprint"],
+                        f"{kind}/{version}", shards)
 
-# meta = meta.drop_duplicates(subset=["item_id"])
-# item_to_meta = meta.set_index("item_id").to_dict(orient="index")
 
-# # item_to_meta = meta.set_index("item_id").to_dict(orient="index")
+def load_shadow(spec: str):
+    """
+    (name, score_fn) of the SHADOW_MODEL candidate. A model whose features the
+    no-lag index can't produce is refused rather than scored on -1 placeholders.
+    """
+    kind, version = resolve(spec, MODEL_REGISTRY_DIR)
+    if kind != "lag":
+        candidate = load_registry_model(spec, shards=False)
+        unresolved = candidate.index.unresolved(candidate.train_cols)
+        if unresolved:
+            raise ValueError(f"the serving index can't produce {unresolved}")
+        return candidate.version, lambda rows: predict_rows(rows, serving=candidate)
+
+    if version is None:
+        raise FileNotFoundError(f"No CURRENT lag version in {MODEL_REGISTRY_DIR}")
+    if not store_exists(FEATURE_STORE_DIR):
+        raise FileNotFoundError(f"a lag shadow needs the online feature store at {FEATURE_STORE_DIR} "
+                                f"(python -m src.features.online_store)")
+    loaded = load_version("lag", version, MODEL_REGISTRY_DIR)
+    index = loaded["index"] or ServingIndex.build(*load_sources(DATA_RAW, DATA_PROCESSED), loaded["cat_maps"])
+    features = LagFeatures(OnlineFeatureStore.load(FEATURE_STORE_DIR), index, loaded["train_cols"],
+                           loaded["cat_maps"])
+    unresolved = [c for c in index.unresolved(features.train_cols) if c not in features.store.arrays
+                  and c not in ("d", "id")]
+    if unresolved:
+        raise ValueError(f"neither the serving index nor the feature store has {unresolved}")
+    model = loaded["model"]
+
+    def score(rows: List[dict]) -> np.ndarray:
+        raw_df = pd.DataFrame(rows)
+        store_ids = raw_df["store_id"] if "store_id" in raw_df.columns else [None] * len(raw_df)
+        X = features.transform(store_ids, raw_df["item_id"], raw_df["date"])  # ValueError past the store
+        return model.predict(pd.DataFrame(X, columns=features.train_cols))
+
+    return f"lag/{version}", score
+
+
+def activate(version: str) -> None:
+    """RegistryWatcher callback: load the version next to the running one, then swap it in."""
+    global active
+    t = time.perf_counter()
+    new = load_registry_model(f"nolag/{version}")
+    previous, active = active, new
+    print(f"[registry] Swapped {previous.version or 'startup model'} -> {new.version} "
+          f"in {time.perf_counter() - t:.2f}s")
 
 
 @app.on_event("startup")
 async def load_resources():
-    global model, TRAIN_COLS, CAT_MAPS, calendar, sell_prices, item_to_meta
+    global active, batcher, shadow, watcher
 
     print("[startup] Loading models and data...")
+    timings = {}
+    started = time.perf_counter()
+
+    registry_version = current_version("nolag", MODEL_REGISTRY_DIR)
+    if registry_version is not None:
+        t = time.perf_counter()
+        active = load_registry_model(f"nolag/{registry_version}")
+        timings["registry"] = time.perf_counter() - t
+        print(f"[startup] Using registry version {active.version} from {MODEL_REGISTRY_DIR}")
+    else:
+        active = load_default_model(timings)
+
+    watcher = RegistryWatcher("nolag", activate, registry_version, MODEL_REGISTRY_DIR, REGISTRY_POLL_S)
+    if REGISTRY_POLL_S > 0:
+        watcher.start()
+
+    if SHADOW_MODEL:
+        try:
+            shadow_name, shadow_score = load_shadow(SHADOW_MODEL)
+        except Exception as e:
+            print(f"[startup] Shadow model {SHADOW_MODEL} unavailable ({e!r}); shadow scoring off")
+        else:
+            shadow = ShadowScorer(shadow_name, shadow_score, SHADOW_SAMPLE_RATE, metrics=metrics, log_path=SHADOW_LOG)
+            print(f"[startup] Shadow scoring {SHADOW_SAMPLE_RATE:.0%} of requests with {shadow_name}")
+
+    if MICROBATCH_ENABLED:
+        batcher = MicroBatcher(predict_microbatch, MICROBATCH_MAX_SIZE, MICROBATCH_MAX_WAIT_MS)
+        await batcher.start()
+        print(f"[startup] Micro-batching on (max {MICROBATCH_MAX_SIZE} rows / {MICROBATCH_MAX_WAIT_MS} ms)")
+
+    breakdown = ", ".join(f"{k} {v:.3f}s" for k, v in timings.items())
+    print(f"[startup] Data and model loaded successfully in {time.perf_counter() - started:.3f}s ({breakdown})")
+    memory = ", ".join(f"{k} {v:.1f}MB" for k, v in memory_usage().items())
+    if memory:
+        print(f"[startup] pid {os.getpid()} memory: {memory}")
+
+
+def load_default_model(timings: dict) -> ServingModel:
+    """The serving bundle, or models/ + data/ when there is none (no registry version set)."""
+    if SHARED_BUNDLE:
+        t = time.perf_counter()
+        if not bundle_exists(BUNDLE_DIR):
+            from bootstrap_data import ensure_data
+
+            ensure_data()
+        ensure_bundle(BUNDLE_DIR, DATA_RAW, DATA_PROCESSED)  # builds a missing bundle, rebuilds a stale one
+        timings["ensure_bundle"] = time.perf_counter() - t
+
+    stale = stale_sources(BUNDLE_DIR) if bundle_exists(BUNDLE_DIR) else []
+    if stale:
+        # never serve the bundle's old model copy next to a retrained one in models/
+        print(f"[startup] Serving bundle {BUNDLE_DIR} is older than {stale}; loading models/ and data/ instead "
+              f"(rebuild it with python -m src.features.serving_bundle)")
+    if bundle_exists(BUNDLE_DIR) and not stale:
+        # Fast path: map the prebuilt bundle, no CSV parsing and no download
+        bundle = load_bundle(BUNDLE_DIR, timings)
+        model, train_cols, cat_maps = bundle["model"], bundle["train_cols"], bundle["cat_maps"]
+        index = bundle["index"]
+        fingerprint = bundle["fingerprint"]
+        print(f"[startup] Using serving bundle {BUNDLE_DIR} (built {bundle['manifest']['created_at']})")
+    else:
+        from bootstrap_data import ensure_data
+
+        t = time.perf_counter()
+        ensure_data()  # download data if missing
+        timings["ensure_data"] = time.perf_counter() - t
+
+        # Load model + artifacts
+        t = time.perf_counter()
+        model = joblib.load(MODEL_PATH)
+        with open(MODELS / "feature_columns_nolag.json", "r", encoding="utf-8") as f:
+            train_cols = json.load(f)
+        with open(MODELS / "cat_mappings_nolag.json", "r", encoding="utf-8") as f:
+            cat_maps = json.load(f)
+        fingerprint = model_fingerprint(MODEL_PATH, train_cols, cat_maps)
+        timings["model"] = time.perf_counter() - t
+
+        # Load datasets: calendar, sell_prices and item meta (first occurrence wins per item_id)
+        t = time.perf_counter()
+        calendar, sell_prices, meta = load_sources(DATA_RAW, DATA_PROCESSED)
+        timings["read_sources"] = time.perf_counter() - t
 
-    # Load model + artifacts
-    model = joblib.load(MODELS / "baseline_lightgbm_nolag.joblib")
-    with open(MODELS / "feature_columns_nolag.json", "r", encoding="utf-8") as f:
-        TRAIN_COLS = json.load(f)
-    with open(MODELS / "cat_mappings_nolag.json", "r", encoding="utf-8") as f:
-        CAT_MAPS = json.load(f)
+        # Joins and categorical encoding happen once here; requests only gather from arrays
+        t = time.perf_counter()
+        index = ServingIndex.build(calendar, sell_prices, meta, cat_maps)
+        timings["build_index"] = time.perf_counter() - t
 
-    # Load datasets
-    calendar = pd.read_csv(DATA_RAW / "calendar.csv")
-    sell_prices = pd.read_csv(DATA_RAW / "sell_prices.csv")
+    return ServingModel(model, train_cols, cat_maps, index, fingerprint)
 
-    meta = pd.read_parquet(DATA_PROCESSED / "train_features.parquet")[
-        ["item_id", "dept_id", "cat_id", "store_id", "state_id"]
-    ].drop_duplicates()
-    item_to_meta = meta.set_index("item_id").to_dict(orient="index")
 
-    print("[startup] Data and model loaded successfully!")
+@app.on_event("shutdown")
+async def stop_batcher():
+    if batcher is not None:
+        await batcher.stop()
+    if shadow is not None:
+        shadow.stop()
+    if watcher is not None:
+        watcher.stop()
 
 
 class PredictionRequest(BaseModel):
     features: dict  # minimal input: {"store_id":"CA_1","item_id":"FOODS_1_001","date":"2016-05-01"}
 
-def preprocess_input(raw_df: pd.DataFrame) -> pd.DataFrame:
-    # raw_df is one or more rows
-    df = raw_df.copy()
-    # 1) ensure date is datetime
-    df["date"] = pd.to_datetime(df["date"])
-
-    # 2) derive mapping fields from item_id and store_id using meta lookup
-    def fill_meta_row(row):
-        item = row.get("item_id")
-        if item in item_to_meta:
-            row["dept_id"] = item_to_meta[item]["dept_id"]
-            row["cat_id"] = item_to_meta[item]["cat_id"]
-            row["state_id"] = item_to_meta[item]["state_id"]
-            row["store_id"] = row.get("store_id", item_to_meta[item]["store_id"])
-        return row
-    df = df.apply(fill_meta_row, axis=1)
-
-    # 3) merge calendar info (by date)
-    cal = calendar.copy()
-    cal["date"] = pd.to_datetime(cal["date"])
-    df = df.merge(cal, on="date", how="left")  # brings wm_yr_wk, event_name_1/2, snap flags, etc.
-
-    # 4) merge sell_price by store_id,item_id,wm_yr_wk
-    df = df.merge(sell_prices, on=["store_id", "item_id", "wm_yr_wk"], how="left")
-
-    # 5) create date parts used in training (match names in feature_columns_nolag.json)
-    df["date_year"] = df["date"].dt.year
-    df["date_month"] = df["date"].dt.month
-    df["date_day"] = df["date"].dt.day
-    df["dayofweek"] = df["date"].dt.dayofweek
-    df["quarter"] = df["date"].dt.quarter
-    df["wday"] = df["date"].dt.weekday  # if training had wday
-
-    # 6) Fill missing sell_price (if any) with -1 or median
-    df["sell_price"] = df["sell_price"].fillna(-1)
-
-    # 7) Ensure categorical columns have same categories (use CAT_MAPS)
-    for col, levels in CAT_MAPS.items():
-        if col in df.columns:
-            # convert to string then set categories with the trained levels
-            df[col] = pd.Categorical(df[col].astype(str), categories=levels).codes
-        else:
-            # if a mapped column is missing, create it with -1 codes
-            df[col] = -1
-
-    # 8) Some numeric columns might be floats/int already; ensure columns exist
-    # 9) Reorder columns to match training
-    missing = [c for c in TRAIN_COLS if c not in df.columns]
-    if missing:
-        # for missing numeric features (like those requiring history) fill with 0 or -1
-        for m in missing:
-            df[m] = -1
-    df = df[TRAIN_COLS]
-    return df
+
+class BatchPredictionRequest(BaseModel):
+    rows: List[Dict[str, Any]]  # many {"store_id", "item_id", "date"} rows scored in one call
+
+
+def preprocess_input(raw_df: pd.DataFrame, timer=NULL_TIMER, serving: ServingModel = None) -> pd.DataFrame:
+    """
+    Build the model matrix for one or many raw rows.
+
+    Calendar, price and item meta features are array gathers on the startup
+    index (already encoded with the category levels), so the cost grows with the number
+    of rows rather than the number of calls. Features that need sales history
+    (lags, rolling means) are not available here and come back as -1.
+    """
+    s = serving or active
+    store_ids = raw_df["store_id"] if "store_id" in raw_df.columns else [None] * len(raw_df)
+    X = s.index.transform(store_ids, raw_df["item_id"], raw_df["date"], s.train_cols)
+    timer.mark("gather")
+    X = pd.DataFrame(X, columns=s.train_cols)
+    timer.mark("frame")
+    return X
+
+def cache_key(features: dict, serving: ServingModel):
+    key = (serving.fingerprint, features.get("store_id"), features.get("item_id"), features.get("date"))
+    try:
+        hash(key)
+    except TypeError:
+        return None  # unhashable payload values are scored but never cached
+    return key
+
+def predict_one(features: dict, timer=NULL_TIMER, serving: ServingModel = None) -> float:
+    # single row: fill a preallocated buffer in train_cols order, no DataFrame
+    timer.mark("dispatch")
+    s = serving or active
+    f = features
+    x = s.index.fill_row(s.row_plan, f.get("store_id"), f["item_id"], f["date"], s.predictor.buffer())
+    timer.mark("gather")
+    p = s.router.predictor_for(x) if s.router is not None else s.predictor
+    timer.mark("route")
+    pred = p.predict_row(x)
+    timer.mark("model")
+    return pred
+
+def predict_rows(rows: List[dict], timer=NULL_TIMER, serving: ServingModel = None) -> np.ndarray:
+    # many rows: one columnar preprocess and one model.predict call
+    s = serving or active
+    raw_df = pd.DataFrame(rows)
+    for col in ["item_id", "date"]:
+        if col not in raw_df.columns or raw_df[col].isna().any():
+            raise KeyError(col)  # same error a single row without the field raises
+    timer.mark("parse")
+    X = preprocess_input(raw_df, timer, s)
+    if s.router is not None:
+        preds = s.router.predict(X)  # one predict call per shard group
+    else:
+        preds = s.model.predict(X)
+    timer.mark("model")
+    return preds
+
+def predict_microbatch(rows: List[dict], serving: ServingModel) -> np.ndarray:
+    # MicroBatcher callback: one group = the rows that resolved the same version at request start
+    timer = metrics.timer("microbatch")
+    try:
+        preds = predict_rows(rows, timer, serving)
+    except Exception as e:
+        timer.finish(len(rows), e)
+        raise
+    timer.finish(len(rows))
+    return preds
 
 @app.post("/predict")
-def predict(req: PredictionRequest):
+async def predict(req: PredictionRequest, response: Response):
+    timer = metrics.timer("predict")
+    serving = active  # one version for the whole request, even if a swap lands meanwhile
     try:
-        raw_df = pd.DataFrame([req.features])
-        X = preprocess_input(raw_df)
-        preds = model.predict(X)
-        return {"prediction": round(preds[0])}
+        key = cache_key(req.features, serving)
+        pred = cache.get_many([key])[0]
+        timer.mark("cache")
+        if pred is None:
+            if batcher is not None:
+                pred = await batcher.submit(req.features, serving)  # scored by the version the cache key names
+                timer.mark("microbatch")
+            else:
+                pred = await run_in_threadpool(predict_one, req.features, timer, serving)
+            if key is not None:
+                cache.put(key, pred)
+        out = {"prediction": round(pred)}
     except Exception as e:
+        timer.finish(1, e)
         raise HTTPException(status_code=500, detail=str(e))
+    timer.finish(1)
+    if shadow is not None:
+        shadow.offer([req.features], [pred])
+    if SERVER_TIMING:
+        response.headers["Server-Timing"] = timer.server_timing()
+    return out
+
+@app.post("/predict_batch")
+def predict_batch(req: BatchPredictionRequest, response: Response):
+    if not req.rows:
+        return {"predictions": []}
+    timer = metrics.timer("predict_batch")
+    serving = active
+    try:
+        keys = [cache_key(r, serving) for r in req.rows]
+        preds = cache.get_many(keys)
+        todo = [i for i, p in enumerate(preds) if p is None]
+        timer.mark("cache")
+        if todo:
+            fresh = predict_rows([req.rows[i] for i in todo], timer, serving)  # only cache misses are scored
+            for i, p in zip(todo, fresh):
+                preds[i] = p
+            cache.put_many([keys[i] for i in todo], fresh)
+        out = {"predictions": np.rint(preds).astype(int).tolist()}
+        timer.mark("serialize")
+    except Exception as e:
+        timer.finish(len(req.rows), e)
+        raise HTTPException(status_code=500, detail=str(e))
+    timer.finish(len(req.rows))
+    if shadow is not None:
+        shadow.offer(req.rows, preds)
+    if SERVER_TIMING:
+        response.headers["Server-Timing"] = timer.server_timing()
+    return out
+
+@app.get("/metrics")
+def prometheus_metrics():
+    return Response(metrics.render(), media_type="text/plain; version=0.0.4")
+
+@app.get("/cache/stats")
+def cache_stats():
+    return {"model_fingerprint": active.fingerprint, **cache.stats()}
+
+@app.get("/shards/stats")
+def shard_stats():
+    return active.router.stats() if active.router is not None else {"enabled": False}
+
+@app.get("/registry")
+def registry_status():
+    return {
+        "active": active.version,  # None: the bundle / models/ files, no registry version yet
+        "model_fingerprint": active.fingerprint,
+        "current": current_version("nolag", MODEL_REGISTRY_DIR),
+        "versions": [v["version"] for v in list_versions("nolag", MODEL_REGISTRY_DIR)],
+        "poll_seconds": REGISTRY_POLL_S,
+        "shadow": shadow.stats() if shadow is not None else None,
+    }
+
+@app.post("/registry/reload")
+def registry_reload():
+    # this worker only; other workers pick CURRENT up on their next poll
+    try:
+        swapped = watcher.check()
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Could not load {current_version('nolag', MODEL_REGISTRY_DIR)}: {e}")
+    return {"swapped": swapped, "active": active.version}
 
 @app.get("/")
 def root():
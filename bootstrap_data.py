@@ -60,25 +60,23 @@ import os
 from pathlib import Path
 from typing import Iterable
 
-from azure.identity import DefaultAzureCredential
-from azure.storage.blob import BlobServiceClient
+from src.features.schema import features_path
+from src.utils.data_sync import CHUNK_SIZE, WORKERS, AzureBackend, LocalBackend, sync
 
-def _blob_service_client() -> BlobServiceClient:
+
+def _backend():
     """
-    Create a BlobServiceClient using either:
-    1. Managed Identity / DefaultAzureCredential (preferred in Azure), or
-    2. SAS token from STORAGE_SAS_TOKEN (fallback for local/testing).
+    DATA_SOURCE_DIR mirrors a local directory (offline runs, tests); otherwise the
+    blob container BLOB_CONTAINER_NAME at STORAGE_ACCOUNT_URL, authenticated with
+    STORAGE_SAS_TOKEN if set, else Managed Identity / DefaultAzureCredential.
     """
-    account_url = os.environ["STORAGE_ACCOUNT_URL"]  # e.g., https://acct.blob.core.windows.net
-    sas_token = os.environ.get("STORAGE_SAS_TOKEN")
-
-    if sas_token:
-        print("[bootstrap] Using SAS token for BlobServiceClient")
-        return BlobServiceClient(account_url=account_url, credential=sas_token)
+    source_dir = os.environ.get("DATA_SOURCE_DIR")
+    if source_dir:
+        print(f"[bootstrap] Syncing from local directory {source_dir}")
+        return LocalBackend(Path(source_dir), md5=os.environ.get("BOOTSTRAP_LOCAL_MD5", "0") == "1")
+    container = os.environ.get("BLOB_CONTAINER_NAME", "retail-forecasting")
+    return AzureBackend(os.environ["STORAGE_ACCOUNT_URL"], container, os.environ.get("STORAGE_SAS_TOKEN"))
 
-    print("[bootstrap] Using DefaultAzureCredential for BlobServiceClient")
-    cred = DefaultAzureCredential(exclude_interactive_browser_credential=True)
-    return BlobServiceClient(account_url=account_url, credential=cred)
 
 def _dest_base() -> Path:
     here = Path(__file__).resolve().parent
@@ -86,34 +84,28 @@ def _dest_base() -> Path:
     dest.mkdir(parents=True, exist_ok=True)
     return dest
 
-def _mirror_prefix(container_name: str, prefix: str, dest_root: Path) -> None:
-    bsc = _blob_service_client()
-    container = bsc.get_container_client(container_name)
-    for blob in container.list_blobs(name_starts_with=prefix):
-        # FIX: remove the leading "data/" from blob path if present
-        rel_path = Path(blob.name)
-        if rel_path.parts[0] == "data":
-            rel_path = Path(*rel_path.parts[1:])
-        target = dest_root / Path(blob.name)
-        target.parent.mkdir(parents=True, exist_ok=True)
-        if not target.exists():
-            print(f"[bootstrap] Downloading {blob.name} → {target}")
-            downloader = container.download_blob(blob.name)
-            with open(target, "wb") as f:
-                downloader.readinto(f)
 
 def ensure_data():
-    container = os.environ.get("BLOB_CONTAINER_NAME", "retail-forecasting")
+    """
+    Mirror the BLOB_PREFIXES into ./data (see src/utils/data_sync.py). Files only
+    appear at their final path once fully downloaded and verified, so present key
+    files mean a finished sync; BOOTSTRAP_ALWAYS_SYNC=1 re-checks the remote anyway.
+    """
     prefixes_env = os.environ.get("BLOB_PREFIXES", "data/raw/,data/processed/")
     prefixes: Iterable[str] = [p.strip() for p in prefixes_env.split(",") if p.strip()]
 
     dest = _dest_base()
     key1 = dest / "raw" / "calendar.csv"
-    key2 = dest / "processed" / "train_features.parquet"
+    key2 = features_path(dest / "processed")  # train_features.parquet or the train_features/ dataset
 
-    if key1.exists() and key2.exists():
+    if key1.exists() and key2.exists() and os.environ.get("BOOTSTRAP_ALWAYS_SYNC", "0") != "1":
         print("[bootstrap] Key files already present, skipping download.")
         return
 
-    for p in prefixes:
-        _mirror_prefix(container, p, dest)
+    workers = int(os.environ.get("BOOTSTRAP_WORKERS", WORKERS))
+    chunk_size = int(float(os.environ.get("BOOTSTRAP_CHUNK_MB", CHUNK_SIZE / 2 ** 20)) * 2 ** 20)
+    return sync(_backend(), prefixes, dest, workers, chunk_size)
+
+
+if __name__ == "__main__":
+    ensure_data()
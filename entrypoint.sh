@@ -3,6 +3,14 @@ set -euo pipefail
 
 echo "[entrypoint] Starting container with bundled data…"
 
+# A prebuilt serving bundle (python -m src.features.serving_bundle) replaces the raw files
+BUNDLE_DIR="${SERVING_BUNDLE_DIR:-/app/data/serving_bundle}"
+if [ -f "$BUNDLE_DIR/manifest.json" ]; then
+  echo "[entrypoint] Serving bundle found at $BUNDLE_DIR"
+  echo "[entrypoint] Launching Uvicorn on 0.0.0.0:${PORT:-8080}…"
+  exec uvicorn "${APP_MODULE:-app_nolag:app}" --host 0.0.0.0 --port "${PORT:-8080}"
+fi
+
 # Sanity checks
 RAW_OK=0
 # [[ -f /app/data/raw/calendar.csv ]] && RAW_OK=1 || echo "[entrypoint] WARNING: /app/data/raw/calendar.csv not found"
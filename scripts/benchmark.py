@@ -0,0 +1,214 @@
+# scripts/benchmark.py
+"""
+Microbenchmarks for the ETL, request preprocessing and inference hot paths,
+on synthetic M5-shaped data (src/utils/synthetic.py), so they run offline.
+
+    python scripts/benchmark.py                              # all stages, all scales
+    python scripts/benchmark.py --scales 1000 --batches 1,100 --repeat 5
+    python scripts/benchmark.py --save-baseline              # make this run the baseline
+
+Stages: melt_sales, merge_data and feature_engineering at 1k / 10k / 30k
+series (x --days), app_nolag.preprocess_input and model.predict at batch
+sizes 1 / 100 / 10k against a ServingIndex and a small LightGBM model built
+from the same synthetic data.
+
+Each benchmark reports the best and median wall time of --repeat runs,
+rows/sec and peak memory. Peak memory is measured in one extra run under
+tracemalloc, which sees numpy / pandas buffers but not LightGBM's native
+allocations. Every run is appended to reports/benchmarks/history.jsonl. When
+reports/benchmarks/baseline.json exists, each benchmark is compared with it
+and the script exits with status 1 if any is slower than the baseline by more
+than --threshold (0.2 = 20%).
+"""
+import argparse
+import gc
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import time
+import tracemalloc
+from datetime import datetime, timezone
+from pathlib import Path
+
+BASE_DIR = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(BASE_DIR))
+
+import lightgbm as lgb  # noqa: E402
+import numpy as np  # noqa: E402
+import pandas as pd  # noqa: E402
+
+from src.etl.build_features import feature_engineering, melt_sales, merge_data  # noqa: E402
+from src.features.serving_index import ServingIndex  # noqa: E402
+from src.utils.synthetic import make_m5  # noqa: E402
+
+BENCH_DIR = BASE_DIR / "reports" / "benchmarks"
+HISTORY_PATH = BENCH_DIR / "history.jsonl"
+BASELINE_PATH = BENCH_DIR / "baseline.json"
+SERIES_SCALES = [1000, 10000, 30000]
+BATCH_SIZES = [1, 100, 10000]
+
+# feature list of the no-lag model (models/feature_columns_nolag.json)
+NOLAG_COLS = ["item_id", "dept_id", "cat_id", "store_id", "state_id", "wm_yr_wk", "weekday", "wday", "month",
+              "year", "event_name_1", "event_type_1", "event_name_2", "event_type_2", "snap_CA", "snap_TX",
+              "snap_WI", "sell_price", "dayofweek", "quarter", "date_year", "date_month", "date_day"]
+CAT_COLS = ["item_id", "dept_id", "cat_id", "store_id", "state_id", "weekday",
+            "event_name_1", "event_type_1", "event_name_2", "event_type_2"]
+
+
+def measure(fn, repeat: int = 3, number: int = 1) -> dict:
+    """Best / median seconds per call over `repeat` rounds of `number` calls, then peak memory of one call."""
+    times = []
+    for _ in range(repeat):
+        gc.collect()
+        start = time.perf_counter()
+        for _ in range(number):
+            fn()
+        times.append((time.perf_counter() - start) / number)
+    gc.collect()
+    tracemalloc.start()
+    fn()
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return {"seconds": min(times), "median_seconds": statistics.median(times), "peak_mb": peak / 2 ** 20}
+
+
+def etl_benchmarks(scales, n_days: int):
+    """(name, params, rows, fn, number) for the ETL stages at each series scale."""
+    for n_series in scales:
+        calendar, sales, prices = make_m5(n_series, n_days)
+        sales_long = melt_sales(sales)
+        merged = merge_data(sales_long, calendar, prices)
+        params = {"series": n_series, "days": n_days}
+        rows = len(sales_long)
+        yield "etl.melt_sales", params, rows, lambda: melt_sales(sales), 1
+        yield "etl.merge_data", params, rows, lambda: merge_data(sales_long, calendar, prices), 1
+        # feature_engineering adds columns in place, so each call gets its own copy
+        yield "etl.feature_engineering", params, rows, lambda: feature_engineering(merged.copy()), 1
+        del sales_long, merged
+
+
+def serving_benchmarks(batches, n_series: int, n_days: int):
+    """(name, params, rows, fn, number) for preprocess_input / model.predict at each batch size."""
+    import app_nolag
+
+    calendar, sales, prices = make_m5(n_series, n_days)
+    meta = sales[["item_id", "dept_id", "cat_id", "store_id", "state_id"]].drop_duplicates(subset=["item_id"])
+    cat_maps = {c: sorted((sales[c] if c in sales.columns else calendar[c]).dropna().astype(str).unique())
+                for c in CAT_COLS}
+    index = ServingIndex.build(calendar, prices, meta, cat_maps)
+
+    rng = np.random.default_rng(0)
+
+    def requests(n):
+        rows = sales.iloc[rng.integers(0, len(sales), n)]
+        return pd.DataFrame({"store_id": rows["store_id"].to_numpy(), "item_id": rows["item_id"].to_numpy(),
+                             "date": calendar["date"].to_numpy()[rng.integers(0, len(calendar), n)]})
+
+    train = requests(20_000)
+    X_train = pd.DataFrame(index.transform(train["store_id"], train["item_id"], train["date"], NOLAG_COLS),
+                           columns=NOLAG_COLS)
+    model = lgb.train({"objective": "regression", "learning_rate": 0.05, "num_leaves": 31, "verbosity": -1},
+                      lgb.Dataset(X_train, label=rng.poisson(1.0, len(X_train))), num_boost_round=100)
+    app_nolag.active = app_nolag.ServingModel(model, NOLAG_COLS, cat_maps, index, "benchmark", shards=False)
+
+    for batch in batches:
+        raw = requests(batch)
+        X = app_nolag.preprocess_input(raw)
+        number = max(1, min(200, 20_000 // batch))
+        params = {"batch": batch, "series": n_series}
+        yield "api.preprocess_input", params, batch, lambda: app_nolag.preprocess_input(raw), number
+        yield "model.predict", params, batch, lambda: model.predict(X), number
+
+
+def environment() -> dict:
+    try:
+        commit = subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=BASE_DIR, capture_output=True,
+                                text=True, timeout=10).stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        commit = None
+    return {
+        "commit": commit,
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "numpy": np.__version__,
+        "pandas": pd.__version__,
+        "lightgbm": lgb.__version__,
+    }
+
+
+def compare(results: list, baseline: dict, threshold: float) -> list:
+    """Benchmarks slower than baseline x (1 + threshold), with their ratio."""
+    regressions = []
+    for r in results:
+        base = baseline.get(r["name"])
+        if base is None:
+            continue
+        r["baseline_seconds"] = base["seconds"]
+        r["ratio"] = r["seconds"] / base["seconds"] if base["seconds"] else None
+        if r["ratio"] is not None and r["ratio"] > 1 + threshold:
+            regressions.append(r)
+    return regressions
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark the ETL, preprocessing and inference hot paths")
+    parser.add_argument("--scales", default=",".join(map(str, SERIES_SCALES)), help="series counts for the ETL stages")
+    parser.add_argument("--batches", default=",".join(map(str, BATCH_SIZES)), help="batch sizes for serving")
+    parser.add_argument("--days", type=int, default=120, help="days of history per series")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--only", choices=["etl", "serving"], help="run one group of stages")
+    parser.add_argument("--threshold", type=float, default=0.2, help="allowed slowdown vs the baseline (0.2 = 20%%)")
+    parser.add_argument("--history", type=Path, default=HISTORY_PATH)
+    parser.add_argument("--baseline", type=Path, default=BASELINE_PATH)
+    parser.add_argument("--save-baseline", action="store_true", help="store this run as the new baseline")
+    args = parser.parse_args()
+
+    scales = [int(s) for s in args.scales.split(",") if s]
+    batches = [int(b) for b in args.batches.split(",") if b]
+    groups = []
+    if args.only in (None, "etl"):
+        groups.append(etl_benchmarks(scales, args.days))
+    if args.only in (None, "serving"):
+        groups.append(serving_benchmarks(batches, max(scales), args.days))
+
+    results = []
+    for group in groups:
+        for stage, params, rows, fn, number in group:
+            name = stage + "[" + ",".join(f"{k}={v}" for k, v in params.items()) + "]"
+            m = measure(fn, args.repeat, number)
+            r = {"name": name, "stage": stage, "params": params, "rows": rows, **m,
+                 "rows_per_second": rows / m["seconds"] if m["seconds"] else None}
+            results.append(r)
+            print(f"[bench] {name:55s} {m['seconds'] * 1000:10.3f} ms  {r['rows_per_second']:14,.0f} rows/s  "
+                  f"{m['peak_mb']:9.1f} MB peak")
+
+    baseline = {}
+    if args.baseline.exists() and not args.save_baseline:
+        with open(args.baseline, "r", encoding="utf-8") as f:
+            baseline = {r["name"]: r for r in json.load(f)["results"]}
+    regressions = compare(results, baseline, args.threshold)
+
+    record = {"created_at": datetime.now(timezone.utc).isoformat(), "environment": environment(),
+              "config": {"scales": scales, "batches": batches, "days": args.days, "repeat": args.repeat},
+              "results": results}
+    args.history.parent.mkdir(parents=True, exist_ok=True)
+    with open(args.history, "a", encoding="utf-8") as f:
+        f.write(json.dumps(record) + "\n")
+    if args.save_baseline:
+        args.baseline.parent.mkdir(parents=True, exist_ok=True)
+        with open(args.baseline, "w", encoding="utf-8") as f:
+            json.dump(record, f, indent=2)
+        print(f"Saved baseline to {args.baseline}")
+
+    if baseline:
+        compared = [r for r in results if "ratio" in r]
+        print(f"Compared {len(compared)} benchmarks with {args.baseline} (threshold +{args.threshold:.0%})")
+        for r in regressions:
+            print(f"[bench] REGRESSION {r['name']}: {r['seconds'] * 1000:.3f} ms vs "
+                  f"{r['baseline_seconds'] * 1000:.3f} ms ({r['ratio']:.2f}x)")
+    print(f"Appended {len(results)} results to {args.history}")
+    sys.exit(1 if regressions else 0)
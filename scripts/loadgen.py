@@ -0,0 +1,281 @@
+# scripts/loadgen.py
+"""
+Load generator for the prediction APIs: replays a JSONL request log or
+generates store / item / date mixes, closed- or open-loop.
+
+    python scripts/loadgen.py --in-process --concurrency 16 --duration 30
+    python scripts/loadgen.py --url http://myapp.azurewebsites.net --rate 200 --duration 60
+    python scripts/loadgen.py --log requests.log.jsonl --concurrency 8 --requests 5000
+    python scripts/loadgen.py --in-process --batch-size 100 --rate 20 --out reports/loadtest/batch100.json
+
+Log lines may be {"path": "/predict", "body": {...}}, a /predict body
+({"features": {...}}), a /predict_batch body ({"rows": [...]}) or a bare row
+({"store_id", "item_id", "date"}); other lines are skipped and the log is
+cycled. Without --log, rows are drawn from models/cat_mappings_nolag.json
+(store_id / item_id levels) and dates in [--start, --end]; --batch-size > 1
+sends them to /predict_batch.
+
+Closed loop (--concurrency C): C workers each send the next request as soon
+as the previous one returns. Open loop (--rate R): requests start on a
+Poisson schedule of R/s no matter how fast responses come back (up to
+--max-inflight), and latency is measured from the scheduled start, so a
+backed-up server shows up in the percentiles instead of lowering the load.
+
+--in-process starts the app (--app, default app_nolag:app) with uvicorn on a
+free local port first, so a run needs nothing else.
+"""
+import argparse
+import asyncio
+import json
+import random
+import socket
+import sys
+import threading
+import time
+from collections import Counter
+from datetime import date, timedelta
+from itertools import cycle
+from pathlib import Path
+
+import httpx
+import numpy as np
+
+BASE_DIR = Path(__file__).resolve().parents[1]
+PERCENTILES = [50, 95, 99, 99.9]
+
+
+def load_log(path: Path) -> list:
+    """(path, body) pairs from a JSONL request log."""
+    out = []
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                rec = json.loads(line)
+            except json.JSONDecodeError:
+                continue
+            if not isinstance(rec, dict):
+                continue
+            if "path" in rec and "body" in rec:
+                out.append((rec["path"], rec["body"]))
+            elif "features" in rec:
+                out.append(("/predict", {"features": rec["features"]}))
+            elif "rows" in rec:
+                out.append(("/predict_batch", {"rows": rec["rows"]}))
+            elif "item_id" in rec and "date" in rec:
+                out.append(("/predict", {"features": rec}))
+    return out
+
+
+def generate(n: int, batch_size: int, cat_path: Path, start: str, end: str, seed: int = 0) -> list:
+    """`n` requests of random store / item / date rows from the trained category levels."""
+    with open(cat_path, "r", encoding="utf-8") as f:
+        cat_maps = json.load(f)
+    stores, items = cat_maps["store_id"], cat_maps["item_id"]
+    first, days = date.fromisoformat(start), (date.fromisoformat(end) - date.fromisoformat(start)).days + 1
+    rng = random.Random(seed)
+
+    def row():
+        return {"store_id": rng.choice(stores), "item_id": rng.choice(items),
+                "date": (first + timedelta(days=rng.randrange(days))).isoformat()}
+
+    if batch_size <= 1:
+        return [("/predict", {"features": row()}) for _ in range(n)]
+    return [("/predict_batch", {"rows": [row() for _ in range(batch_size)]}) for _ in range(n)]
+
+
+def _rows(body: dict) -> int:
+    return len(body["rows"]) if "rows" in body else 1
+
+
+class Recorder:
+    def __init__(self):
+        self.latencies = []
+        self.errors = Counter()
+        self.rows = 0
+        self.bytes = 0
+        self.dropped = 0
+
+    def add(self, latency: float, status, rows: int, size: int = 0):
+        self.latencies.append(latency)
+        if status == 200:
+            self.rows += rows
+            self.bytes += size
+        else:
+            self.errors[str(status)] += 1
+
+    def drop(self):
+        """A request the open loop could not start (--max-inflight reached): an error without a latency."""
+        self.dropped += 1
+        self.errors["dropped"] += 1
+
+    def report(self, seconds: float) -> dict:
+        lat = np.array(self.latencies) * 1000
+        n = len(lat) + self.dropped
+        return {
+            "requests": n,
+            "errors": sum(self.errors.values()),
+            "error_rate": sum(self.errors.values()) / n if n else 0.0,
+            "errors_by_status": dict(self.errors),
+            "seconds": round(seconds, 3),
+            "throughput_rps": n / seconds if seconds else 0.0,
+            "rows_per_second": self.rows / seconds if seconds else 0.0,
+            "latency_ms": {
+                "mean": float(lat.mean()) if len(lat) else None,
+                "max": float(lat.max()) if len(lat) else None,
+                **{f"p{p:g}": float(np.percentile(lat, p)) if len(lat) else None for p in PERCENTILES},
+            },
+        }
+
+
+async def _send(client: httpx.AsyncClient, path: str, body: dict, started: float, rec: Recorder, record: bool):
+    try:
+        resp = await client.post(path, json=body)
+        status, size = resp.status_code, len(resp.content)
+    except httpx.HTTPError as e:
+        status, size = type(e).__name__, 0
+    if record:
+        rec.add(time.perf_counter() - started, status, _rows(body), size)
+
+
+async def closed_loop(client, requests, concurrency: int, deadline: float, limit, warmup_until: float, rec):
+    it = cycle(requests)
+    sent = 0
+
+    async def worker():
+        nonlocal sent
+        while time.perf_counter() < deadline and (limit is None or sent < limit):
+            path, body = next(it)
+            now = time.perf_counter()
+            measured = now >= warmup_until
+            sent += measured  # the limit counts measured requests, not warmup ones
+            await _send(client, path, body, now, rec, measured)
+
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+
+
+async def open_loop(client, requests, rate: float, max_inflight: int, deadline: float, limit, warmup_until: float,
+                    rec, seed: int = 0):
+    rng = random.Random(seed)
+    it = cycle(requests)
+    inflight = set()
+    next_at = time.perf_counter()
+    sent = 0
+    while next_at < deadline and (limit is None or sent < limit):
+        delay = next_at - time.perf_counter()
+        if delay > 0:
+            await asyncio.sleep(delay)
+        path, body = next(it)
+        measured = next_at >= warmup_until
+        if len(inflight) >= max_inflight:
+            if measured:
+                rec.drop()
+        else:
+            task = asyncio.create_task(_send(client, path, body, next_at, rec, measured))
+            inflight.add(task)
+            task.add_done_callback(inflight.discard)
+        sent += measured
+        next_at += rng.expovariate(rate)
+    if inflight:
+        await asyncio.gather(*inflight)
+
+
+async def run(url: str, requests: list, concurrency: int, rate, duration, limit, warmup: float,
+              max_inflight: int, timeout: float) -> dict:
+    rec = Recorder()
+    connections = max_inflight if rate else concurrency
+    limits = httpx.Limits(max_connections=connections, max_keepalive_connections=connections)
+    async with httpx.AsyncClient(base_url=url, limits=limits, timeout=timeout) as client:
+        start = time.perf_counter()
+        warmup_until = start + warmup
+        deadline = start + warmup + duration if duration else float("inf")
+        if rate:
+            await open_loop(client, requests, rate, max_inflight, deadline, limit, warmup_until, rec)
+        else:
+            await closed_loop(client, requests, concurrency, deadline, limit, warmup_until, rec)
+        elapsed = max(time.perf_counter() - warmup_until, 0.0)  # 0 if the run ended inside the warmup
+    return rec.report(elapsed)
+
+
+def start_in_process(app: str) -> tuple:
+    """Run `module:app` with uvicorn in a background thread on a free port; returns (url, server)."""
+    import uvicorn
+
+    sys.path.insert(0, str(BASE_DIR))
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        port = s.getsockname()[1]
+    server = uvicorn.Server(uvicorn.Config(app, host="127.0.0.1", port=port, log_level="warning"))
+    thread = threading.Thread(target=server.run, daemon=True)
+    thread.start()
+    while not server.started:
+        if not thread.is_alive():
+            raise RuntimeError(f"{app} failed to start")
+        time.sleep(0.05)
+    return f"http://127.0.0.1:{port}", server
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Replay or generate prediction traffic and report latency")
+    parser.add_argument("--url", default="http://127.0.0.1:8000")
+    parser.add_argument("--in-process", action="store_true", help="start --app locally and target it")
+    parser.add_argument("--app", default="app_nolag:app", help="uvicorn import string for --in-process")
+    parser.add_argument("--log", type=Path, help="JSONL request log to replay (cycled)")
+    parser.add_argument("--cat-mappings", type=Path, default=BASE_DIR / "models" / "cat_mappings_nolag.json")
+    parser.add_argument("--start", default="2016-01-01", help="first date of generated requests")
+    parser.add_argument("--end", default="2016-05-22", help="last date of generated requests")
+    parser.add_argument("--batch-size", type=int, default=1, help="rows per generated request (>1: /predict_batch)")
+    parser.add_argument("--concurrency", type=int, default=8, help="closed-loop workers")
+    parser.add_argument("--rate", type=float, help="open-loop arrival rate (requests/s); overrides --concurrency")
+    parser.add_argument("--max-inflight", type=int, default=1000, help="open-loop cap on outstanding requests")
+    parser.add_argument("--duration", type=float, default=30.0, help="seconds to measure (0: until --requests)")
+    parser.add_argument("--requests", type=int, help="stop after this many measured requests")
+    parser.add_argument("--warmup", type=float, default=2.0, help="seconds of traffic before measuring")
+    parser.add_argument("--timeout", type=float, default=30.0, help="per-request timeout (s)")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--out", type=Path, help="write the report as JSON")
+    args = parser.parse_args()
+    if not args.duration and not args.requests:
+        parser.error("--duration 0 needs --requests")
+
+    if args.log:
+        reqs = load_log(args.log)
+        if not reqs:
+            sys.exit(f"No replayable requests in {args.log}")
+    else:
+        reqs = generate(10_000, args.batch_size, args.cat_mappings, args.start, args.end, args.seed)
+
+    server = None
+    url = args.url
+    if args.in_process:
+        url, server = start_in_process(args.app)
+        print(f"[loadgen] Started {args.app} at {url}")
+
+    mode = f"open loop at {args.rate:g} req/s" if args.rate else f"closed loop x{args.concurrency}"
+    print(f"[loadgen] {len(reqs)} distinct requests, {mode}, {args.warmup:g}s warmup + "
+          f"{f'{args.duration:g}s' if args.duration else f'{args.requests} requests'} against {url}")
+    try:
+        report = asyncio.run(run(url, reqs, args.concurrency, args.rate, args.duration, args.requests,
+                                 args.warmup, args.max_inflight, args.timeout))
+    finally:
+        if server is not None:
+            server.should_exit = True
+
+    report.update(url=url, mode="open" if args.rate else "closed", rate=args.rate,
+                  concurrency=None if args.rate else args.concurrency, batch_size=args.batch_size,
+                  source=str(args.log) if args.log else "generated")
+    lat = report["latency_ms"]
+    print(f"[loadgen] {report['requests']} requests in {report['seconds']}s: {report['throughput_rps']:.1f} req/s, "
+          f"{report['rows_per_second']:.1f} rows/s, errors {report['errors']} ({report['error_rate']:.2%})")
+    if lat["mean"] is not None:
+        print("[loadgen] latency ms: " + ", ".join(
+            f"{k} {lat[k]:.2f}" for k in ["mean"] + [f"p{p:g}" for p in PERCENTILES] + ["max"]))
+    if report["errors_by_status"]:
+        print(f"[loadgen] errors by status: {report['errors_by_status']}")
+    if args.out:
+        args.out.parent.mkdir(parents=True, exist_ok=True)
+        with open(args.out, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+        print(f"[loadgen] Report written to {args.out}")
@@ -0,0 +1,111 @@
+# src/api/batching.py
+import asyncio
+from typing import Any, Callable, List, Sequence
+
+from starlette.concurrency import run_in_threadpool
+
+
+class MicroBatcher:
+    """
+    Coalesce concurrent single-row requests into one vectorized call.
+
+    Requests are queued; a background task collects up to `max_batch_size`
+    items, waiting at most `max_wait_ms` after the first one arrives, then runs
+    `fn(items, group) -> results` once in the threadpool and hands each caller
+    its own result. Batches run one at a time, so requests arriving while a
+    batch is being scored form the next, larger batch.
+
+    `group` is whatever the caller passed to submit() (e.g. the model version
+    it resolved at request start): items of different groups are never scored
+    in the same call. Groups are compared by identity.
+
+    If a batch raises, its items are retried one by one so a single bad row
+    only fails its own caller.
+    """
+
+    def __init__(self, fn: Callable[[List[Any], Any], Sequence[Any]], max_batch_size: int = 256,
+                 max_wait_ms: float = 2.0):
+        self.fn = fn
+        self.max_batch_size = max(1, int(max_batch_size))
+        self.max_wait = max(0.0, float(max_wait_ms)) / 1000.0
+        self._queue = None
+        self._task = None
+
+    async def start(self):
+        self._queue = asyncio.Queue()
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        while self._queue is not None and not self._queue.empty():
+            _, _, fut = self._queue.get_nowait()
+            if not fut.done():
+                fut.set_exception(RuntimeError("batcher stopped"))
+
+    async def submit(self, item: Any, group: Any = None) -> Any:
+        fut = asyncio.get_running_loop().create_future()
+        self._queue.put_nowait((item, group, fut))
+        return await fut
+
+    async def _collect(self) -> list:
+        loop = asyncio.get_running_loop()
+        batch = [await self._queue.get()]
+        deadline = loop.time() + self.max_wait
+        while len(batch) < self.max_batch_size:
+            if not self._queue.empty():
+                batch.append(self._queue.get_nowait())
+                continue
+            timeout = deadline - loop.time()
+            if timeout <= 0:
+                break
+            try:
+                batch.append(await asyncio.wait_for(self._queue.get(), timeout))
+            except asyncio.TimeoutError:
+                break
+        return batch
+
+    def _score(self, items: List[Any], group: Any) -> list:
+        try:
+            return list(self.fn(items, group))
+        except Exception:
+            if len(items) == 1:
+                raise
+        results = []
+        for item in items:
+            try:
+                results.append(self.fn([item], group)[0])
+            except Exception as e:
+                results.append(e)
+        return results
+
+    async def _run(self):
+        while True:
+            batch = await self._collect()
+            # callers that went away (cancelled) are dropped before scoring
+            batch = [entry for entry in batch if not entry[2].done()]
+            groups = []  # [(group, entries)] in arrival order
+            for entry in batch:
+                for group, entries in groups:
+                    if group is entry[1]:
+                        entries.append(entry)
+                        break
+                else:
+                    groups.append((entry[1], [entry]))
+            for group, entries in groups:
+                try:
+                    results = await run_in_threadpool(self._score, [item for item, _, _ in entries], group)
+                except Exception as e:
+                    results = [e] * len(entries)
+                for (_, _, fut), res in zip(entries, results):
+                    if fut.done():
+                        continue
+                    if isinstance(res, Exception):
+                        fut.set_exception(res)
+                    else:
+                        fut.set_result(res)
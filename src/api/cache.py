@@ -0,0 +1,100 @@
+# src/api/cache.py
+import hashlib
+import json
+import threading
+import time
+from collections import OrderedDict
+from pathlib import Path
+from typing import Any, Hashable, List, Optional, Sequence
+
+_MISSING = object()
+
+
+def model_fingerprint(model_path: Path, *artifacts: Any) -> str:
+    """Short hash of the model file plus JSON-able artifacts (feature list, category maps)."""
+    h = hashlib.sha256()
+    with open(model_path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            h.update(chunk)
+    for a in artifacts:
+        h.update(json.dumps(a, sort_keys=True).encode("utf-8"))
+    return h.hexdigest()[:16]
+
+
+class PredictionCache:
+    """
+    Thread-safe LRU cache with an optional TTL and hit/miss counters.
+
+    Callers put the model fingerprint in the key, so entries written by a
+    previous model can never be returned after a swap; they simply age out.
+    """
+
+    def __init__(self, maxsize: int = 100_000, ttl: Optional[float] = None):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data: "OrderedDict[Hashable, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def _lookup(self, key: Hashable, now: float) -> Any:
+        entry = self._data.get(key)
+        if entry is None:
+            self.misses += 1
+            return _MISSING
+        value, expires = entry
+        if expires is not None and expires <= now:
+            del self._data[key]
+            self.misses += 1
+            return _MISSING
+        self._data.move_to_end(key)
+        self.hits += 1
+        return value
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        with self._lock:
+            value = self._lookup(key, time.monotonic())
+        return default if value is _MISSING else value
+
+    def get_many(self, keys: Sequence[Optional[Hashable]]) -> List[Any]:
+        """Values for `keys`, with None where the key is missing, expired or itself None."""
+        now = time.monotonic()
+        with self._lock:
+            values = [self._lookup(k, now) if k is not None else _MISSING for k in keys]
+        return [None if v is _MISSING else v for v in values]
+
+    def put(self, key: Hashable, value: Any) -> None:
+        self.put_many([key], [value])
+
+    def put_many(self, keys: Sequence[Optional[Hashable]], values: Sequence[Any]) -> None:
+        """Store values; None keys (uncacheable requests) are skipped."""
+        if self.maxsize <= 0:
+            return
+        expires = time.monotonic() + self.ttl if self.ttl else None
+        with self._lock:
+            for k, v in zip(keys, values):
+                if k is None:
+                    continue
+                self._data[k] = (v, expires)
+                self._data.move_to_end(k)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "size": len(self._data),
+                "maxsize": self.maxsize,
+                "ttl_s": self.ttl,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+            }
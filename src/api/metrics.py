@@ -0,0 +1,184 @@
+# src/api/metrics.py
+import logging
+import logging.handlers
+import os
+import queue
+import threading
+import time
+from bisect import bisect_left
+from typing import Dict, Optional, Sequence, Tuple
+
+# seconds; 100us .. 5s covers a cached single row up to a large batch
+LATENCY_BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+BATCH_BUCKETS = (1, 2, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000)
+
+# requests slower than this are logged (from a background thread); 0 disables
+SLOW_REQUEST_MS = float(os.environ.get("SLOW_REQUEST_MS", "0"))
+
+
+def _labels(names: Sequence[str], values: Tuple) -> str:
+    if not names:
+        return ""
+    escaped = (str(v).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n") for v in values)
+    return "{" + ",".join(f'{n}="{v}"' for n, v in zip(names, escaped)) + "}"
+
+
+class _Histogram:
+    __slots__ = ("buckets", "counts", "sum", "count")
+
+    def __init__(self, buckets: Sequence[float]):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)  # last slot is +Inf
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float) -> None:
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+
+class _AsyncLog:
+    """Logger whose records go through a queue to a listener thread, so emitting never blocks a request."""
+
+    def __init__(self, name: str):
+        self.logger = logging.getLogger(name)
+        self.logger.propagate = False
+        self.logger.setLevel(logging.INFO)
+        q = queue.SimpleQueue()
+        self.logger.addHandler(logging.handlers.QueueHandler(q))
+        handler = logging.StreamHandler()
+        handler.setFormatter(logging.Formatter("[%(name)s] %(message)s"))
+        self.listener = logging.handlers.QueueListener(q, handler)
+        self.listener.start()
+
+
+class Metrics:
+    """
+    In-process request metrics rendered in the Prometheus text format.
+
+    Per request a StageTimer only reads perf_counter at each stage boundary;
+    the histograms (request latency, per-stage latency, batch size) and
+    counters (requests, errors) are updated once when it finishes, under one
+    lock. Nothing is printed on the request path: slow requests
+    (SLOW_REQUEST_MS) are handed to a queue-backed logger.
+    """
+
+    def __init__(self, app: str, namespace: str = "retail_api", slow_ms: float = SLOW_REQUEST_MS):
+        self.app = app
+        self.namespace = namespace
+        self.slow_s = slow_ms / 1000.0 if slow_ms > 0 else None
+        self._lock = threading.Lock()
+        self._requests: Dict[str, _Histogram] = {}
+        self._stages: Dict[Tuple[str, str], _Histogram] = {}
+        self._batches: Dict[str, _Histogram] = {}
+        self._errors: Dict[Tuple[str, str], int] = {}
+        self._log = _AsyncLog(f"{namespace}.{app}") if self.slow_s is not None else None
+
+    def timer(self, endpoint: str) -> "StageTimer":
+        return StageTimer(self, endpoint)
+
+    def record(self, endpoint: str, total: float, stages, rows: Optional[int], error: Optional[str]) -> None:
+        with self._lock:
+            h = self._requests.get(endpoint)
+            if h is None:
+                h = self._requests[endpoint] = _Histogram(LATENCY_BUCKETS)
+            h.observe(total)
+            for stage, seconds in stages:
+                h = self._stages.get((endpoint, stage))
+                if h is None:
+                    h = self._stages[(endpoint, stage)] = _Histogram(LATENCY_BUCKETS)
+                h.observe(seconds)
+            if rows is not None:
+                h = self._batches.get(endpoint)
+                if h is None:
+                    h = self._batches[endpoint] = _Histogram(BATCH_BUCKETS)
+                h.observe(rows)
+            if error is not None:
+                self._errors[(endpoint, error)] = self._errors.get((endpoint, error), 0) + 1
+        if self._log is not None and total >= self.slow_s:
+            breakdown = " ".join(f"{s}={d * 1000:.2f}ms" for s, d in stages)
+            self._log.logger.info("slow %s %.2fms rows=%s %s", endpoint, total * 1000, rows, breakdown)
+
+    def _render_histogram(self, lines: list, name: str, help_text: str, series: dict, label_names) -> None:
+        lines.append(f"# HELP {name} {help_text}")
+        lines.append(f"# TYPE {name} histogram")
+        for key, h in sorted(series.items()):
+            values = ((self.app,) + (key if isinstance(key, tuple) else (key,)))
+            cumulative = 0
+            for bound, count in zip(list(h.buckets) + ["+Inf"], h.counts):
+                cumulative += count
+                labels = _labels(["app", *label_names, "le"], values + (bound,))
+                lines.append(f"{name}_bucket{labels} {cumulative}")
+            labels = _labels(["app", *label_names], values)
+            lines.append(f"{name}_sum{labels} {h.sum:.9g}")
+            lines.append(f"{name}_count{labels} {h.count}")
+
+    def render(self) -> str:
+        ns = self.namespace
+        lines = []
+        with self._lock:
+            self._render_histogram(lines, f"{ns}_request_seconds", "Request latency by endpoint.",
+                                   self._requests, ["endpoint"])
+            self._render_histogram(lines, f"{ns}_stage_seconds", "Latency of each request stage.",
+                                   self._stages, ["endpoint", "stage"])
+            self._render_histogram(lines, f"{ns}_batch_rows", "Rows scored per request or micro-batch.",
+                                   self._batches, ["endpoint"])
+            lines.append(f"# HELP {ns}_requests_total Requests by endpoint.")
+            lines.append(f"# TYPE {ns}_requests_total counter")
+            for endpoint, h in sorted(self._requests.items()):
+                lines.append(f"{ns}_requests_total{_labels(['app', 'endpoint'], (self.app, endpoint))} {h.count}")
+            lines.append(f"# HELP {ns}_errors_total Failed requests by endpoint and exception type.")
+            lines.append(f"# TYPE {ns}_errors_total counter")
+            for (endpoint, error), n in sorted(self._errors.items()):
+                labels = _labels(["app", "endpoint", "error"], (self.app, endpoint, error))
+                lines.append(f"{ns}_errors_total{labels} {n}")
+        return "\n".join(lines) + "\n"
+
+
+class StageTimer:
+    """
+    Stage boundaries of one request: mark(stage) closes the stage that ran
+    since the previous mark. finish() records everything in one go.
+    """
+
+    __slots__ = ("metrics", "endpoint", "start", "last", "stages", "total")
+
+    def __init__(self, metrics: Optional[Metrics], endpoint: str):
+        self.metrics = metrics
+        self.endpoint = endpoint
+        self.start = self.last = time.perf_counter()
+        self.stages = []
+        self.total = None
+
+    def mark(self, stage: str) -> None:
+        now = time.perf_counter()
+        self.stages.append((stage, now - self.last))
+        self.last = now
+
+    def finish(self, rows: Optional[int] = None, error: Optional[BaseException] = None) -> float:
+        if self.total is None:
+            self.total = time.perf_counter() - self.start
+            if self.metrics is not None:
+                self.metrics.record(self.endpoint, self.total, self.stages, rows,
+                                    type(error).__name__ if error is not None else None)
+        return self.total
+
+    def server_timing(self) -> str:
+        """Server-Timing header value: one entry per stage plus the total, in milliseconds."""
+        parts = [f"{stage};dur={seconds * 1000:.3f}" for stage, seconds in self.stages]
+        total = self.total if self.total is not None else time.perf_counter() - self.start
+        parts.append(f"total;dur={total * 1000:.3f}")
+        return ", ".join(parts)
+
+
+class _NullTimer:
+    """Stand-in when a helper runs outside an instrumented request."""
+
+    __slots__ = ()
+
+    def mark(self, stage: str) -> None:
+        pass
+
+
+NULL_TIMER = _NullTimer()
@@ -0,0 +1,120 @@
+# src/api/shadow.py
+import json
+import queue
+import random
+import threading
+import time
+from collections import deque
+from pathlib import Path
+from typing import Callable, List, Optional, Sequence
+
+import numpy as np
+
+
+class ShadowScorer:
+    """
+    Scores a sample of live traffic with a candidate model, off the response path.
+
+    offer() is called after a response has been computed: a `sample_rate`
+    share of calls put (rows, primary predictions) on a bounded queue, and a
+    single background thread scores them with `score_fn(rows)`. When the
+    queue is full the sample is dropped rather than slowing the request.
+    Latency and prediction deltas (candidate - primary) are accumulated for
+    stats(); shadow latency also goes to `metrics` under endpoint "shadow",
+    and with `log_path` every scored sample is appended there as a JSON line.
+    """
+
+    def __init__(self, name: str, score_fn: Callable[[List[dict]], Sequence[float]], sample_rate: float = 0.1,
+                 max_queue: int = 1000, metrics=None, log_path: Optional[Path] = None):
+        self.name = name
+        self.score_fn = score_fn
+        self.sample_rate = sample_rate
+        self.metrics = metrics
+        self.log_path = Path(log_path) if log_path else None
+        self._queue = queue.Queue(maxsize=max_queue)
+        self._lock = threading.Lock()
+        self._latencies = deque(maxlen=10_000)
+        self.offered = self.sampled = self.dropped = self.errors = 0
+        self.rows = 0
+        self._delta_sum = self._abs_sum = self._sq_sum = 0.0
+        self._max_abs = 0.0
+        self._thread = threading.Thread(target=self._run, name=f"shadow-{name}", daemon=True)
+        self._thread.start()
+
+    def offer(self, rows: List[dict], primary: Sequence[float]) -> None:
+        self.offered += 1
+        if random.random() >= self.sample_rate:
+            return
+        try:
+            self._queue.put_nowait((rows, np.asarray(primary, dtype=np.float64)))
+            self.sampled += 1
+        except queue.Full:
+            self.dropped += 1
+
+    def stop(self) -> None:
+        self._queue.put(None)
+
+    def _run(self) -> None:
+        log = open(self.log_path, "a", encoding="utf-8") if self.log_path else None
+        try:
+            while True:
+                item = self._queue.get()
+                if item is None:
+                    break
+                rows, primary = item
+                timer = self.metrics.timer("shadow") if self.metrics is not None else None
+                start = time.perf_counter()
+                try:
+                    preds = np.asarray(self.score_fn(rows), dtype=np.float64)
+                except Exception as e:
+                    with self._lock:
+                        self.errors += 1
+                    if timer is not None:
+                        timer.finish(len(rows), e)
+                    continue
+                latency = time.perf_counter() - start
+                if timer is not None:
+                    timer.mark("model")
+                    timer.finish(len(rows))
+                delta = preds - primary
+                with self._lock:
+                    self._latencies.append(latency)
+                    self.rows += len(delta)
+                    self._delta_sum += float(delta.sum())
+                    self._abs_sum += float(np.abs(delta).sum())
+                    self._sq_sum += float((delta ** 2).sum())
+                    self._max_abs = max(self._max_abs, float(np.abs(delta).max(initial=0.0)))
+                if log is not None:
+                    log.write(json.dumps({"ts": time.time(), "shadow": self.name, "latency_ms": latency * 1000,
+                                          "rows": rows, "primary": primary.tolist(), "shadow_pred": preds.tolist()},
+                                         default=str) + "\n")
+                    log.flush()
+        finally:
+            if log is not None:
+                log.close()
+
+    def stats(self) -> dict:
+        with self._lock:
+            lat = np.array(self._latencies) * 1000
+            n = self.rows
+            return {
+                "shadow": self.name,
+                "sample_rate": self.sample_rate,
+                "offered": self.offered,
+                "sampled": self.sampled,
+                "dropped": self.dropped,
+                "errors": self.errors,
+                "queued": self._queue.qsize(),
+                "rows": n,
+                "latency_ms": {
+                    "mean": float(lat.mean()) if len(lat) else None,
+                    "p50": float(np.percentile(lat, 50)) if len(lat) else None,
+                    "p95": float(np.percentile(lat, 95)) if len(lat) else None,
+                },
+                "delta": {
+                    "mean": self._delta_sum / n if n else None,
+                    "mean_abs": self._abs_sum / n if n else None,
+                    "rmse": (self._sq_sum / n) ** 0.5 if n else None,
+                    "max_abs": self._max_abs if n else None,
+                },
+            }
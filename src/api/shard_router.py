@@ -0,0 +1,125 @@
+# src/api/shard_router.py
+import hashlib
+import json
+import threading
+from collections import OrderedDict
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+import joblib
+import numpy as np
+
+from src.models.fast_predict import FastPredictor
+
+# most specific level first; a row falls back to the next level, then to the global model
+LEVEL_ORDER = ["store_dept", "store"]
+
+
+class ShardRouter:
+    """
+    Routes rows to per-store / store x dept models from models/shards/<level>/
+    (python -m src.models.train_shards).
+
+    Rows are already encoded with the global CAT_MAPS, so the shard keys are
+    read back from the store_id / dept_id codes in the feature row. Shard
+    models are loaded on first use and at most `max_resident` stay in memory
+    (least recently used is dropped); the global model is always resident.
+    """
+
+    def __init__(self, registry_dir: Path, train_cols: List[str], cat_maps: Dict[str, list],
+                 fallback_model, fallback_predictor: FastPredictor, max_resident: int = 8):
+        self.registry_dir = Path(registry_dir)
+        self.train_cols = train_cols
+        self.cat_maps = cat_maps
+        self.max_resident = max(1, max_resident)
+        self.fallback = ("global", fallback_model, fallback_predictor)
+        self.levels = []  # (level, key columns, {values tuple: model path})
+        manifests = {}
+        for level in LEVEL_ORDER:
+            path = self.registry_dir / level / "manifest.json"
+            if not path.exists():
+                continue
+            with open(path, "r", encoding="utf-8") as f:
+                manifest = json.load(f)
+            if manifest["feature_columns"] != train_cols:
+                raise ValueError(f"Shard models in {path.parent} were trained on other feature columns")
+            shards = {tuple(s["keys"][k] for k in manifest["keys"]): path.parent / s["path"]
+                      for s in manifest["shards"]}
+            self.levels.append((level, manifest["keys"], shards))
+            manifests[level] = manifest
+        self.col_index = {k: train_cols.index(k) for _, keys, _ in self.levels for k in keys}
+        # part of the prediction cache key: changes whenever any shard manifest does
+        self.fingerprint = hashlib.sha256(json.dumps(manifests, sort_keys=True).encode("utf-8")).hexdigest()[:16]
+        self._resident: "OrderedDict[Path, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.loads = 0
+        self.evictions = 0
+
+    def __bool__(self):
+        return bool(self.levels)
+
+    def _decode(self, col: str, code: float) -> Optional[str]:
+        levels = self.cat_maps.get(col, [])
+        if code != code or not 0 <= int(code) < len(levels):  # NaN or unknown (-1)
+            return None
+        return levels[int(code)]
+
+    def shard_path(self, x: np.ndarray) -> Optional[Path]:
+        """Model file for one encoded feature row, or None for the global model."""
+        for _, keys, shards in self.levels:
+            values = tuple(self._decode(k, x[self.col_index[k]]) for k in keys)
+            path = shards.get(values)
+            if path is not None:
+                return path
+        return None
+
+    def _load(self, path: Optional[Path]) -> Tuple[str, object, FastPredictor]:
+        if path is None:
+            return self.fallback
+        with self._lock:
+            entry = self._resident.get(path)
+            if entry is None:
+                model = joblib.load(path)
+                entry = (path.stem, model, FastPredictor(model, len(self.train_cols)))
+                self._resident[path] = entry
+                self.loads += 1
+                while len(self._resident) > self.max_resident:
+                    self._resident.popitem(last=False)
+                    self.evictions += 1
+            self._resident.move_to_end(path)
+            return entry
+
+    def predictor_for(self, x: np.ndarray) -> FastPredictor:
+        """Single-row path: the shard's native predictor."""
+        return self._load(self.shard_path(x))[2]
+
+    def predict(self, X) -> np.ndarray:
+        """Many rows (DataFrame in train_cols order): one predict call per shard group."""
+        values = X.to_numpy() if hasattr(X, "to_numpy") else np.asarray(X)
+        out = np.empty(len(values), dtype=np.float64)
+        todo = np.ones(len(values), dtype=bool)
+        for _, keys, shards in self.levels:
+            codes = np.nan_to_num(values[:, [self.col_index[k] for k in keys]], nan=-1).astype(np.int64)
+            combos, inverse = np.unique(codes, axis=0, return_inverse=True)
+            for i, combo in enumerate(combos):
+                path = shards.get(tuple(self._decode(k, c) for k, c in zip(keys, combo)))
+                rows = np.flatnonzero((inverse.ravel() == i) & todo)
+                if path is None or not len(rows):
+                    continue
+                out[rows] = self._load(path)[1].predict(X.iloc[rows] if hasattr(X, "iloc") else values[rows])
+                todo[rows] = False
+        rows = np.flatnonzero(todo)
+        if len(rows):
+            out[rows] = self.fallback[1].predict(X.iloc[rows] if hasattr(X, "iloc") else values[rows])
+        return out
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "levels": {level: len(shards) for level, _, shards in self.levels},
+                "resident": [entry[0] for entry in self._resident.values()],
+                "max_resident": self.max_resident,
+                "loads": self.loads,
+                "evictions": self.evictions,
+                "fingerprint": self.fingerprint,
+            }
@@ -1,37 +1,74 @@
+import argparse
+import shutil
+import time
 import pandas as pd
 import numpy as np
 from pathlib import Path
+from src.features.engine import build_lag_features
+from src.features.schema import PRICE_DTYPES, apply_compact_schema
 
 RAW_PATH = Path("data/raw")
 PROCESSED_PATH = Path("data/processed")
-
-def load_data():
+DEFAULT_MAX_SERIES = 5000  # in-memory mode only; the streaming mode handles the full dataset
+
+# Sales-history features: lag_<k>, rolling_<stat>_<w> over the previous w days, ewm_<span>
+FEATURE_CONFIG = {
+    "lags": [7, 14, 28],
+    "windows": [7, 28],
+    "stats": ["mean"],
+    "ewm_spans": [],
+}
+
+def add_feature_args(parser):
+    """--lags / --windows / --stats / --ewm overrides of FEATURE_CONFIG, read back by feature_config_from_args."""
+    parser.add_argument("--lags", help="comma-separated lags, e.g. 7,14,28")
+    parser.add_argument("--windows", help="comma-separated rolling windows, e.g. 7,14,28,56,112")
+    parser.add_argument("--stats", help="comma-separated rolling stats from mean,std,min,max")
+    parser.add_argument("--ewm", help="comma-separated EWM spans, e.g. 7,28")
+
+def feature_config_from_args(args) -> dict:
+    """FEATURE_CONFIG overrides given on the command line as comma-separated lists."""
+    config = {}
+    for key, raw, cast in [("lags", args.lags, int), ("windows", args.windows, int),
+                           ("stats", args.stats, str), ("ewm_spans", args.ewm, float)]:
+        if raw:
+            config[key] = [cast(v.strip()) for v in raw.split(",") if v.strip()]
+    return config
+
+def load_data(max_series=DEFAULT_MAX_SERIES):
     calendar = pd.read_csv(RAW_PATH / "calendar.csv")
     sales = pd.read_csv(RAW_PATH / "sales_train_validation.csv")
     prices = pd.read_csv(RAW_PATH / "sell_prices.csv")
-    sales = sales.head(5000)
+    if max_series is not None and len(sales) > max_series:
+        print(f"Keeping the first {max_series} of {len(sales)} series (use --stream for all)")
+        sales = sales.head(max_series)
     return calendar, sales, prices
 
 
-def preprocess_input(raw_df: pd.DataFrame) -> pd.DataFrame:
+def preprocess_input(raw_df: pd.DataFrame, timer=None) -> pd.DataFrame:
     """
     Takes raw input from FastAPI and applies the exact same preprocessing
     as was done during training, so the number and order of features match.
+    `timer` (a src.api.metrics.StageTimer) gets a mark after each step.
     """
+    mark = timer.mark if timer is not None else lambda stage: None
 
     # Example: These steps should match your training steps
     # 1. Convert date to datetime
     raw_df["date"] = pd.to_datetime(raw_df["date"])
+    mark("parse_date")
 
     # 2. Extract date parts (must match training exactly)
     raw_df["year"] = raw_df["date"].dt.year
     raw_df["month"] = raw_df["date"].dt.month
     raw_df["day"] = raw_df["date"].dt.day
+    mark("date_parts")
 
     # 3. Encode categoricals (must match training order and encoding)
     categorical_cols = ["store_id", "item_id"]
     for col in categorical_cols:
         raw_df[col] = raw_df[col].astype("category").cat.codes
+    mark("encode")
 
     # 4. Drop original date column if model didn’t use it
     raw_df = raw_df.drop(columns=["date"])
@@ -43,15 +80,20 @@ def preprocess_input(raw_df: pd.DataFrame) -> pd.DataFrame:
         # plus all other features used in training
     ]
     raw_df = raw_df[expected_columns]
+    mark("select")
 
     return raw_df
 
 def melt_sales(sales):
-    # Convert from wide to long format
+    # Convert from wide to long format (same rows and order as DataFrame.melt:
+    # all series for d_1, then d_2, ...), built with one reshape instead of
+    # melt's per-column concat, which dominates small blocks and shards
     id_vars = sales.columns[:6]
     value_vars = sales.columns[6:]
-    sales_long = sales.melt(id_vars=id_vars, value_vars=value_vars,
-                            var_name="d", value_name="sales")
+    n = len(sales)
+    sales_long = sales[id_vars].iloc[np.tile(np.arange(n), len(value_vars))].reset_index(drop=True)
+    sales_long["d"] = np.repeat(value_vars.to_numpy(dtype=object), n)
+    sales_long["sales"] = sales[value_vars].to_numpy().ravel(order="F")
     return sales_long
 
 def merge_data(sales_long, calendar, prices):
@@ -59,7 +101,7 @@ def merge_data(sales_long, calendar, prices):
     df = df.merge(prices, on=["store_id", "item_id", "wm_yr_wk"], how="left")
     return df
 
-def feature_engineering(df):
+def add_time_features(df):
     # Convert date to datetime
     df["date"] = pd.to_datetime(df["date"])
     
@@ -68,16 +110,20 @@ def feature_engineering(df):
     df["month"] = df["date"].dt.month
     df["quarter"] = df["date"].dt.quarter
     df["year"] = df["date"].dt.year
+    return df
 
-    # Lag features
-    for lag in [7, 14, 28]:
-        df[f"lag_{lag}"] = df.groupby(["id"])["sales"].shift(lag)
+def feature_engineering(df, config=None):
+    config = {**FEATURE_CONFIG, **(config or {})}
+    df = add_time_features(df)
 
-    # Rolling means
-    for window in [7, 28]:
-        df[f"rolling_mean_{window}"] = (
-            df.groupby(["id"])["sales"].shift(1).rolling(window).mean()
-        )
+    # Lag / rolling / EWM features, computed per series (windows never cross ids)
+    features = build_lag_features(
+        df, target="sales", id_col="id", order_col="date",
+        lags=config["lags"], windows=config["windows"],
+        stats=config["stats"], ewm_spans=config["ewm_spans"],
+    )
+    for name, values in features.items():
+        df[name] = values
 
     return df
 
@@ -85,10 +131,83 @@ def save_processed(df):
     PROCESSED_PATH.mkdir(parents=True, exist_ok=True)
     df.to_parquet(PROCESSED_PATH / "train_features.parquet", index=False)
 
+def iter_sales_blocks(block_size, max_series=None):
+    """
+    Yield blocks of whole series (wide rows) from sales_train_validation.csv.
+    Each series lands in exactly one block, so per-series lags/rolling
+    windows computed on a block are the same as on the full frame.
+    """
+    seen = 0
+    for block in pd.read_csv(RAW_PATH / "sales_train_validation.csv", chunksize=block_size):
+        if max_series is not None:
+            block = block.head(max_series - seen)
+        if block.empty:
+            return
+        seen += len(block)
+        yield block
+
+def build_features_streaming(block_size=1000, max_series=None, out_dir=PROCESSED_PATH / "train_features",
+                             config=None):
+    """
+    Streaming build: melt -> merge -> feature_engineering one block of series
+    at a time and append each block as a Parquet part file under `out_dir`
+    (read back with pd.read_parquet(out_dir)). Besides one block, only the
+    price table is held, as category codes (~100MB on full M5), so peak
+    memory is set by `block_size`, not by the number of series.
+    """
+    calendar = pd.read_csv(RAW_PATH / "calendar.csv")
+    prices = pd.read_csv(RAW_PATH / "sell_prices.csv", dtype=PRICE_DTYPES)
+    # price rows sorted by their (store, item) code pair: a block's prices are one slice per series
+    stores, items = prices["store_id"].cat.categories, prices["item_id"].cat.categories
+    pair = prices["store_id"].cat.codes.to_numpy(np.int64) * len(items) + prices["item_id"].cat.codes.to_numpy(np.int64)
+    order = np.argsort(pair, kind="stable")
+    prices, pair = prices.iloc[order].reset_index(drop=True), pair[order]
+    del order
+
+    shutil.rmtree(out_dir, ignore_errors=True)
+    Path(out_dir).mkdir(parents=True)
+    total_rows, start = 0, time.perf_counter()
+    for part, block in enumerate(iter_sales_blocks(block_size, max_series)):
+        # only the price rows of this block's series take part in the merge
+        store_pos = stores.get_indexer(block["store_id"].astype(str))
+        item_pos = items.get_indexer(block["item_id"].astype(str))
+        known = (store_pos >= 0) & (item_pos >= 0)
+        block_pair = np.unique(store_pos[known].astype(np.int64) * len(items) + item_pos[known])
+        lo, hi = np.searchsorted(pair, block_pair, "left"), np.searchsorted(pair, block_pair, "right")
+        n = hi - lo
+        rows = np.repeat(lo, n) + np.arange(n.sum()) - np.repeat(np.cumsum(n) - n, n)
+        block_prices = prices.iloc[rows].copy()
+        for col in ["store_id", "item_id"]:
+            block_prices[col] = block_prices[col].astype(str)
+
+        df = apply_compact_schema(merge_data(melt_sales(block), calendar, block_prices))
+        df = apply_compact_schema(feature_engineering(df, config))
+        df.to_parquet(Path(out_dir) / f"part-{part:05d}.parquet", index=False)
+        total_rows += len(df)
+        print(f"[stream] part {part}: {len(block)} series, {len(df)} rows "
+              f"({total_rows / (time.perf_counter() - start):,.0f} rows/s overall)")
+    return total_rows
+
 if __name__ == "__main__":
-    calendar, sales, prices = load_data()
-    sales_long = melt_sales(sales)
-    df = merge_data(sales_long, calendar, prices)
-    df = feature_engineering(df)
-    save_processed(df)
-    print(f"Processed data saved to {PROCESSED_PATH / 'train_features.parquet'}")
+    parser = argparse.ArgumentParser(description="Build train features from the raw M5 CSVs")
+    parser.add_argument("--stream", action="store_true",
+                        help="process series in blocks and write a partitioned Parquet dataset")
+    parser.add_argument("--block-size", type=int, default=1000, help="series per block in --stream mode")
+    parser.add_argument("--max-series", type=int, default=None,
+                        help=f"limit the number of series (in-memory default: {DEFAULT_MAX_SERIES})")
+    add_feature_args(parser)
+    args = parser.parse_args()
+
+    config = feature_config_from_args(args)
+
+    if args.stream:
+        out_dir = PROCESSED_PATH / "train_features"
+        rows = build_features_streaming(args.block_size, args.max_series, out_dir, config)
+        print(f"Processed {rows} rows into {out_dir}/")
+    else:
+        calendar, sales, prices = load_data(args.max_series or DEFAULT_MAX_SERIES)
+        sales_long = melt_sales(sales)
+        df = apply_compact_schema(merge_data(sales_long, calendar, prices))
+        df = apply_compact_schema(feature_engineering(df, config))
+        save_processed(df)
+        print(f"Processed data saved to {PROCESSED_PATH / 'train_features.parquet'}")
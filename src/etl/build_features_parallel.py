@@ -0,0 +1,156 @@
+# src/etl/build_features_parallel.py
+"""
+Parallel driver around build_features: melt -> merge -> feature_engineering
+per store (or store x dept) shard on a process pool.
+
+    python -m src.etl.build_features_parallel --workers 32 --by store
+
+Stores are independent (every series id belongs to exactly one store), so each
+worker reads only its own rows of sales_train_validation.csv and sell_prices.csv
+and writes a hive-style partition:
+
+    data/processed/train_features/store_id=CA_1/part-00000.parquet
+    data/processed/train_features/store_id=CA_1/dept_id=FOODS_1/part-00000.parquet  (--by store_dept)
+
+_manifest.json (ignored by Parquet readers) is written last and lists every
+partition. pd.read_parquet / read_features on the directory restore the
+partition columns as categories.
+"""
+import argparse
+import json
+import os
+import shutil
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from datetime import datetime, timezone
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from src.etl.build_features import (
+    FEATURE_CONFIG, PROCESSED_PATH, RAW_PATH, add_feature_args, feature_config_from_args, feature_engineering,
+    melt_sales, merge_data,
+)
+from src.features.schema import PRICE_DTYPES, apply_compact_schema
+
+SHARD_KEYS = {"store": ["store_id"], "store_dept": ["store_id", "dept_id"]}
+MANIFEST_NAME = "_manifest.json"
+
+
+def _read_rows(path: Path, rows: np.ndarray, **kwargs) -> pd.DataFrame:
+    """
+    Read only the given data rows (0-based, header excluded) of a CSV.
+    M5 files are sorted by store, so a shard is usually one contiguous range
+    and skips straight to it; otherwise the other rows are skipped unparsed.
+    """
+    first, last = int(rows[0]), int(rows[-1])
+    if last - first + 1 == len(rows):
+        return pd.read_csv(path, skiprows=range(1, first + 1), nrows=len(rows), **kwargs)
+    keep = set((rows + 1).tolist())
+    return pd.read_csv(path, skiprows=lambda i: i > 0 and i not in keep, **kwargs)
+
+
+def plan_shards(by: str = "store", raw_dir: Path = RAW_PATH, max_series=None) -> list:
+    """One task per shard: its key values and the CSV rows it owns in sales and prices."""
+    keys = SHARD_KEYS[by]
+    sales_keys = pd.read_csv(raw_dir / "sales_train_validation.csv", usecols=keys, dtype="category")
+    if max_series is not None:
+        sales_keys = sales_keys.head(max_series)
+    price_stores = pd.read_csv(raw_dir / "sell_prices.csv", usecols=["store_id"], dtype="category")
+    price_rows = {s: rows for s, rows in price_stores.groupby("store_id", observed=True).indices.items()}
+
+    shards = []
+    for values, rows in sales_keys.groupby(keys, observed=True).indices.items():
+        values = values if isinstance(values, tuple) else (values,)
+        shards.append({
+            "keys": dict(zip(keys, map(str, values))),
+            "sales_rows": rows,
+            "price_rows": price_rows.get(values[0], np.array([], dtype=np.int64)),
+        })
+    # biggest shards first so the pool doesn't finish on a straggler
+    shards.sort(key=lambda s: len(s["sales_rows"]), reverse=True)
+    return shards
+
+
+def build_shard(shard: dict, out_dir: Path, raw_dir: Path = RAW_PATH, config=None) -> dict:
+    """Worker: build the features of one shard and write its partition."""
+    start = time.perf_counter()
+    calendar = pd.read_csv(raw_dir / "calendar.csv")
+    sales = _read_rows(raw_dir / "sales_train_validation.csv", shard["sales_rows"])
+    if len(shard["price_rows"]):
+        prices = _read_rows(raw_dir / "sell_prices.csv", shard["price_rows"], dtype=PRICE_DTYPES)
+    else:
+        prices = pd.read_csv(raw_dir / "sell_prices.csv", nrows=0, dtype=PRICE_DTYPES)
+    prices = prices[prices["item_id"].isin(sales["item_id"].unique()).to_numpy()].copy()
+    for col in ["store_id", "item_id"]:
+        prices[col] = prices[col].astype(str)
+
+    df = apply_compact_schema(merge_data(melt_sales(sales), calendar, prices))
+    df = apply_compact_schema(feature_engineering(df, config))
+
+    # partition columns live in the directory names, not in the files
+    part_dir = Path(out_dir).joinpath(*[f"{k}={v}" for k, v in shard["keys"].items()])
+    part_dir.mkdir(parents=True, exist_ok=True)
+    path = part_dir / "part-00000.parquet"
+    df.drop(columns=list(shard["keys"])).to_parquet(path, index=False)
+    return {
+        **shard["keys"],
+        "path": str(path.relative_to(out_dir)),
+        "series": len(sales),
+        "rows": len(df),
+        "bytes": path.stat().st_size,
+        "seconds": round(time.perf_counter() - start, 3),
+    }
+
+
+def build_features_parallel(by: str = "store", workers=None, max_series=None,
+                            out_dir: Path = PROCESSED_PATH / "train_features",
+                            raw_dir: Path = RAW_PATH, config=None) -> dict:
+    """Fan shards out to `workers` processes (default: all cores) and write the manifest."""
+    start = time.perf_counter()
+    out_dir = Path(out_dir)
+    shards = plan_shards(by, raw_dir, max_series)
+    workers = min(workers or os.cpu_count() or 1, len(shards)) or 1
+    print(f"[parallel] {len(shards)} shards by {by} on {workers} workers")
+
+    shutil.rmtree(out_dir, ignore_errors=True)
+    out_dir.mkdir(parents=True)
+    partitions = []
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        futures = [pool.submit(build_shard, s, out_dir, raw_dir, config) for s in shards]
+        for fut in as_completed(futures):
+            part = fut.result()
+            partitions.append(part)
+            print(f"[parallel] {part['path']}: {part['series']} series, {part['rows']} rows in {part['seconds']}s")
+
+    partitions.sort(key=lambda p: p["path"])
+    manifest = {
+        "created_at": datetime.now(timezone.utc).isoformat(),
+        "partition_by": SHARD_KEYS[by],
+        "config": {**FEATURE_CONFIG, **(config or {})},
+        "workers": workers,
+        "total_rows": sum(p["rows"] for p in partitions),
+        "total_series": sum(p["series"] for p in partitions),
+        "build_seconds": round(time.perf_counter() - start, 3),
+        "partitions": partitions,
+    }
+    with open(out_dir / MANIFEST_NAME, "w", encoding="utf-8") as f:
+        json.dump(manifest, f, indent=2)
+    return manifest
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Build train features per store on a process pool")
+    parser.add_argument("--by", choices=sorted(SHARD_KEYS), default="store", help="shard granularity")
+    parser.add_argument("--workers", type=int, default=None, help="worker processes (default: all cores)")
+    parser.add_argument("--max-series", type=int, default=None, help="limit the number of series")
+    parser.add_argument("--out", type=Path, default=PROCESSED_PATH / "train_features")
+    add_feature_args(parser)
+    args = parser.parse_args()
+
+    config = feature_config_from_args(args)
+
+    manifest = build_features_parallel(args.by, args.workers, args.max_series, args.out, config=config)
+    print(f"Processed {manifest['total_rows']} rows into {len(manifest['partitions'])} partitions "
+          f"under {args.out}/ in {manifest['build_seconds']}s")
@@ -0,0 +1,212 @@
+# src/etl/incremental.py
+"""
+Incremental daily feature updates.
+
+    python -m src.etl.incremental --init   # once, after a full build
+    python -m src.etl.incremental          # nightly: append the new d_XXXX columns
+
+Keeps per-series state next to the feature table (data/processed/feature_state/):
+the last max(lags, windows) sales values, the EWM state after the last day and
+the last day / price week already in the table. New day columns found in
+sales_train_validation.csv are turned into feature rows for those dates only,
+with the same engine kernels as a full build, so the appended rows are
+identical to what a rebuild would produce (integer sales keep the rolling
+sums exact whether they come from the full history or the stored tail).
+
+Dataset directories (--stream / build_features_parallel) get one new part file
+per partition; a single train_features.parquet is rewritten with the rows
+appended.
+"""
+import argparse
+import json
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+import pyarrow.parquet as pq
+
+from src.etl.build_features import PROCESSED_PATH, RAW_PATH, add_time_features, melt_sales, merge_data
+from src.etl.build_features_parallel import MANIFEST_NAME
+from src.features.engine import _cumsums, config_from_columns, ewm, ewm_last, lag, rolling
+from src.features.schema import PRICE_DTYPES, apply_compact_schema, features_path, read_features
+
+STATE_PATH = PROCESSED_PATH / "feature_state"
+ID_COLS = ["id", "item_id", "dept_id", "cat_id", "store_id", "state_id"]
+
+
+def _table_columns(processed_dir: Path) -> list:
+    """Column order of the stored table (partition columns excluded)."""
+    return pq.read_schema(sorted(_parquet_files(features_path(processed_dir)))[0]).names
+
+
+def _parquet_files(path: Path):
+    return [path] if path.is_file() else [p for p in path.rglob("*.parquet") if not p.name.startswith(("_", "."))]
+
+
+def _day_columns(raw_dir: Path) -> list:
+    header = pd.read_csv(raw_dir / "sales_train_validation.csv", nrows=0).columns
+    return [c for c in header if c.startswith("d_")]
+
+
+def _week_of(raw_dir: Path, day: int) -> int:
+    calendar = pd.read_csv(raw_dir / "calendar.csv", usecols=["d", "wm_yr_wk"])
+    return int(calendar.loc[calendar["d"] == f"d_{day}", "wm_yr_wk"].iloc[0])
+
+
+def _load_state(state_dir: Path):
+    with open(state_dir / "state.json", "r", encoding="utf-8") as f:
+        state = json.load(f)
+    return state, np.load(state_dir / "history.npy"), np.load(state_dir / "ewm.npy")
+
+
+def _save_state(state_dir: Path, state: dict, history: np.ndarray, ewm_state: np.ndarray) -> None:
+    state_dir.mkdir(parents=True, exist_ok=True)
+    state["updated_at"] = datetime.now(timezone.utc).isoformat()
+    np.save(state_dir / "history.npy", history)
+    np.save(state_dir / "ewm.npy", ewm_state)
+    # state.json last: it names the day the arrays belong to
+    with open(state_dir / "state.json", "w", encoding="utf-8") as f:
+        json.dump(state, f)
+
+
+def init_state(processed_dir: Path = PROCESSED_PATH, raw_dir: Path = RAW_PATH, state_dir: Path = STATE_PATH,
+               chunksize: int = 5000) -> dict:
+    """Build the per-series state for the series and days already in the feature table."""
+    config = config_from_columns(_table_columns(processed_dir))
+    table = read_features(processed_dir, columns=["id", "d"])
+    ids = [str(i) for i in table["id"].unique()]  # table order (= sales file order)
+    last_day = int(table["d"].max())
+    horizon = max(config["lags"] + config["windows"] + [1])
+
+    days = [c for c in _day_columns(raw_dir) if int(c[2:]) <= last_day]
+    pos = pd.Series(np.arange(len(ids)), index=ids)
+    history = np.full((len(ids), horizon), np.nan)
+    ewm_state = np.full((len(ids), len(config["ewm_spans"])), np.nan)
+    found = 0
+    for chunk in pd.read_csv(raw_dir / "sales_train_validation.csv", usecols=["id"] + days, chunksize=chunksize):
+        chunk = chunk[chunk["id"].isin(pos.index)]
+        if chunk.empty:
+            continue
+        rows = pos[chunk["id"]].to_numpy()
+        y = chunk[days].to_numpy(dtype=np.float64)
+        tail = y[:, -horizon:]
+        history[rows, horizon - tail.shape[1]:] = tail
+        for i, span in enumerate(config["ewm_spans"]):
+            ewm_state[rows, i] = ewm_last(y, span)
+        found += len(chunk)
+    if found != len(ids):
+        raise ValueError(f"{len(ids) - found} series of the feature table are missing from the sales file")
+
+    state = {"ids": ids, "last_day": last_day, "last_week": _week_of(raw_dir, last_day),
+             "history_days": horizon, "config": config}
+    _save_state(state_dir, state, history, ewm_state)
+    return state
+
+
+def _write_rows(df: pd.DataFrame, processed_dir: Path, tag: str) -> list:
+    """Append `df` to the feature table; returns the files written."""
+    target = features_path(processed_dir)
+    if target.is_file():
+        full = pd.concat([pd.read_parquet(target), df], ignore_index=True)
+        tmp = target.with_name(target.name + ".tmp")
+        apply_compact_schema(full).to_parquet(tmp, index=False)
+        tmp.replace(target)
+        return [target]
+
+    manifest_path = target / MANIFEST_NAME
+    manifest = json.loads(manifest_path.read_text(encoding="utf-8")) if manifest_path.exists() else None
+    keys = manifest["partition_by"] if manifest else []
+    groups = df.groupby(keys, observed=True, sort=False) if keys else [((), df)]
+    written = []
+    for values, part in groups:
+        values = values if isinstance(values, tuple) else (values,)
+        part_dir = target.joinpath(*[f"{k}={v}" for k, v in zip(keys, values)])
+        part_dir.mkdir(parents=True, exist_ok=True)
+        path = part_dir / f"part-{tag}.parquet"
+        part.drop(columns=keys).to_parquet(path, index=False)
+        written.append(path)
+        if manifest:
+            manifest["partitions"].append({**{k: str(v) for k, v in zip(keys, values)},
+                                           "path": str(path.relative_to(target)), "rows": len(part),
+                                           "bytes": path.stat().st_size})
+    if manifest:
+        manifest["total_rows"] += len(df)
+        manifest_path.write_text(json.dumps(manifest, indent=2), encoding="utf-8")
+    return written
+
+
+def update_features(processed_dir: Path = PROCESSED_PATH, raw_dir: Path = RAW_PATH,
+                    state_dir: Path = STATE_PATH) -> int:
+    """Append feature rows for every day in the sales file after the state's last day. Returns rows added."""
+    state, history, ewm_state = _load_state(state_dir)
+    config, last_day, horizon = state["config"], state["last_day"], state["history_days"]
+    new_days = [c for c in _day_columns(raw_dir) if int(c[2:]) > last_day]
+    if not new_days:
+        print(f"[incremental] Up to date (d_{last_day})")
+        return 0
+    table_last = int(read_features(processed_dir, columns=["d"])["d"].max())
+    if table_last != last_day:
+        raise ValueError(f"Feature table ends at d_{table_last} but the state at d_{last_day}; rerun --init")
+
+    # only the new day columns of the tracked series, in state order
+    sales = pd.read_csv(raw_dir / "sales_train_validation.csv", usecols=ID_COLS + new_days)
+    sales = sales.set_index("id").reindex(state["ids"])
+    if sales[new_days].isna().all(axis=1).any():
+        raise ValueError("Some tracked series have no rows in the new sales columns")
+    sales = sales.reset_index()[ID_COLS + new_days]
+    new_values = sales[new_days].to_numpy(dtype=np.float64)
+
+    # history tail + new days: every window ending on a new day lies inside it
+    y = np.hstack([history, new_values])
+    cums = _cumsums(y) if config["windows"] else None
+    features = {}
+    for k in config["lags"]:
+        features[f"lag_{k}"] = lag(y, k)[:, horizon:]
+    for w in config["windows"]:
+        for stat, values in rolling(y, w, config["stats"], cums).items():
+            features[f"rolling_{stat}_{w}"] = values[:, horizon:]
+    for i, span in enumerate(config["ewm_spans"]):
+        features[f"ewm_{span:g}"] = ewm(new_values, span, init=ewm_state[:, i])
+
+    # the same melt -> merge -> time features as a full build, on the new days only
+    calendar = pd.read_csv(raw_dir / "calendar.csv")
+    prices = pd.read_csv(raw_dir / "sell_prices.csv", dtype=PRICE_DTYPES)
+    prices = prices[(prices["wm_yr_wk"] >= state["last_week"]).to_numpy()].copy()
+    for col in ["store_id", "item_id"]:
+        prices[col] = prices[col].astype(str)
+    df = add_time_features(merge_data(melt_sales(sales), calendar, prices))
+    for name, values in features.items():
+        df[name] = values.ravel(order="F")  # melt order: all series for one day, then the next
+    df = apply_compact_schema(df)
+    stored = _table_columns(processed_dir)
+    df = df[[c for c in stored if c in df.columns] + [c for c in df.columns if c not in stored]]
+
+    first, last = int(new_days[0][2:]), int(new_days[-1][2:])
+    _write_rows(df, processed_dir, f"d{first:05d}-d{last:05d}")
+
+    state.update(last_day=last, last_week=_week_of(raw_dir, last))
+    ewm_next = np.column_stack([ewm_last(new_values, span, init=ewm_state[:, i])
+                                for i, span in enumerate(config["ewm_spans"])]) if config["ewm_spans"] else ewm_state
+    _save_state(state_dir, state, y[:, -horizon:], ewm_next)
+    return len(df)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Append features for new sales days without a full rebuild")
+    parser.add_argument("--init", action="store_true", help="(re)build the per-series state from the current table")
+    parser.add_argument("--processed", type=Path, default=PROCESSED_PATH)
+    parser.add_argument("--raw", type=Path, default=RAW_PATH)
+    parser.add_argument("--state", type=Path, default=None, help="state directory (default: <processed>/feature_state)")
+    args = parser.parse_args()
+    state_dir = args.state or args.processed / "feature_state"
+
+    start = time.perf_counter()
+    if args.init:
+        state = init_state(args.processed, args.raw, state_dir)
+        print(f"[incremental] State for {len(state['ids'])} series up to d_{state['last_day']} "
+              f"written to {state_dir} in {time.perf_counter() - start:.2f}s")
+    else:
+        rows = update_features(args.processed, args.raw, state_dir)
+        print(f"[incremental] Appended {rows} rows in {time.perf_counter() - start:.2f}s")
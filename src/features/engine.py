@@ -0,0 +1,187 @@
+# src/features/engine.py
+"""
+Grouped lag / rolling / EWM features on long-format sales.
+
+Rows are sorted once into a (n_series, n_days) matrix (one row per series,
+right-padded with NaN), so every feature is a vectorised kernel along the
+time axis and windows can never cross from one series into the next.
+All rolling and EWM features only look at days strictly before t (the
+same "shift(1)" convention as the original rolling means).
+"""
+import re
+from typing import Dict, Iterable, Sequence
+
+import numpy as np
+import pandas as pd
+
+ROLLING_STATS = ("mean", "std", "min", "max")
+_FEATURE_RE = re.compile(r"^(?:lag_(\d+)|rolling_(mean|std|min|max)_(\d+)|ewm_([0-9.e+-]+))$")
+
+
+class SeriesMatrix:
+    """Mapping between long-format rows and a padded series x time matrix."""
+
+    def __init__(self, ids, order):
+        codes, _ = pd.factorize(ids)  # works on categorical ids without materialising strings
+        perm = np.lexsort((np.asarray(order), codes))
+        sorted_codes = codes[perm]
+        starts = np.flatnonzero(np.r_[True, sorted_codes[1:] != sorted_codes[:-1]])
+        lengths = np.diff(np.r_[starts, len(perm)])
+        # (series, step) of every row, in original row order
+        self.series = np.empty(len(perm), dtype=np.int64)
+        self.step = np.empty(len(perm), dtype=np.int64)
+        self.series[perm] = np.repeat(np.arange(len(starts)), lengths)
+        self.step[perm] = np.arange(len(perm)) - np.repeat(starts, lengths)
+        self.shape = (len(starts), int(lengths.max()) if len(lengths) else 0)
+        self.flat = self.series * self.shape[1] + self.step
+
+    def to_matrix(self, values) -> np.ndarray:
+        out = np.full(self.shape, np.nan, dtype=np.float64)
+        out.ravel()[self.flat] = values
+        return out
+
+    def to_rows(self, matrix: np.ndarray) -> np.ndarray:
+        return np.take(matrix.ravel(), self.flat)
+
+
+def lag(y: np.ndarray, k: int) -> np.ndarray:
+    out = np.full_like(y, np.nan)
+    out[:, k:] = y[:, :-k] if k else y
+    return out
+
+
+def _cumsums(y: np.ndarray):
+    """Running sum, sum of squares and valid count with a leading zero column."""
+    valid = ~np.isnan(y)
+    y0 = np.where(valid, y, 0.0)
+    n, t = y.shape
+    out = []
+    for arr in (y0, y0 * y0, valid.astype(np.float64)):
+        cs = np.zeros((n, t + 1))
+        np.cumsum(arr, axis=1, out=cs[:, 1:])
+        out.append(cs)
+    return out
+
+
+def _window_sums(cums, w: int):
+    """Sum, sum of squares and valid count over y[:, t-w:t] (NaN where t < w)."""
+    sums = []
+    for cs in cums:
+        n, t = cs.shape[0], cs.shape[1] - 1
+        out = np.full((n, t), np.nan)
+        out[:, w:] = cs[:, w:t] - cs[:, : t - w]
+        sums.append(out)
+    return sums
+
+
+def _window_extreme(y: np.ndarray, w: int, fn) -> np.ndarray:
+    """
+    Min/max over y[:, t-w:t] in O(n*t) (van Herk / Gil-Werman): split time
+    into blocks of w, take running extremes forward and backward inside each
+    block, then combine one suffix and one prefix per window.
+    """
+    n, t = y.shape
+    nb = -(-t // w)
+    pad = np.full((n, nb * w), np.nan)
+    pad[:, :t] = y
+    blocks = pad.reshape(n, nb, w)
+    prefix = fn.accumulate(blocks, axis=2).reshape(n, -1)
+    suffix = fn.accumulate(blocks[:, :, ::-1], axis=2)[:, :, ::-1].reshape(n, -1)
+    out = np.full((n, t), np.nan)
+    # window for output t covers inputs [t-w, t-1]
+    out[:, w:] = fn(suffix[:, : t - w], prefix[:, w - 1 : t - 1])
+    return out
+
+
+def rolling(y: np.ndarray, w: int, stats: Iterable[str] = ("mean",), cums=None) -> Dict[str, np.ndarray]:
+    """
+    Rolling stats over the previous `w` days; NaN unless all w days are present.
+    Pass `cums=_cumsums(y)` to share the running sums across several windows.
+    """
+    s, ss, cnt = _window_sums(cums if cums is not None else _cumsums(y), w)
+    full = cnt == w
+    out = {}
+    for stat in stats:
+        if stat == "mean":
+            res = s / w
+        elif stat == "std":
+            var = (ss - s * s / w) / (w - 1) if w > 1 else np.full_like(s, np.nan)
+            res = np.sqrt(np.maximum(var, 0.0))
+        elif stat == "min":
+            res = _window_extreme(y, w, np.fmin)
+        elif stat == "max":
+            res = _window_extreme(y, w, np.fmax)
+        else:
+            raise ValueError(f"Unknown rolling stat {stat!r}, expected one of {ROLLING_STATS}")
+        out[stat] = np.where(full, res, np.nan)
+    return out
+
+
+def _ewm_step(state: np.ndarray, x: np.ndarray, alpha: float) -> np.ndarray:
+    return np.where(np.isnan(state), x, np.where(np.isnan(x), state, alpha * x + (1 - alpha) * state))
+
+
+def ewm(y: np.ndarray, span: float, init: np.ndarray = None) -> np.ndarray:
+    """
+    Exponentially weighted mean of the previous days (adjust=False, alpha=2/(span+1)).
+    Vectorised over series, recursive over time; missing days carry the last value.
+    `init` is the state carried in from days before y[:, 0] (see ewm_last).
+    """
+    alpha = 2.0 / (span + 1.0)
+    n, t = y.shape
+    out = np.full((n, t), np.nan)
+    state = np.full(n, np.nan) if init is None else np.asarray(init, dtype=np.float64)
+    if t:
+        out[:, 0] = state
+    for j in range(1, t):
+        state = _ewm_step(state, y[:, j - 1], alpha)
+        out[:, j] = state
+    return out
+
+
+def ewm_last(y: np.ndarray, span: float, init: np.ndarray = None) -> np.ndarray:
+    """EWM state after the last day of y, i.e. the ewm value of the day that follows."""
+    alpha = 2.0 / (span + 1.0)
+    state = np.full(y.shape[0], np.nan) if init is None else np.asarray(init, dtype=np.float64)
+    for j in range(y.shape[1]):
+        state = _ewm_step(state, y[:, j], alpha)
+    return state
+
+
+def build_lag_features(df: pd.DataFrame, target: str = "sales", id_col: str = "id", order_col: str = "date",
+                       lags: Sequence[int] = (7, 14, 28), windows: Sequence[int] = (7, 28),
+                       stats: Sequence[str] = ("mean",), ewm_spans: Sequence[float] = ()) -> Dict[str, np.ndarray]:
+    """
+    Feature columns (lag_k, rolling_<stat>_w, ewm_span) for every row of
+    `df`, aligned to its current row order.
+    """
+    layout = SeriesMatrix(df[id_col], df[order_col].to_numpy())
+    y = layout.to_matrix(df[target].to_numpy(dtype=np.float64))
+    cums = _cumsums(y) if windows else None
+    out = {}
+    for k in lags:
+        out[f"lag_{k}"] = layout.to_rows(lag(y, k))
+    for w in windows:
+        for stat, values in rolling(y, w, stats, cums).items():
+            out[f"rolling_{stat}_{w}"] = layout.to_rows(values)
+    for span in ewm_spans:
+        out[f"ewm_{span:g}"] = layout.to_rows(ewm(y, span))
+    return out
+
+
+def config_from_columns(columns) -> dict:
+    """Recover the feature config (lags, windows, stats, ewm_spans) from the table's column names."""
+    config = {"lags": [], "windows": [], "stats": [], "ewm_spans": []}
+    for col in columns:
+        m = _FEATURE_RE.match(col)
+        if not m:
+            continue
+        k, stat, w, span = m.groups()
+        if k:
+            config["lags"].append(int(k))
+        elif stat:
+            config["windows"] += [int(w)] if int(w) not in config["windows"] else []
+            config["stats"] += [stat] if stat not in config["stats"] else []
+        else:
+            config["ewm_spans"].append(float(span))
+    return config
@@ -0,0 +1,339 @@
+# src/features/online_store.py
+"""
+Online feature store: the sales-history features of the ETL output
+(lag_*, rolling_*, ewm_*) as memory-mapped (series, day) tables, so the
+serving path can look up the exact values the lag model was trained on.
+
+    python -m src.features.online_store                       # data/processed -> data/feature_store
+    python -m src.features.online_store --last-days 400       # only the most recent days
+
+Layout: one float32 .npy per feature, shape (n_series + 1, n_days + 1),
+row = position of the series id, column = day - first day; the trailing row
+and column are NaN sentinels, so unknown ids gather NaN (what a series
+without enough history has in training) without branching. store.json holds
+the ids and the day/date offset; manifest.json is written last and the
+directory is swapped into place whole, like the serving bundle.
+
+The table ends at the last ETL day, but requests are for the days after it,
+so the store also covers the next `horizon` days (default: the smallest
+lag). Their lag_k values are exact: sales of day t - k are already known.
+rolling_* / ewm_* need every day before t, so they are exact for the first
+extra day only and NaN after it (the value a window without full history
+has in training too). store.json records how many extra days each feature
+is exact for ("known_ahead"); LagFeatures.missing_features names the ones a
+request gets as NaN, and app.py reports them. LagFeatures refuses dates
+outside first day..horizon instead of scoring them on missing history; the
+recursive forecaster covers later days.
+
+The build streams the feature table one Parquet row group at a time into
+the memory-mapped tables, so it needs the memory of a row group, not of
+the table. Rerun it after the ETL (full or incremental) to pick up new days.
+"""
+import argparse
+import json
+import shutil
+import time
+from datetime import date, datetime, timezone
+from pathlib import Path
+from typing import Dict, List, Optional, Sequence
+
+import numpy as np
+import pandas as pd
+import pyarrow.parquet as pq
+
+from src.features.engine import config_from_columns, ewm_last, lag, rolling
+from src.features.schema import FLOAT_FEATURE_PREFIXES, day_index, features_path
+
+BASE_DIR = Path(__file__).resolve().parents[2]
+PROCESSED_PATH = BASE_DIR / "data" / "processed"
+STORE_PATH = BASE_DIR / "data" / "feature_store"
+
+_EPOCH_ORDINAL = date(1970, 1, 1).toordinal()
+
+
+def _row_groups(source: Path):
+    files = [source] if source.is_file() else sorted(
+        p for p in source.rglob("*.parquet") if not p.name.startswith(("_", ".")))
+    for path in files:
+        pf = pq.ParquetFile(path)
+        for rg in range(pf.metadata.num_row_groups):
+            yield pf, rg
+
+
+def _days(d: pd.Series) -> np.ndarray:
+    return (d.to_numpy() if pd.api.types.is_numeric_dtype(d) else day_index(d)).astype(np.int64)
+
+
+def known_ahead(features: Sequence[str], horizon: int) -> Dict[str, int]:
+    """Extra days after the ETL each feature is exact for: all of them for lags, the first one for windows."""
+    return {f: horizon if config_from_columns([f])["lags"] else min(horizon, 1) for f in features}
+
+
+def _extend(arrays: Dict[str, np.ndarray], tail: np.ndarray, last_col: int, horizon: int) -> None:
+    """
+    Fill the `horizon` columns after `last_col` from the sales of the last
+    tail.shape[1] days: lags shifted from the tail, rolling / ewm for the
+    first day after it only (later days keep their NaN, see known_ahead).
+    """
+    n, width = tail.shape
+    y = np.concatenate([tail, np.full((n, horizon), np.nan)], axis=1)
+    for name, arr in arrays.items():
+        config = config_from_columns([name])
+        if config["lags"]:
+            arr[:n, last_col + 1:last_col + 1 + horizon] = lag(y, config["lags"][0])[:, width:]
+        elif config["windows"]:
+            stat = config["stats"][0]
+            arr[:n, last_col + 1] = rolling(y[:, :width + 1], config["windows"][0], (stat,))[stat][:, width]
+        else:
+            arr[:n, last_col + 1] = ewm_last(tail[:, -1:], config["ewm_spans"][0],
+                                             init=arr[:n, last_col].astype(np.float64))
+
+
+class OnlineFeatureStore:
+    def __init__(self, arrays: Dict[str, np.ndarray], ids: Sequence[str], first_day: int, epoch_offset: int,
+                 last_day: Optional[int] = None, known: Optional[Dict[str, int]] = None):
+        self.arrays = arrays
+        self.features = list(arrays)
+        self.ids = pd.Index(ids)
+        self.first_day = first_day  # d of column 0
+        self.epoch_offset = epoch_offset  # d = days since 1970-01-01 - epoch_offset
+        self.n_days = next(iter(arrays.values())).shape[1] - 1 if arrays else 0
+        self.end_day = first_day + self.n_days - 1  # last day with features (last ETL day + horizon)
+        self.last_day = self.end_day if last_day is None else last_day  # last day of the ETL table
+        # days after last_day each feature is exact for (NaN after that)
+        self.known_ahead = known if known is not None else known_ahead(self.features, self.end_day - self.last_day)
+        # "<store>|<item>" for requests that carry store_id / item_id instead of the series id
+        pairs = [self._pair_from_id(i) for i in ids]
+        self.pairs = pd.Index(pairs)
+        self.id_pos = {s: i for i, s in enumerate(ids)}
+        self.pair_pos = {p: i for i, p in enumerate(pairs) if p is not None}
+
+    @staticmethod
+    def _pair_from_id(series_id: str) -> Optional[str]:
+        # FOODS_1_001_CA_1_validation -> CA_1|FOODS_1_001 (item ids have 3 parts, store ids 2)
+        parts = str(series_id).split("_")
+        if len(parts) < 6:
+            return None
+        return "_".join(parts[3:5]) + "|" + "_".join(parts[:3])
+
+    @classmethod
+    def build(cls, processed_dir: Path = PROCESSED_PATH, out_dir: Path = STORE_PATH,
+              features: Optional[Sequence[str]] = None, last_days: Optional[int] = None,
+              horizon: Optional[int] = None) -> dict:
+        start = time.perf_counter()
+        source = features_path(processed_dir)
+        first = next(_row_groups(source), None)
+        if first is None:
+            raise FileNotFoundError(f"No feature table at {source}")
+        names = first[0].schema_arrow.names
+        features = list(features or [c for c in names if c.startswith(FLOAT_FEATURE_PREFIXES)])
+        if not features:
+            raise ValueError(f"No lag / rolling / ewm columns in {source}")
+        config = config_from_columns(features)
+        min_lag = min(config["lags"], default=1)  # rolling / ewm alone: exact one day ahead
+        horizon = min_lag if horizon is None else horizon
+        if not 0 <= horizon <= min_lag:
+            raise ValueError(f"horizon must be in 0..{min_lag} (the smallest lag), got {horizon}")
+        tail_days = max(config["lags"] + config["windows"] + [1])  # sales history the extra days read
+
+        # pass 1: ids, day range and the day <-> date offset
+        ids, lo, hi, epoch_offset = set(), None, None, None
+        for pf, rg in _row_groups(source):
+            df = pf.read_row_group(rg, columns=["id", "d", "date"]).to_pandas()
+            ids.update(df["id"].astype(str).unique())
+            d = _days(df["d"])
+            lo = d.min() if lo is None else min(lo, d.min())
+            hi = d.max() if hi is None else max(hi, d.max())
+            if epoch_offset is None and len(df):
+                epoch_offset = int(pd.Timestamp(df["date"].iloc[0]).to_datetime64().astype("datetime64[D]")
+                                   .astype(np.int64)) - int(d[0])
+        if last_days:
+            lo = max(lo, hi - last_days + 1)
+        ids = sorted(ids)
+        id_index = pd.Index(ids)
+        n_days = int(hi - lo + 1) + horizon
+
+        out_dir = Path(out_dir)
+        tmp_dir = out_dir.with_name(out_dir.name + ".tmp")
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+        tmp_dir.mkdir(parents=True)
+        arrays = {}
+        for f in features:
+            arr = np.lib.format.open_memmap(tmp_dir / f"{f}.npy", mode="w+", dtype=np.float32,
+                                            shape=(len(ids) + 1, n_days + 1))
+            arr[:] = np.nan
+            arrays[f] = arr
+
+        # pass 2: scatter every row group into the tables, keeping the sales tail for the extra days
+        rows = 0
+        tail = np.full((len(ids), tail_days), np.nan)
+        for pf, rg in _row_groups(source):
+            df = pf.read_row_group(rg, columns=["id", "d", "sales"] + features).to_pandas()
+            day = _days(df["d"])
+            col = day - lo
+            keep = (col >= 0) & (col <= hi - lo)
+            row = id_index.get_indexer(df["id"].astype(str))
+            for f in features:
+                arrays[f][row[keep], col[keep]] = df[f].to_numpy(dtype=np.float32)[keep]
+            recent = day > hi - tail_days
+            tail[row[recent], (day - hi + tail_days - 1)[recent]] = df["sales"].to_numpy(dtype=np.float64)[recent]
+            rows += int(keep.sum())
+        if horizon:
+            _extend(arrays, tail, int(hi - lo), horizon)
+        for arr in arrays.values():
+            arr.flush()
+        del arrays
+
+        known = known_ahead(features, horizon)
+        layout = {"ids": ids, "first_day": int(lo), "last_day": int(hi), "epoch_offset": epoch_offset,
+                  "features": features, "known_ahead": known}
+        with open(tmp_dir / "store.json", "w", encoding="utf-8") as f:
+            json.dump(layout, f)
+        manifest = {
+            "created_at": datetime.now(timezone.utc).isoformat(),
+            "source": str(source),
+            "features": features,
+            "n_series": len(ids),
+            "first_day": int(lo),
+            "last_day": int(hi),
+            "horizon": horizon,
+            "known_ahead": known,
+            "rows": rows,
+            "build_seconds": round(time.perf_counter() - start, 3),
+        }
+        with open(tmp_dir / "manifest.json", "w", encoding="utf-8") as f:
+            json.dump(manifest, f, indent=2)
+        shutil.rmtree(out_dir, ignore_errors=True)
+        tmp_dir.rename(out_dir)
+        return manifest
+
+    @classmethod
+    def load(cls, store_dir: Path = STORE_PATH, mmap: bool = True) -> "OnlineFeatureStore":
+        store_dir = Path(store_dir)
+        with open(store_dir / "store.json", "r", encoding="utf-8") as f:
+            layout = json.load(f)
+        arrays = {}
+        for name in layout["features"]:
+            arr = np.load(store_dir / f"{name}.npy", mmap_mode="r" if mmap else None)
+            arrays[name] = arr.view(np.ndarray) if mmap else arr
+        return cls(arrays, layout["ids"], layout["first_day"], layout["epoch_offset"], layout.get("last_day"),
+                   layout.get("known_ahead"))
+
+    def day_numbers(self, dates) -> np.ndarray:
+        """M5 day numbers (d) of request dates; defined for any date, not only those in the store."""
+        days = pd.to_datetime(pd.Series(dates)).to_numpy().astype("datetime64[D]").astype(np.int64)
+        return days - self.epoch_offset
+
+    def missing_features(self, days) -> List[str]:
+        """Features that are NaN on some of the M5 `days` because their window reaches past the ETL."""
+        ahead = int(np.max(days)) - self.last_day if len(days) else 0
+        return [f for f in self.features if ahead > self.known_ahead.get(f, 0)]
+
+    def date_of(self, day: int) -> str:
+        return str(np.datetime64(int(day) + self.epoch_offset, "D"))
+
+    def positions(self, dates, ids=None, store_ids=None, item_ids=None):
+        """(row, column, d) for each request; rows / columns outside the store point at the NaN sentinels."""
+        if ids is not None:
+            row = self.ids.get_indexer(pd.Series(ids, dtype=object).astype(str))
+        else:
+            keys = pd.Series(store_ids, dtype=object).astype(str) + "|" + pd.Series(item_ids, dtype=object).astype(str)
+            row = self.pairs.get_indexer(keys)
+        d = self.day_numbers(dates)
+        col = d - self.first_day
+        col[(col < 0) | (col >= self.n_days)] = -1
+        return row, col, d
+
+    def lookup(self, dates, features: Sequence[str], ids=None, store_ids=None, item_ids=None) -> np.ndarray:
+        """(n, len(features)) float64 of batched point lookups; NaN for unknown series / days."""
+        row, col, _ = self.positions(dates, ids, store_ids, item_ids)
+        out = np.empty((len(row), len(features)), dtype=np.float64)
+        for j, f in enumerate(features):
+            out[:, j] = self.arrays[f][row, col]
+        return out
+
+    def lookup_row(self, date_str: str, features: Sequence[str], series_id: str = None, store_id: str = None,
+                   item_id: str = None) -> List[float]:
+        """Single-row lookup without pandas: dict position and an ISO date parse."""
+        row = self.id_pos.get(series_id, -1) if series_id is not None else self.pair_pos.get(f"{store_id}|{item_id}", -1)
+        col = date.fromisoformat(str(date_str)[:10]).toordinal() - _EPOCH_ORDINAL - self.epoch_offset - self.first_day
+        if not 0 <= col < self.n_days:
+            col = -1
+        return [float(self.arrays[f][row, col]) for f in features]
+
+
+class LagFeatures:
+    """
+    Lag model rows for raw {"store_id", "item_id", "date"} requests: calendar,
+    price and item meta gathered from a ServingIndex built with the model's
+    category levels, d / id and the lag / rolling features from the store.
+
+    The index keeps app_nolag's serving conventions; the columns where they
+    differ from the feature table (wday, state_id, missing sell_price) get the
+    training values here. Dates outside the store raise ValueError.
+    """
+
+    def __init__(self, store: OnlineFeatureStore, index, train_cols: Sequence[str], cat_maps: dict):
+        self.store = store
+        self.index = index
+        self.train_cols = list(train_cols)
+        # trailing -1 for the store's sentinel row (unknown series)
+        self.id_codes = np.append(pd.Index(cat_maps.get("id", [])).get_indexer(store.ids), -1)
+        self.state_levels = pd.Index(cat_maps.get("state_id", []))
+        self.missing = [c for c in self.train_cols if c.startswith(FLOAT_FEATURE_PREFIXES) and c not in store.arrays]
+
+    def missing_features(self, dates) -> List[str]:
+        """Model features the store sends as NaN for these dates (windows not yet known, see known_ahead)."""
+        return [f for f in self.store.missing_features(self.store.day_numbers(dates)) if f in self.train_cols]
+
+    def transform(self, store_ids, item_ids, dates, timer=None) -> np.ndarray:
+        stores = pd.Series(store_ids, dtype=object).reset_index(drop=True)
+        if stores.isna().any():  # store omitted -> the store the item was seen in, as the index does
+            item_pos = self.index.items.get_indexer(pd.Series(item_ids, dtype=object))
+            names = np.append(np.asarray(self.index.stores, dtype=object), None)
+            stores = stores.where(stores.notna(), pd.Series(names[self.index.arrays["item_store_pos"][item_pos]]))
+        row, col, d = self.store.positions(dates, store_ids=stores, item_ids=item_ids)
+        outside = np.flatnonzero(col == -1)
+        if len(outside):
+            raise ValueError(f"{len(outside)} date(s) outside the feature store's "
+                             f"{self.store.date_of(self.store.first_day)}..{self.store.date_of(self.store.end_day)}, "
+                             f"e.g. {self.store.date_of(d[outside[0]])}")
+        X = self.index.transform(stores, item_ids, dates, self.train_cols)
+        if timer is not None:
+            timer.mark("gather")
+        for j, c in enumerate(self.train_cols):
+            if c in self.store.arrays:
+                X[:, j] = self.store.arrays[c][row, col]
+            elif c == "d":
+                X[:, j] = d
+            elif c == "id":
+                X[:, j] = self.id_codes[row]
+            elif c == "wday":
+                X[:, j] = (d - 1) % 7 + 1  # M5 wday: 1 = Saturday, d_1 was a Saturday
+            elif c == "state_id":
+                X[:, j] = self.state_levels.get_indexer(stores.astype(str).str.split("_").str[0])
+            elif c == "sell_price":
+                X[X[:, j] == -1, j] = np.nan  # no price that week, NaN as in the feature table
+        if timer is not None:
+            timer.mark("feature_store")
+        return X
+
+
+def store_exists(store_dir: Path = STORE_PATH) -> bool:
+    return (Path(store_dir) / "manifest.json").exists()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Build the online feature store from the ETL feature table")
+    parser.add_argument("--processed", type=Path, default=PROCESSED_PATH)
+    parser.add_argument("--out", type=Path, default=STORE_PATH)
+    parser.add_argument("--features", help="comma-separated columns (default: every lag_/rolling_/ewm_ column)")
+    parser.add_argument("--last-days", type=int, help="keep only the most recent N days")
+    parser.add_argument("--horizon", type=int, help="days after the table to cover (default: the smallest lag)")
+    args = parser.parse_args()
+
+    feats = [c for c in args.features.split(",") if c] if args.features else None
+    manifest = OnlineFeatureStore.build(args.processed, args.out, feats, args.last_days, args.horizon)
+    print(f"Online feature store written to {args.out} in {manifest['build_seconds']}s "
+          f"({manifest['n_series']} series x d_{manifest['first_day']}..d_{manifest['last_day']} "
+          f"+ {manifest['horizon']} days ahead, {len(manifest['features'])} features)")
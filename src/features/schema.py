@@ -0,0 +1,119 @@
+# src/features/schema.py
+"""
+Compact dtypes for the long-format feature table.
+
+Applied at the end of the ETL (so train_features.parquet is written with
+dictionary-encoded strings and narrow numerics) and again on load, which
+also shrinks tables written before the schema existed.
+"""
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+# repeated strings -> pandas category (dictionary-encoded in Parquet)
+CATEGORICAL_COLS = [
+    "id", "item_id", "dept_id", "cat_id", "store_id", "state_id", "weekday",
+    "event_name_1", "event_type_1", "event_name_2", "event_type_2",
+]
+
+# narrow numerics; sell_price stays float64 because the trees split within
+# an ulp of observed prices and float32 storage changes predictions
+NUMERIC_DTYPES = {
+    "sales": "int16",
+    "d": "int16",  # "d_1913" -> 1913
+    "wm_yr_wk": "int16",
+    "wday": "uint8",
+    "month": "uint8",
+    "year": "int16",
+    "snap_CA": "uint8",
+    "snap_TX": "uint8",
+    "snap_WI": "uint8",
+    "dayofweek": "uint8",
+    "quarter": "uint8",
+    "sell_price": "float64",
+}
+
+# engineered history features (lag_7, rolling_mean_28, ewm_7, ...)
+FLOAT_FEATURE_PREFIXES = ("lag_", "rolling_", "ewm_")
+FLOAT_FEATURE_DTYPE = "float32"
+
+# dtypes for the raw CSVs read by the serving path
+CALENDAR_DTYPES = {"wm_yr_wk": "int16", "weekday": "category", "wday": "uint8", "month": "uint8",
+                   "year": "int16", "d": "category", "snap_CA": "uint8", "snap_TX": "uint8", "snap_WI": "uint8",
+                   "event_name_1": "category", "event_type_1": "category",
+                   "event_name_2": "category", "event_type_2": "category"}
+PRICE_DTYPES = {"store_id": "category", "item_id": "category", "wm_yr_wk": "int16", "sell_price": "float64"}
+
+
+def day_index(values) -> np.ndarray:
+    """'d_1913' style day labels -> int16 day numbers (parsed once per distinct label)."""
+    codes, uniques = pd.factorize(pd.Series(values), use_na_sentinel=False)
+    days = np.array([int(str(u).rsplit("_", 1)[-1]) for u in uniques], dtype=np.int16)
+    return days[codes]
+
+
+def apply_compact_schema(df: pd.DataFrame) -> pd.DataFrame:
+    """Cast known columns in place to the compact schema; unknown columns are left alone."""
+    for col in CATEGORICAL_COLS:
+        if col in df.columns and not isinstance(df[col].dtype, pd.CategoricalDtype):
+            df[col] = df[col].astype("category")
+    for col, dtype in NUMERIC_DTYPES.items():
+        if col not in df.columns or df[col].dtype == dtype:
+            continue
+        if col == "d" and not pd.api.types.is_numeric_dtype(df[col]):
+            df[col] = day_index(df[col])
+        elif np.dtype(dtype).kind in "iu" and df[col].isna().any():
+            continue  # integer dtypes can't hold NaN; keep the column as it is
+        else:
+            df[col] = df[col].astype(dtype)
+    for col in df.columns:
+        if col.startswith(FLOAT_FEATURE_PREFIXES) and df[col].dtype != FLOAT_FEATURE_DTYPE:
+            df[col] = df[col].astype(FLOAT_FEATURE_DTYPE)
+    return df
+
+
+def category_codes(s: pd.Series) -> pd.Series:
+    """
+    Integer codes with categories = sorted observed values, the same codes
+    `object_column.astype("category").cat.codes` gives, for object and
+    categorical columns alike.
+    """
+    if isinstance(s.dtype, pd.CategoricalDtype):
+        s = s.cat.remove_unused_categories()
+        return s.cat.set_categories(sorted(s.cat.categories)).cat.codes
+    return s.astype("category").cat.codes
+
+
+_warned_layouts = set()
+
+
+def _last_written(path: Path) -> float:
+    if path.is_file():
+        return path.stat().st_mtime
+    return max((p.stat().st_mtime for p in path.rglob("*.parquet")), default=0.0)
+
+
+def features_path(processed_dir: Path) -> Path:
+    """
+    train_features.parquet, or the partitioned train_features/ dataset written
+    by --stream / build_features_parallel. When both exist, the one written
+    last (newest Parquet file) is the current table.
+    """
+    single = Path(processed_dir) / "train_features.parquet"
+    dataset = Path(processed_dir) / "train_features"
+    if not dataset.exists():
+        return single
+    if not single.exists():
+        return dataset
+    newer, older = (dataset, single) if _last_written(dataset) >= _last_written(single) else (single, dataset)
+    if (newer, older) not in _warned_layouts:
+        _warned_layouts.add((newer, older))
+        print(f"[schema] Both {single.name} and {dataset.name}/ exist; using the newer {newer} "
+              f"(delete {older} to silence this)")
+    return newer
+
+
+def read_features(processed_dir: Path, columns=None) -> pd.DataFrame:
+    """Load the feature table (file or dataset) with the compact schema applied."""
+    return apply_compact_schema(pd.read_parquet(features_path(processed_dir), columns=columns))
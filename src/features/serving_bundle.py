@@ -0,0 +1,228 @@
+# src/features/serving_bundle.py
+"""
+Build step for the serving bundle: everything app_nolag needs at startup,
+written once so the API only maps files instead of parsing CSVs.
+
+    python -m src.features.serving_bundle --out data/serving_bundle
+
+Layout: ServingIndex tables as .npy files + index.json, a copy of the model,
+feature_columns.json, cat_mappings.json and manifest.json (written last,
+so a bundle without a manifest is never picked up half-written).
+
+ensure_bundle builds it on first use under a file lock, so when several
+uvicorn workers start together one builds and the rest wait and map the
+result; the .npy tables then live once in the page cache, shared by every
+worker, instead of once per process.
+
+The manifest stamps (size, mtime) every source. stale_sources() lists those
+changed since the build, e.g. a model retrained by train_model_nolag.py;
+ensure_bundle rebuilds a stale bundle. Sources that are missing don't count,
+so a bundle shipped on its own still loads.
+"""
+import argparse
+import json
+import os
+import shutil
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import List
+
+import joblib
+import pandas as pd
+
+from src.api.cache import model_fingerprint
+from src.features.schema import CALENDAR_DTYPES, PRICE_DTYPES, features_path, read_features
+from src.features.serving_index import ServingIndex
+
+BASE_DIR = Path(__file__).resolve().parents[2]
+RAW_PATH = BASE_DIR / "data" / "raw"
+PROCESSED_PATH = BASE_DIR / "data" / "processed"
+MODELS_PATH = BASE_DIR / "models"
+BUNDLE_PATH = BASE_DIR / "data" / "serving_bundle"
+
+META_COLS = ["item_id", "dept_id", "cat_id", "store_id", "state_id"]
+
+
+def load_sources(raw_dir: Path = RAW_PATH, processed_dir: Path = PROCESSED_PATH):
+    """calendar, sell_prices and one meta row per item (first occurrence wins), in compact dtypes."""
+    calendar = pd.read_csv(raw_dir / "calendar.csv", dtype=CALENDAR_DTYPES)
+    sell_prices = pd.read_csv(raw_dir / "sell_prices.csv", dtype=PRICE_DTYPES)
+    meta = read_features(processed_dir, columns=META_COLS)
+    meta = meta.drop_duplicates(subset=["item_id"])
+    return calendar, sell_prices, meta
+
+
+def _stamp(path: Path) -> dict:
+    """Size and mtime of a file, or of the Parquet files of a dataset directory (newest mtime)."""
+    if path.is_dir():
+        stats = [p.stat() for p in path.rglob("*.parquet")]
+        return {"size": sum(st.st_size for st in stats), "mtime": max((st.st_mtime for st in stats), default=0.0)}
+    st = path.stat()
+    return {"size": st.st_size, "mtime": st.st_mtime}
+
+
+def build_bundle(out_dir: Path = BUNDLE_PATH, raw_dir: Path = RAW_PATH, processed_dir: Path = PROCESSED_PATH,
+                 model_path: Path = MODELS_PATH / "baseline_lightgbm_nolag.joblib",
+                 feature_path: Path = MODELS_PATH / "feature_columns_nolag.json",
+                 cat_path: Path = MODELS_PATH / "cat_mappings_nolag.json") -> dict:
+    start = time.perf_counter()
+    out_dir = Path(out_dir)
+    tmp_dir = out_dir.with_name(out_dir.name + ".tmp")
+    shutil.rmtree(tmp_dir, ignore_errors=True)
+    tmp_dir.mkdir(parents=True)
+
+    with open(feature_path, "r", encoding="utf-8") as f:
+        train_cols = json.load(f)
+    with open(cat_path, "r", encoding="utf-8") as f:
+        cat_maps = json.load(f)
+
+    calendar, sell_prices, meta = load_sources(raw_dir, processed_dir)
+    index = ServingIndex.build(calendar, sell_prices, meta, cat_maps)
+    layout = index.save(tmp_dir)
+
+    shutil.copyfile(model_path, tmp_dir / "model.joblib")
+    shutil.copyfile(feature_path, tmp_dir / "feature_columns.json")
+    shutil.copyfile(cat_path, tmp_dir / "cat_mappings.json")
+
+    feature_table = features_path(processed_dir)
+    sources = [raw_dir / "calendar.csv", raw_dir / "sell_prices.csv", feature_table, model_path, feature_path,
+               cat_path]
+    manifest = {
+        "created_at": datetime.now(timezone.utc).isoformat(),
+        "model_fingerprint": model_fingerprint(tmp_dir / "model.joblib", train_cols, cat_maps),
+        "n_features": len(train_cols),
+        "n_stores": len(layout["stores"]),
+        "n_items": len(layout["items"]),
+        "arrays": layout["arrays"],
+        "sources": {str(p): _stamp(Path(p)) for p in sources},
+        "feature_table": str(feature_table),
+        "build_seconds": round(time.perf_counter() - start, 3),
+    }
+    with open(tmp_dir / "manifest.json", "w", encoding="utf-8") as f:
+        json.dump(manifest, f, indent=2)
+
+    # swap the finished bundle into place
+    shutil.rmtree(out_dir, ignore_errors=True)
+    tmp_dir.rename(out_dir)
+    return manifest
+
+
+def bundle_exists(bundle_dir: Path = BUNDLE_PATH) -> bool:
+    return (Path(bundle_dir) / "manifest.json").exists()
+
+
+def stale_sources(bundle_dir: Path = BUNDLE_PATH) -> List[str]:
+    """Sources whose size or mtime changed since the bundle was built (missing ones are skipped)."""
+    with open(Path(bundle_dir) / "manifest.json", "r", encoding="utf-8") as f:
+        manifest = json.load(f)
+    stale = [path for path, stamp in manifest.get("sources", {}).items()
+             if Path(path).exists() and _stamp(Path(path)) != stamp]
+    table = manifest.get("feature_table")
+    if table and Path(table).parent.exists() and features_path(Path(table).parent) != Path(table):
+        stale.append(str(features_path(Path(table).parent)))  # a newer table layout replaced the one built from
+    return stale
+
+
+def _current(bundle_dir: Path) -> bool:
+    return bundle_exists(bundle_dir) and not stale_sources(bundle_dir)
+
+
+def ensure_bundle(bundle_dir: Path = BUNDLE_PATH, raw_dir: Path = RAW_PATH, processed_dir: Path = PROCESSED_PATH,
+                  **artifacts) -> bool:
+    """
+    Build the bundle unless a current one exists (a stale one is rebuilt);
+    concurrent callers wait on <bundle_dir>.lock. True if this call built it.
+    """
+    bundle_dir = Path(bundle_dir)
+    if _current(bundle_dir):
+        return False
+    try:
+        import fcntl
+    except ImportError:  # no flock (Windows): the first caller builds, a concurrent one may build again
+        fcntl = None
+
+    bundle_dir.parent.mkdir(parents=True, exist_ok=True)
+    with open(bundle_dir.with_name(bundle_dir.name + ".lock"), "w") as lock:
+        if fcntl is not None:
+            t = time.perf_counter()
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            waited = time.perf_counter() - t
+            if waited > 0.1:
+                print(f"[bundle] pid {os.getpid()} waited {waited:.1f}s for another worker's build")
+        if _current(bundle_dir):
+            return False
+        stale = stale_sources(bundle_dir) if bundle_exists(bundle_dir) else []
+        reason = f" ({', '.join(stale)} changed since the last build)" if stale else ""
+        print(f"[bundle] pid {os.getpid()} building {bundle_dir}{reason}")
+        build_bundle(bundle_dir, raw_dir, processed_dir, **artifacts)
+        return True
+
+
+def memory_usage() -> dict:
+    """
+    This process's memory in MB from /proc (Linux; empty elsewhere): rss, its
+    anonymous (private heap) and file-backed (mapped, shareable) parts, and pss,
+    which splits shared pages between the processes mapping them, so the pss of
+    all workers adds up to what they really use together.
+    """
+    out = {}
+    fields = {"VmRSS": "rss", "RssAnon": "rss_anon", "RssFile": "rss_file", "Pss": "pss"}
+    for path in ("/proc/self/status", "/proc/self/smaps_rollup"):
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                for line in f:
+                    key, _, value = line.partition(":")
+                    if key in fields and fields[key] not in out:
+                        out[fields[key]] = round(int(value.split()[0]) / 1024, 1)
+        except OSError:
+            pass
+    return out
+
+
+def load_bundle(bundle_dir: Path = BUNDLE_PATH, timings: dict = None) -> dict:
+    """Map a built bundle. Fills `timings` (seconds per stage) when given."""
+    bundle_dir = Path(bundle_dir)
+    timings = {} if timings is None else timings
+
+    t = time.perf_counter()
+    with open(bundle_dir / "manifest.json", "r", encoding="utf-8") as f:
+        manifest = json.load(f)
+    with open(bundle_dir / "feature_columns.json", "r", encoding="utf-8") as f:
+        train_cols = json.load(f)
+    with open(bundle_dir / "cat_mappings.json", "r", encoding="utf-8") as f:
+        cat_maps = json.load(f)
+    timings["manifest"] = time.perf_counter() - t
+
+    t = time.perf_counter()
+    import lightgbm  # noqa: F401  (pulls in sklearn; usually the largest share of a cold start)
+    timings["import_lightgbm"] = time.perf_counter() - t
+
+    t = time.perf_counter()
+    model = joblib.load(bundle_dir / "model.joblib")
+    timings["model"] = time.perf_counter() - t
+
+    t = time.perf_counter()
+    index = ServingIndex.load(bundle_dir, mmap=True)
+    timings["index_mmap"] = time.perf_counter() - t
+
+    return {
+        "manifest": manifest,
+        "model": model,
+        "train_cols": train_cols,
+        "cat_maps": cat_maps,
+        "index": index,
+        "fingerprint": manifest["model_fingerprint"],
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Build the memory-mappable serving bundle for app_nolag")
+    parser.add_argument("--out", type=Path, default=BUNDLE_PATH)
+    parser.add_argument("--raw", type=Path, default=RAW_PATH)
+    parser.add_argument("--processed", type=Path, default=PROCESSED_PATH)
+    args = parser.parse_args()
+
+    manifest = build_bundle(args.out, args.raw, args.processed)
+    print(f"Serving bundle written to {args.out} in {manifest['build_seconds']}s "
+          f"({manifest['n_stores']} stores, {manifest['n_items']} items)")
@@ -0,0 +1,240 @@
+# src/features/serving_index.py
+import json
+from datetime import date as _date
+from pathlib import Path
+from typing import Dict, List, Sequence
+
+import numpy as np
+import pandas as pd
+
+CALENDAR_CODED = ["weekday", "event_name_1", "event_type_1", "event_name_2", "event_type_2"]
+CALENDAR_NUMERIC = ["wm_yr_wk", "month", "year", "snap_CA", "snap_TX", "snap_WI"]
+ITEM_CODED = ["dept_id", "cat_id", "state_id"]
+DATE_PARTS = ["date_year", "date_month", "date_day", "dayofweek", "wday", "quarter"]
+EPOCH_ORDINAL = _date(1970, 1, 1).toordinal()
+
+
+def _encode(values, levels) -> np.ndarray:
+    """Category codes of `values` against trained `levels` (-1 for unknown or missing)."""
+    values = pd.Series(values, dtype=object)
+    codes = pd.Index(levels).get_indexer(values.astype(str))
+    codes[values.isna().to_numpy()] = -1
+    return codes.astype(np.int32)
+
+
+def _with_sentinel(arr: np.ndarray, fill) -> np.ndarray:
+    """Append one `fill` slot on every axis so a -1 position gathers the missing value."""
+    pad = [(0, 1)] * arr.ndim
+    return np.pad(arr, pad, constant_values=fill)
+
+
+class ServingIndex:
+    """
+    Dense, integer-addressed lookup tables for request-time features.
+
+    * price[store, item, week]  -> sell_price (-1 when not sold that week)
+    * calendar[day]             -> calendar columns, already category-encoded
+    * item[item]                -> item_id / dept_id / cat_id / state_id codes + default store
+    * store[store]              -> store_id code
+
+    Every table carries one trailing sentinel slot holding the "missing" value,
+    so unknown stores, items or dates (position -1) gather it without branching.
+    """
+
+    def __init__(self, arrays: Dict[str, np.ndarray], stores: Sequence[str], items: Sequence[str], day0: int):
+        self.arrays = arrays
+        self.stores = pd.Index(stores)
+        self.items = pd.Index(items)
+        self.day0 = day0
+        self.n_days = len(arrays["cal_wm_yr_wk"]) - 1
+        # plain dicts for the single-row path, pd.Index.get_indexer for batches
+        self.store_pos = {s: i for i, s in enumerate(stores)}
+        self.item_pos = {s: i for i, s in enumerate(items)}
+
+    @classmethod
+    def build(cls, calendar: pd.DataFrame, sell_prices: pd.DataFrame, item_meta: pd.DataFrame,
+              cat_maps: Dict[str, List[str]]) -> "ServingIndex":
+        """
+        calendar: raw calendar.csv rows, sell_prices: raw sell_prices.csv rows,
+        item_meta: one row per item_id with dept_id, cat_id, store_id, state_id.
+        """
+        stores = sorted(set(sell_prices["store_id"]) | set(item_meta["store_id"].dropna()))
+        items = sorted(set(sell_prices["item_id"]) | set(item_meta["item_id"]))
+        store_idx, item_idx = pd.Index(stores), pd.Index(items)
+        arrays = {}
+
+        # calendar: one row per day from the first calendar date, no gaps
+        cal = calendar.copy()
+        cal["date"] = pd.to_datetime(cal["date"])
+        days = cal["date"].to_numpy().astype("datetime64[D]").astype(np.int64)
+        day0 = int(days.min())
+        pos = days - day0
+        n_days = int(pos.max()) + 1
+
+        weeks = np.unique(np.concatenate([cal["wm_yr_wk"].to_numpy(), sell_prices["wm_yr_wk"].to_numpy()]))
+        week_pos = np.full(n_days, -1, dtype=np.int32)
+        week_pos[pos] = np.searchsorted(weeks, cal["wm_yr_wk"].to_numpy())
+        arrays["cal_week_pos"] = _with_sentinel(week_pos, -1)
+        for col in CALENDAR_NUMERIC:
+            out = np.full(n_days, np.nan, dtype=np.float32)
+            if col in cal.columns:
+                out[pos] = cal[col].to_numpy(dtype=np.float32)
+            arrays[f"cal_{col}"] = _with_sentinel(out, np.nan)
+        for col in CALENDAR_CODED:
+            out = np.full(n_days, -1, dtype=np.int32)
+            if col in cal.columns:
+                out[pos] = _encode(cal[col], cat_maps[col]) if col in cat_maps else -1
+            arrays[f"cal_{col}"] = _with_sentinel(out, -1)
+
+        # prices: dense store x item x week cube, kept in float64 because the trees
+        # split right next to observed prices and float32 rounding flips those splits
+        price = np.full((len(stores), len(items), len(weeks)), -1, dtype=np.float64)
+        price[
+            store_idx.get_indexer(sell_prices["store_id"]),
+            item_idx.get_indexer(sell_prices["item_id"]),
+            np.searchsorted(weeks, sell_prices["wm_yr_wk"].to_numpy()),
+        ] = sell_prices["sell_price"].to_numpy(dtype=np.float64)
+        arrays["price"] = _with_sentinel(price, -1)
+
+        # items: model codes for the item itself and its meta, plus the store it was seen in
+        meta = item_meta.drop_duplicates(subset=["item_id"]).set_index("item_id").reindex(items)
+        arrays["item_item_id"] = _with_sentinel(_encode(items, cat_maps.get("item_id", [])), -1)
+        for col in ITEM_CODED:
+            arrays[f"item_{col}"] = _with_sentinel(_encode(meta[col], cat_maps.get(col, [])), -1)
+        arrays["item_store_pos"] = _with_sentinel(store_idx.get_indexer(meta["store_id"]).astype(np.int32), -1)
+
+        arrays["store_store_id"] = _with_sentinel(_encode(stores, cat_maps.get("store_id", [])), -1)
+        return cls(arrays, stores, items, day0)
+
+    def save(self, out_dir: Path) -> dict:
+        """Write every table as a .npy file plus index.json; returns the JSON layout."""
+        out_dir = Path(out_dir)
+        out_dir.mkdir(parents=True, exist_ok=True)
+        layout = {"day0": self.day0, "stores": list(self.stores), "items": list(self.items), "arrays": {}}
+        for name, arr in self.arrays.items():
+            np.save(out_dir / f"{name}.npy", np.ascontiguousarray(arr))
+            layout["arrays"][name] = {"file": f"{name}.npy", "dtype": str(arr.dtype), "shape": list(arr.shape)}
+        with open(out_dir / "index.json", "w", encoding="utf-8") as f:
+            json.dump(layout, f)
+        return layout
+
+    @classmethod
+    def load(cls, in_dir: Path, mmap: bool = True) -> "ServingIndex":
+        """Attach a saved index; with mmap the tables are paged in lazily, not read up front."""
+        in_dir = Path(in_dir)
+        with open(in_dir / "index.json", "r", encoding="utf-8") as f:
+            layout = json.load(f)
+        arrays = {}
+        for name, spec in layout["arrays"].items():
+            arr = np.load(in_dir / spec["file"], mmap_mode="r" if mmap else None)
+            # plain ndarray view of the mapping: same pages, without np.memmap's slow scalar indexing
+            arrays[name] = arr.view(np.ndarray) if mmap else arr
+        return cls(arrays, layout["stores"], layout["items"], layout["day0"])
+
+    def positions(self, store_ids, item_ids, dates):
+        """Vectorised (store, item, day) positions for raw request columns; -1 marks unknown."""
+        item_pos = self.items.get_indexer(pd.Series(item_ids, dtype=object))
+        store_pos = self.stores.get_indexer(pd.Series(store_ids, dtype=object))
+        # store omitted in the request -> fall back to the store the item was seen in
+        no_store = pd.isna(pd.Series(store_ids, dtype=object)).to_numpy()
+        store_pos[no_store] = self.arrays["item_store_pos"][item_pos[no_store]]
+        days = pd.to_datetime(pd.Series(dates)).to_numpy().astype("datetime64[D]")
+        day_pos = days.astype(np.int64) - self.day0
+        day_pos[(day_pos < 0) | (day_pos >= self.n_days)] = -1
+        return store_pos, item_pos, day_pos, days
+
+    def transform(self, store_ids, item_ids, dates, columns: Sequence[str]) -> np.ndarray:
+        """Gather the feature matrix for `columns` (unknown columns are -1)."""
+        store_pos, item_pos, day_pos, days = self.positions(store_ids, item_ids, dates)
+        a = self.arrays
+        week_pos = a["cal_week_pos"][day_pos]
+
+        # date parts come from the date itself, so they are known outside the calendar too
+        month_start = days.astype("datetime64[M]")
+        month = month_start.astype(np.int64) % 12 + 1
+        dayofweek = (days.astype(np.int64) + 3) % 7  # 1970-01-01 was a Thursday
+        parts = {
+            "date_year": days.astype("datetime64[Y]").astype(np.int64) + 1970,
+            "date_month": month,
+            "date_day": (days - month_start).astype(np.int64) + 1,
+            "dayofweek": dayofweek,
+            "wday": dayofweek,
+            "quarter": (month - 1) // 3 + 1,
+        }
+
+        out = np.empty((len(day_pos), len(columns)), dtype=np.float64)
+        for j, col in enumerate(columns):
+            if col in parts:
+                out[:, j] = parts[col]
+            elif col == "sell_price":
+                out[:, j] = a["price"][store_pos, item_pos, week_pos]
+            elif col == "store_id":
+                out[:, j] = a["store_store_id"][store_pos]
+            elif f"item_{col}" in a:
+                out[:, j] = a[f"item_{col}"][item_pos]
+            elif f"cal_{col}" in a:
+                out[:, j] = a[f"cal_{col}"][day_pos]
+            else:
+                out[:, j] = -1
+        return out
+
+    def row_plan(self, columns: Sequence[str]) -> List[tuple]:
+        """Resolve `columns` once into (kind, array) steps used by fill_row."""
+        a = self.arrays
+        plan = []
+        for col in columns:
+            if col in DATE_PARTS:
+                plan.append(("date", DATE_PARTS.index(col)))
+            elif col == "sell_price":
+                plan.append(("price", a["price"]))
+            elif col == "store_id":
+                plan.append(("store", a["store_store_id"]))
+            elif f"item_{col}" in a:
+                plan.append(("item", a[f"item_{col}"]))
+            elif f"cal_{col}" in a:
+                plan.append(("day", a[f"cal_{col}"]))
+            else:
+                plan.append(("const", -1))
+        return plan
+
+    def unresolved(self, columns: Sequence[str]) -> List[str]:
+        """Columns the index has no table for: transform / fill_row fill them with the constant -1."""
+        return [col for col, (kind, _) in zip(columns, self.row_plan(columns)) if kind == "const"]
+
+    def fill_row(self, plan: List[tuple], store_id, item_id, date, out: np.ndarray) -> np.ndarray:
+        """
+        Write one request's features into `out` (len(plan) slots) without pandas.
+        Produces the same values as transform() for a single row.
+        """
+        item = self.item_pos.get(item_id, -1)
+        if store_id is None or store_id != store_id:  # omitted or NaN
+            store = int(self.arrays["item_store_pos"][item])
+        else:
+            store = self.store_pos.get(store_id, -1)
+        if isinstance(date, str):
+            try:
+                d = _date.fromisoformat(date[:10])
+            except ValueError:
+                d = pd.Timestamp(date).date()
+        else:
+            d = pd.Timestamp(date).date()
+        day = d.toordinal() - EPOCH_ORDINAL - self.day0
+        if not 0 <= day < self.n_days:
+            day = -1
+        week = self.arrays["cal_week_pos"][day]
+        parts = (d.year, d.month, d.day, d.weekday(), d.weekday(), (d.month - 1) // 3 + 1)
+
+        for j, (kind, src) in enumerate(plan):
+            if kind == "day":
+                out[j] = src[day]
+            elif kind == "item":
+                out[j] = src[item]
+            elif kind == "date":
+                out[j] = parts[src]
+            elif kind == "price":
+                out[j] = src[store, item, week]
+            elif kind == "store":
+                out[j] = src[store]
+            else:
+                out[j] = src
+        return out
@@ -0,0 +1,179 @@
+# src/models/backtest.py
+"""
+Rolling-origin backtests.
+
+    python -m src.models.backtest --model nolag --folds 4 --workers 4
+    python -m src.models.backtest --model lag --folds 3 --step 28 --horizon 28
+
+Fold k trains on the days before its origin and scores the `horizon` days from
+it; origins step back from the end of sales_train_validation.csv by `step`
+days. Folds run on a ProcessPoolExecutor (cores split between the pool and
+LightGBM like train_shards). All of them read the one processed feature
+table, filtered by day in TrainingData's time split, so nothing is
+recomputed per fold; each fold's binned dataset is cached in
+data/processed/lgb_cache, so reruns go straight to training.
+
+The test window is never used for early stopping: folds train the scripts'
+model for a fixed number of rounds. The lag model is scored on a
+RecursiveForecaster forecast from the origin (its own predictions feed the
+lags, as in production); the no-lag model predicts the window's rows
+directly. Both are scored with WRMSSE (per level too), RMSE and MAE on the
+(series x horizon) matrix. Per-fold metrics and timings go to
+reports/backtest/<model>-<timestamp>/folds.csv, plus summary.json.
+"""
+import argparse
+import json
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from datetime import datetime, timezone
+from pathlib import Path
+
+import joblib
+import lightgbm as lgb
+import numpy as np
+import pandas as pd
+
+from src.models.dataset import LAG_SPEC, NOLAG_SPEC, PROCESSED_PATH, TrainingData
+from src.models.wrmsse import WRMSSE, forecast_matrix
+
+RAW_PATH = Path("data/raw")
+MODELS_PATH = Path("models")
+REPORTS_PATH = Path("reports") / "backtest"
+METRICS = ["wrmsse", "rmse", "mae"]
+
+
+def model_config(kind: str):
+    """(spec, params, rounds) of the model the training scripts fit."""
+    if kind == "lag":
+        from src.models.train_model import NUM_BOOST_ROUND, PARAMS
+        return LAG_SPEC, PARAMS, NUM_BOOST_ROUND
+    from src.models.params import NOLAG_PARAMS, NOLAG_ROUNDS
+    return NOLAG_SPEC, NOLAG_PARAMS, NOLAG_ROUNDS
+
+
+def fold_origins(last_day: int, folds: int, step: int, horizon: int) -> list:
+    """First test day of each fold, oldest first; the last fold ends on `last_day`."""
+    return [last_day - horizon + 1 - k * step for k in reversed(range(folds))]
+
+
+def run_fold(kind: str, origin: int, horizon: int, processed_dir: Path, raw_dir: Path, models_dir: Path,
+             num_threads: int) -> dict:
+    """Worker: train on days < origin, forecast the window, score it."""
+    start = time.perf_counter()
+    spec, params, rounds = model_config(kind)
+    data = TrainingData(processed_dir, spec, origin=origin, horizon=horizon, params={"num_threads": num_threads})
+    train_set, _ = data.datasets()
+    n_train = train_set.construct().num_data()
+    loaded = time.perf_counter()
+
+    model = lgb.train({**params, "verbosity": -1, "num_threads": num_threads}, train_set, num_boost_round=rounds)
+    trained = time.perf_counter()
+
+    evaluator, actual, ids = WRMSSE.from_raw(raw_dir, origin, horizon)
+    if actual is None:
+        raise ValueError(f"No actuals in {raw_dir} for d_{origin}..d_{origin + horizon - 1}")
+    if kind == "lag":
+        from src.models.recursive_forecast import RecursiveForecaster
+
+        fold_dir = models_dir / "backtest" / f"{kind}-d{origin}"
+        fold_dir.mkdir(parents=True, exist_ok=True)
+        joblib.dump(model, fold_dir / "model.joblib")
+        with open(fold_dir / "feature_columns.json", "w", encoding="utf-8") as f:
+            json.dump(data.feature_names, f, indent=2)
+        with open(fold_dir / "cat_mappings.json", "w", encoding="utf-8") as f:
+            json.dump(data.cat_mappings, f, indent=2)
+        forecaster = RecursiveForecaster.from_files(fold_dir / "model.joblib", fold_dir / "feature_columns.json",
+                                                    fold_dir / "cat_mappings.json", raw_dir, end_day=origin - 1)
+        pred = forecast_matrix(forecaster.to_frame(forecaster.forecast(horizon)), ids)
+    else:
+        frames = []
+        for X, _, keys in data.iter_valid(["id", "d"]):
+            frames.append(keys.assign(prediction=model.predict(X, num_threads=num_threads)))
+        rows = pd.concat(frames, ignore_index=True)
+        rows["id"] = rows["id"].astype(str)
+        rows["d"] = rows["d"].astype(str).str.rsplit("_", n=1).str[-1].astype(int)
+        pred = rows.pivot_table(index="id", columns="d", values="prediction", aggfunc="first") \
+            .reindex(index=ids, columns=range(origin, origin + horizon)).to_numpy(dtype=np.float64)
+    if np.isnan(pred).any():
+        raise ValueError(f"Fold d_{origin}: no prediction for {int(np.isnan(pred).any(axis=1).sum())} series")
+    forecasted = time.perf_counter()
+
+    score = evaluator.score(actual, pred)
+    err = pred - actual
+    return {
+        "origin": origin,
+        "wrmsse": score["wrmsse"],
+        "rmse": float(np.sqrt(np.mean(err ** 2))),
+        "mae": float(np.mean(np.abs(err))),
+        **{f"wrmsse_{level}": v for level, v in score["levels"].items()},
+        "n_train": n_train,
+        "n_series": len(ids),
+        "dataset_seconds": round(loaded - start, 3),
+        "train_seconds": round(trained - loaded, 3),
+        "forecast_seconds": round(forecasted - trained, 3),
+        "seconds": round(time.perf_counter() - start, 3),
+    }
+
+
+def backtest(kind: str = "nolag", folds: int = 3, step: int = 28, horizon: int = 28, workers=None,
+             processed_dir: Path = PROCESSED_PATH, raw_dir: Path = RAW_PATH, models_dir: Path = MODELS_PATH,
+             reports_dir: Path = REPORTS_PATH) -> dict:
+    start = time.perf_counter()
+    days = [c for c in pd.read_csv(raw_dir / "sales_train_validation.csv", nrows=0).columns if c.startswith("d_")]
+    origins = fold_origins(int(days[-1][2:]), folds, step, horizon)
+    cores = os.cpu_count() or 1
+    workers = max(1, min(workers or cores, len(origins)))
+    num_threads = max(1, cores // workers)
+    print(f"[backtest] {kind}: {len(origins)} folds at d_{origins[0]}..d_{origins[-1]}, {horizon}-day horizon, "
+          f"{workers} workers x {num_threads} LightGBM threads")
+
+    results = []
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        futures = [pool.submit(run_fold, kind, origin, horizon, processed_dir, raw_dir, models_dir, num_threads)
+                   for origin in origins]
+        for fut in as_completed(futures):
+            r = fut.result()
+            results.append(r)
+            print(f"[backtest] d_{r['origin']}: WRMSSE {r['wrmsse']:.4f}, RMSE {r['rmse']:.4f}, "
+                  f"MAE {r['mae']:.4f} ({r['n_train']} train rows, {r['seconds']}s)")
+
+    folds_df = pd.DataFrame(results).sort_values("origin").reset_index(drop=True)
+    run_dir = reports_dir / f"{kind}-{datetime.now().strftime('%Y%m%d-%H%M%S')}"
+    run_dir.mkdir(parents=True, exist_ok=True)
+    folds_df.to_csv(run_dir / "folds.csv", index=False)
+    summary = {
+        "created_at": datetime.now(timezone.utc).isoformat(),
+        "model": kind,
+        "origins": origins,
+        "step": step,
+        "horizon": horizon,
+        "workers": workers,
+        "num_threads": num_threads,
+        "mean": {m: float(folds_df[m].mean()) for m in METRICS},
+        "std": {m: float(folds_df[m].std(ddof=0)) for m in METRICS},
+        "seconds": round(time.perf_counter() - start, 3),
+    }
+    with open(run_dir / "summary.json", "w", encoding="utf-8") as f:
+        json.dump(summary, f, indent=2)
+    summary["run_dir"] = str(run_dir)
+    return summary
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Rolling-origin backtest of the lag / no-lag model")
+    parser.add_argument("--model", choices=["lag", "nolag"], default="nolag")
+    parser.add_argument("--folds", type=int, default=3)
+    parser.add_argument("--step", type=int, default=28, help="days between fold origins")
+    parser.add_argument("--horizon", type=int, default=28)
+    parser.add_argument("--workers", type=int, default=None, help="worker processes (default: one per fold)")
+    parser.add_argument("--processed", type=Path, default=PROCESSED_PATH)
+    parser.add_argument("--raw", type=Path, default=RAW_PATH)
+    parser.add_argument("--models", type=Path, default=MODELS_PATH)
+    parser.add_argument("--reports", type=Path, default=REPORTS_PATH)
+    args = parser.parse_args()
+
+    summary = backtest(args.model, args.folds, args.step, args.horizon, args.workers,
+                       args.processed, args.raw, args.models, args.reports)
+    means = ", ".join(f"{m} {summary['mean'][m]:.4f} ± {summary['std'][m]:.4f}" for m in METRICS)
+    print(f"Backtested {args.model} over {args.folds} folds in {summary['seconds']}s: {means} -> {summary['run_dir']}/")
@@ -0,0 +1,171 @@
+# src/models/batch_score.py
+"""
+Offline batch scoring with the no-lag model, for the whole catalog or a slice.
+
+    python -m src.models.batch_score --start 2016-04-25 --end 2016-05-22
+    python -m src.models.batch_score --start 2016-04-25 --end 2016-05-22 --store CA_1,TX_1 --dept FOODS_3
+
+Candidate (store, item) pairs come from the processed feature table (or, with
+--source raw, sales_train_validation.csv) and are crossed with every date in
+the range, one store's block of items at a time. Features are the exact
+gathers app_nolag's preprocess_input does (ServingIndex.transform), from the
+serving bundle, which workers memory-map so the tables are shared between
+processes. Each worker scores its chunk in one predict call and writes it
+straight to out/store_id=<store>/part-<chunk>.parquet; _manifest.json
+(written last) lists the parts.
+"""
+import argparse
+import json
+import os
+import shutil
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from datetime import datetime, timezone
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from src.features.schema import read_features
+from src.features.serving_bundle import BUNDLE_PATH, bundle_exists, ensure_bundle, load_bundle, stale_sources
+
+RAW_PATH = Path("data/raw")
+PROCESSED_PATH = Path("data/processed")
+OUT_PATH = Path("data/predictions")
+MANIFEST_NAME = "_manifest.json"
+
+_worker = {}  # per-process bundle: model, train_cols, index
+
+
+def candidate_series(source: str = "processed", stores=None, depts=None,
+                     processed_dir: Path = PROCESSED_PATH, raw_dir: Path = RAW_PATH) -> pd.DataFrame:
+    """Distinct (store_id, dept_id, item_id) to score, sorted by store."""
+    cols = ["store_id", "dept_id", "item_id"]
+    if source == "raw":
+        series = pd.read_csv(raw_dir / "sales_train_validation.csv", usecols=cols)
+    else:
+        series = read_features(processed_dir, columns=cols)
+    series = series.astype(str).drop_duplicates()
+    if stores:
+        series = series[series["store_id"].isin(stores)]
+    if depts:
+        series = series[series["dept_id"].isin(depts)]
+    return series.sort_values(cols).reset_index(drop=True)[cols]
+
+
+def plan_chunks(series: pd.DataFrame, n_dates: int, chunk_rows: int) -> list:
+    """Blocks of items of a single store, each about `chunk_rows` rows once crossed with the dates."""
+    per_chunk = max(1, chunk_rows // max(1, n_dates))
+    chunks = []
+    for store, group in series.groupby("store_id", sort=True):
+        items, depts = group["item_id"].to_numpy(), group["dept_id"].to_numpy()
+        for lo in range(0, len(items), per_chunk):
+            chunks.append({"store_id": store, "items": items[lo:lo + per_chunk].tolist(),
+                           "depts": depts[lo:lo + per_chunk].tolist()})
+    return chunks
+
+
+def _init_worker(bundle_dir: str, num_threads: int) -> None:
+    bundle = load_bundle(Path(bundle_dir))
+    _worker.update(model=bundle["model"], train_cols=bundle["train_cols"], index=bundle["index"],
+                   num_threads=num_threads)
+
+
+def score_chunk(part: int, chunk: dict, dates: np.ndarray, out_dir: str) -> dict:
+    """Worker: cross the chunk's items with the dates, gather features, predict, write."""
+    start = time.perf_counter()
+    items = np.repeat(np.array(chunk["items"], dtype=object), len(dates))
+    days = np.tile(dates, len(chunk["items"]))
+    stores = [chunk["store_id"]] * len(items)
+    X = _worker["index"].transform(stores, items, days, _worker["train_cols"])
+    preds = _worker["model"].predict(pd.DataFrame(X, columns=_worker["train_cols"]),
+                                     num_threads=_worker["num_threads"])
+
+    part_dir = Path(out_dir) / f"store_id={chunk['store_id']}"
+    part_dir.mkdir(parents=True, exist_ok=True)
+    path = part_dir / f"part-{part:05d}.parquet"
+    out = pd.DataFrame({"item_id": items.astype(str), "dept_id": np.repeat(chunk["depts"], len(dates)),
+                        "date": days, "prediction": preds})
+    out.to_parquet(path, index=False)
+    return {"store_id": chunk["store_id"], "path": str(path.relative_to(out_dir)), "rows": len(items),
+            "seconds": round(time.perf_counter() - start, 3)}
+
+
+def batch_score(start_date: str, end_date: str, stores=None, depts=None, source: str = "processed",
+                workers=None, chunk_rows: int = 200_000, out_dir: Path = OUT_PATH,
+                bundle_dir: Path = BUNDLE_PATH) -> dict:
+    started = time.perf_counter()
+    if not bundle_exists(bundle_dir) or stale_sources(bundle_dir):
+        print(f"[score] No current serving bundle at {bundle_dir}, building it first")
+        ensure_bundle(bundle_dir)
+    with open(Path(bundle_dir) / "manifest.json", "r", encoding="utf-8") as f:
+        fingerprint = json.load(f)["model_fingerprint"]
+
+    dates = pd.date_range(start_date, end_date, freq="D").to_numpy().astype("datetime64[D]")
+    series = candidate_series(source, stores, depts)
+    chunks = plan_chunks(series, len(dates), chunk_rows)
+    total = len(series) * len(dates)
+    cores = os.cpu_count() or 1
+    workers = max(1, min(workers or cores, len(chunks) or 1))
+    num_threads = max(1, cores // workers)
+    print(f"[score] {len(series)} series x {len(dates)} days = {total:,} rows in {len(chunks)} chunks "
+          f"on {workers} workers x {num_threads} threads")
+
+    out_dir = Path(out_dir)
+    shutil.rmtree(out_dir, ignore_errors=True)
+    out_dir.mkdir(parents=True)
+    parts, done, scoring = [], 0, time.perf_counter()
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                             initargs=(str(bundle_dir), num_threads)) as pool:
+        futures = [pool.submit(score_chunk, i, c, dates, str(out_dir)) for i, c in enumerate(chunks)]
+        for fut in as_completed(futures):
+            part = fut.result()
+            parts.append(part)
+            done += part["rows"]
+            elapsed = time.perf_counter() - scoring
+            rate = done / elapsed if elapsed else 0.0
+            eta = (total - done) / rate if rate else 0.0
+            print(f"[score] {done:,}/{total:,} rows ({100 * done / max(total, 1):.0f}%), "
+                  f"{rate:,.0f} rows/s, eta {eta:.0f}s")
+
+    parts.sort(key=lambda p: p["path"])
+    manifest = {
+        "created_at": datetime.now(timezone.utc).isoformat(),
+        "model_fingerprint": fingerprint,
+        "start_date": str(dates[0]) if len(dates) else start_date,
+        "end_date": str(dates[-1]) if len(dates) else end_date,
+        "stores": stores,
+        "depts": depts,
+        "source": source,
+        "total_rows": done,
+        "rows_per_second": round(done / max(time.perf_counter() - scoring, 1e-9), 1),
+        "seconds": round(time.perf_counter() - started, 3),
+        "partitions": parts,
+    }
+    with open(out_dir / MANIFEST_NAME, "w", encoding="utf-8") as f:
+        json.dump(manifest, f, indent=2)
+    return manifest
+
+
+def _csv_list(value):
+    return [v.strip() for v in value.split(",") if v.strip()] if value else None
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Score the no-lag model for every series over a date range")
+    parser.add_argument("--start", required=True, help="first date, e.g. 2016-04-25")
+    parser.add_argument("--end", required=True, help="last date (inclusive)")
+    parser.add_argument("--store", help="comma-separated store_ids to keep")
+    parser.add_argument("--dept", help="comma-separated dept_ids to keep")
+    parser.add_argument("--source", choices=["processed", "raw"], default="processed",
+                        help="where the candidate series come from")
+    parser.add_argument("--workers", type=int, default=None, help="worker processes (default: all cores)")
+    parser.add_argument("--chunk-rows", type=int, default=200_000, help="rows scored per task")
+    parser.add_argument("--bundle", type=Path, default=BUNDLE_PATH, help="serving bundle (built if missing)")
+    parser.add_argument("--out", type=Path, default=OUT_PATH)
+    args = parser.parse_args()
+
+    manifest = batch_score(args.start, args.end, _csv_list(args.store), _csv_list(args.dept), args.source,
+                           args.workers, args.chunk_rows, args.out, args.bundle)
+    print(f"Scored {manifest['total_rows']:,} rows in {manifest['seconds']}s "
+          f"({manifest['rows_per_second']:,.0f} rows/s) -> {args.out}/")
@@ -0,0 +1,370 @@
+# src/models/dataset.py
+"""
+Out-of-core training data: the LightGBM Dataset is built from Parquet row
+groups, so the full pandas frame never exists, and the binned result is cached.
+
+    data = TrainingData(PROCESSED_PATH, NOLAG_SPEC)
+    train_set, valid_set = data.datasets()   # built once, then loaded from the cache
+
+One scan over the categorical and label columns fixes the category levels
+(sorted observed values, missing -> -1, the same codes the in-memory scripts
+used), the labels and a seeded random train/valid split. Each row group is
+then one lgb.Sequence that decodes it into a float64 matrix on demand;
+LightGBM reads them in order for binning and for the push, so only one row
+group is decoded at a time.
+
+train.bin / valid.bin / meta.json are saved under data/processed/lgb_cache/
+keyed by a hash of the spec, the table's columns (feature config), the split
+and binning params and the source files' sizes and mtimes; any change
+(new features, an incremental append) gives a new key.
+
+`filters` ({"store_id": "CA_1", ...}) restricts the rows to one shard (hive
+partitions that can't match are skipped without reading), and `cat_mappings`
+pins the category levels, e.g. to the global model's so shard models share the
+serving encoding. On a table that isn't partitioned by the filter keys every
+row group holds rows of every shard and is decoded anyway, so hand shard
+builds partitioned_source(processed_dir, keys), which writes a partitioned
+copy once when needed.
+
+`origin` replaces the random split with a time split for backtests: days
+before d_<origin> train, the `horizon` days from it validate, later days are
+left out.
+"""
+import hashlib
+import json
+import os
+import shutil
+import time
+import uuid
+from datetime import datetime, timezone
+from pathlib import Path
+
+import lightgbm as lgb
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from src.features.schema import CATEGORICAL_COLS, day_index, features_path
+
+PROCESSED_PATH = Path("data/processed")
+CACHE_PATH = PROCESSED_PATH / "lgb_cache"
+DATE_PARTS = ("year", "month", "day")
+
+# Which table columns become features. "date" is always replaced by
+# date_year / date_month / date_day, appended at the end.
+LAG_SPEC = {"name": "lag", "label": "sales", "drop": [], "drop_prefixes": []}
+NOLAG_SPEC = {"name": "nolag", "label": "sales", "drop": ["id", "d"], "drop_prefixes": ["lag_", "rolling_", "ewm_"]}
+
+DATASET_PARAMS = {"max_bin": 255, "verbosity": -1}
+BUFFER_ROWS = 2_000_000  # rows held in memory while partitioning a table
+
+
+def _partition_values(path: Path, root: Path) -> dict:
+    """{'store_id': 'CA_1', ...} from hive-style directories between root and the file."""
+    parts = path.relative_to(root).parts[:-1] if path != root else ()
+    return dict(p.split("=", 1) for p in parts if "=" in p)
+
+
+def _table_files(source: Path) -> list:
+    return [source] if source.is_file() else sorted(
+        p for p in source.rglob("*.parquet") if not p.name.startswith(("_", ".")))
+
+
+def partitioned_source(processed_dir: Path, keys, out_root: Path = None) -> Path:
+    """
+    A processed dir whose feature table is hive-partitioned on `keys`:
+    `processed_dir` itself when its table already is, else a copy written in
+    one pass to <out_root>/<keys>/train_features/ (reused while the source
+    files are unchanged). The key columns stay in the copy's files as well,
+    so the columns and feature names are the same as the source's.
+    """
+    keys = list(keys)
+    source = features_path(processed_dir)
+    files = _table_files(source)
+    if not files:
+        raise FileNotFoundError(f"No feature table at {source}")
+    if all(set(keys) <= set(_partition_values(p, source)) for p in files):
+        return Path(processed_dir)
+
+    out_dir = Path(out_root or Path(processed_dir) / "shard_tables") / "__".join(keys)
+    target = out_dir / "train_features"
+    stamp = {"keys": keys, "sources": [[str(p), p.stat().st_size, p.stat().st_mtime] for p in files]}
+    if (target / "_source.json").exists() and json.loads((target / "_source.json").read_text("utf-8")) == stamp:
+        return out_dir
+
+    start = time.perf_counter()
+    tmp = target.with_name(f"{target.name}.tmp-{os.getpid()}")
+    shutil.rmtree(tmp, ignore_errors=True)
+    schema, writers, buffers, counts = None, {}, {}, {}
+
+    def flush(values) -> int:
+        chunk = pa.concat_tables(buffers.pop(values))
+        counts.pop(values)
+        if values not in writers:
+            part_dir = tmp.joinpath(*[f"{k}={v}" for k, v in zip(keys, values)])
+            part_dir.mkdir(parents=True, exist_ok=True)
+            writers[values] = pq.ParquetWriter(part_dir / "part-00000.parquet", schema)
+        writers[values].write_table(chunk)
+        return chunk.num_rows
+
+    buffered = 0
+    for path in files:
+        parts = _partition_values(path, source)
+        pf = pq.ParquetFile(path)
+        for rg in range(pf.metadata.num_row_groups):
+            table = pf.read_row_group(rg)
+            # directory keys become columns after the file's own, the order TrainingData gives them
+            for k, v in parts.items():
+                if k not in table.column_names:
+                    table = table.append_column(k, pa.array([v] * table.num_rows, pa.string()))
+            if schema is None:
+                schema = table.schema
+            elif table.schema != schema:
+                table = table.cast(schema)
+            groups = table.select(keys).to_pandas().astype(str).groupby(keys, sort=False).indices
+            for values, idx in groups.items():
+                values = values if isinstance(values, tuple) else (values,)
+                buffers.setdefault(values, []).append(table.take(pa.array(idx)))
+                counts[values] = counts.get(values, 0) + len(idx)
+            buffered += table.num_rows
+            while buffered > BUFFER_ROWS:
+                buffered -= flush(max(counts, key=counts.get))
+    for values in list(buffers):
+        flush(values)
+    for writer in writers.values():
+        writer.close()
+    (tmp / "_source.json").write_text(json.dumps(stamp), encoding="utf-8")
+    shutil.rmtree(target, ignore_errors=True)
+    tmp.rename(target)
+    print(f"[dataset] Partitioned {source} on {keys} into {len(writers)} partitions "
+          f"in {time.perf_counter() - start:.1f}s -> {target}")
+    return out_dir
+
+
+class RowGroupSequence(lgb.Sequence):
+    """Selected rows of one row group, decoded by the owning TrainingData."""
+
+    def __init__(self, data: "TrainingData", chunk: int, rows: np.ndarray):
+        self.data = data
+        self.chunk = chunk
+        self.rows = rows
+
+    def __len__(self):
+        return len(self.rows)
+
+    def __getitem__(self, idx):
+        return self.data.decode(self.chunk)[self.rows[idx]]
+
+
+class TrainingData:
+    def __init__(self, processed_dir: Path = PROCESSED_PATH, spec: dict = NOLAG_SPEC, valid_frac: float = 0.2,
+                 sample_frac: float = 1.0, seed: int = 42, params: dict = None, cache_dir: Path = CACHE_PATH,
+                 filters: dict = None, cat_mappings: dict = None, origin: int = None, horizon: int = 28):
+        self.spec = spec
+        self.origin = origin
+        self.horizon = horizon
+        self.filters = {k: str(v) for k, v in (filters or {}).items()}
+        self.fixed_mappings = cat_mappings
+        self.valid_frac = valid_frac
+        self.sample_frac = sample_frac
+        self.seed = seed
+        self.params = {**DATASET_PARAMS, **(params or {})}
+        self.source = features_path(processed_dir)
+        files = _table_files(self.source)
+        if not files:
+            raise FileNotFoundError(f"No feature table at {self.source}")
+
+        # chunk = (file, row group, partition values)
+        self.chunks = []
+        for path in files:
+            pf = pq.ParquetFile(path)
+            parts = _partition_values(path, self.source)
+            if all(parts.get(k, v) == v for k, v in self.filters.items()):
+                self.chunks += [(path, rg, parts) for rg in range(pf.metadata.num_row_groups)]
+        if not self.chunks:
+            raise ValueError(f"No rows of {self.source} can match {self.filters}")
+        schema = pq.read_schema(files[0])
+        self.columns = list(schema.names) + [k for k in self.chunks[0][2] if k not in schema.names]
+        # schema categoricals even when stored as all-null doubles, plus any other string column
+        self.categorical = [c for c in self.columns if c in CATEGORICAL_COLS or c in self.chunks[0][2] or (
+            pa.types.is_string(schema.field(c).type) or pa.types.is_large_string(schema.field(c).type)
+            or pa.types.is_dictionary(schema.field(c).type))]
+
+        label, drop = spec["label"], set(spec["drop"]) | {"date"}
+        self.feature_names = [c for c in self.columns if c != label and c not in drop
+                              and not c.startswith(tuple(spec["drop_prefixes"]))]
+        if "date" in self.columns:
+            self.feature_names += [f"date_{p}" for p in DATE_PARTS]
+
+        stamp = [(str(p.relative_to(self.source)) if p != self.source else p.name,
+                  p.stat().st_size, p.stat().st_mtime) for p in files]
+        binning = {k: v for k, v in self.params.items() if k != "num_threads"}  # threads don't change the bins
+        key = {"spec": spec, "columns": self.columns, "valid_frac": valid_frac,
+               "sample_frac": sample_frac, "seed": seed, "params": binning, "sources": stamp,
+               "filters": self.filters, "cat_mappings": cat_mappings}
+        if origin is not None:
+            key["time_split"] = [origin, horizon]
+        self.key = hashlib.sha256(json.dumps(key, sort_keys=True).encode("utf-8")).hexdigest()[:16]
+        self.cache_dir = Path(cache_dir) / f"{spec['name']}-{self.key}"
+        self.built = False
+        self._decoded = (None, None)
+
+    # --- pass 1: levels, labels, split ---------------------------------------------
+    def scan(self) -> None:
+        cats = [c for c in self.categorical if c in self.feature_names] if self.fixed_mappings is None else []
+        levels = {c: set() for c in cats}
+        labels, sizes, matches, days = [], [], [], []
+        for path, rg, parts in self.chunks:
+            read = [c for c in set(cats) | set(self.filters) if c not in parts] + [self.spec["label"]]
+            if self.origin is not None and "d" not in read:
+                read.append("d")
+            df = pq.ParquetFile(path).read_row_group(rg, columns=read).to_pandas()
+            match = np.ones(len(df), dtype=bool)
+            for k, v in self.filters.items():
+                if k not in parts:
+                    match &= (df[k].astype(object) == v).to_numpy(dtype=bool)
+            for c in cats:
+                values = [parts[c]] if c in parts else df.loc[match, c].dropna().unique()
+                levels[c].update(str(v) for v in values)
+            labels.append(df[self.spec["label"]].to_numpy(dtype=np.float64))
+            if self.origin is not None:
+                d = df["d"]
+                days.append(d.to_numpy() if pd.api.types.is_numeric_dtype(d) else day_index(d))
+            sizes.append(len(df))
+            matches.append(match)
+        self.cat_mappings = self.fixed_mappings or {c: sorted(levels[c]) for c in cats}
+        self.labels = np.concatenate(labels)
+        rng = np.random.default_rng(self.seed)
+        keep = (rng.random(len(self.labels)) < self.sample_frac) & np.concatenate(matches)
+        if self.origin is None:
+            self.is_valid = keep & (rng.random(len(self.labels)) < self.valid_frac)
+            self.is_train = keep & ~self.is_valid
+        else:
+            day = np.concatenate(days).astype(np.int64)
+            self.is_train = keep & (day < self.origin)
+            self.is_valid = keep & (day >= self.origin) & (day < self.origin + self.horizon)
+        self.offsets = np.r_[0, np.cumsum(sizes)]
+
+    # --- decode one row group into the model matrix -----------------------------------
+    def decode(self, chunk: int) -> np.ndarray:
+        if self._decoded[0] == chunk:
+            return self._decoded[1]
+        path, rg, parts = self.chunks[chunk]
+        needed = {c for c in self.feature_names if c in self.columns} | ({"date"} & set(self.columns))
+        df = pq.ParquetFile(path).read_row_group(rg, columns=[c for c in self.columns
+                                                             if c in needed and c not in parts]).to_pandas()
+        X = np.empty((len(df), len(self.feature_names)), dtype=np.float64)
+        dates = pd.to_datetime(df["date"]) if "date" in df.columns else None
+        for j, name in enumerate(self.feature_names):
+            if name in self.cat_mappings:
+                levels = self.cat_mappings[name]
+                if name in parts:
+                    X[:, j] = levels.index(parts[name]) if parts[name] in levels else -1
+                else:
+                    X[:, j] = pd.Categorical(df[name].astype(object).where(df[name].notna(), None),
+                                             categories=levels).codes
+            elif dates is not None and name.startswith("date_") and name[5:] in DATE_PARTS:
+                X[:, j] = getattr(dates.dt, name[5:]).to_numpy()
+            else:
+                X[:, j] = df[name].to_numpy(dtype=np.float64, na_value=np.nan)
+        self._decoded = (chunk, X)
+        return X
+
+    def _sequences(self, mask: np.ndarray):
+        seqs, labels = [], []
+        for chunk in range(len(self.chunks)):
+            lo, hi = self.offsets[chunk], self.offsets[chunk + 1]
+            rows = np.flatnonzero(mask[lo:hi])
+            if len(rows):
+                seqs.append(RowGroupSequence(self, chunk, rows))
+                labels.append(self.labels[lo:hi][rows])
+        return seqs, np.concatenate(labels)
+
+    # --- build or load ----------------------------------------------------------------
+    def datasets(self):
+        """(train, valid) lgb.Datasets, from the cache when the key matches."""
+        meta_path = self.cache_dir / "meta.json"
+        if meta_path.exists():
+            with open(meta_path, "r", encoding="utf-8") as f:
+                meta = json.load(f)
+            self.cat_mappings = meta["cat_mappings"]
+            train = lgb.Dataset(str(self.cache_dir / "train.bin"), params=self.params)
+            valid = lgb.Dataset(str(self.cache_dir / "valid.bin"), reference=train, params=self.params)
+            print(f"[dataset] Loaded cached dataset {self.cache_dir.name} "
+                  f"({meta['n_train']} train / {meta['n_valid']} valid rows)")
+            return train, valid
+
+        start = time.perf_counter()
+        self.scan()
+        train_seqs, train_labels = self._sequences(self.is_train)
+        valid_seqs, valid_labels = self._sequences(self.is_valid)
+        train = lgb.Dataset(train_seqs, label=train_labels, feature_name=self.feature_names,
+                            params=self.params, free_raw_data=True).construct()
+        valid = lgb.Dataset(valid_seqs, label=valid_labels, reference=train,
+                            params=self.params, free_raw_data=True).construct()
+
+        # private tmp dir per builder: concurrent builds of the same key don't write into each other
+        tmp_dir = self.cache_dir.with_name(f"{self.cache_dir.name}.tmp-{os.getpid()}-{uuid.uuid4().hex[:8]}")
+        tmp_dir.mkdir(parents=True)
+        train.save_binary(str(tmp_dir / "train.bin"))
+        valid.save_binary(str(tmp_dir / "valid.bin"))
+        meta = {
+            "created_at": datetime.now(timezone.utc).isoformat(),
+            "source": str(self.source),
+            "feature_names": self.feature_names,
+            "cat_mappings": self.cat_mappings,
+            "n_train": int(len(train_labels)),
+            "n_valid": int(len(valid_labels)),
+            "build_seconds": round(time.perf_counter() - start, 3),
+        }
+        with open(tmp_dir / "meta.json", "w", encoding="utf-8") as f:
+            json.dump(meta, f, indent=2)
+        try:
+            tmp_dir.rename(self.cache_dir)
+        except OSError:
+            if not (self.cache_dir / "meta.json").exists():
+                raise
+            # another builder finished the same key first; its files are equivalent
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+            print(f"[dataset] {self.cache_dir.name} was built concurrently, keeping the existing cache")
+        self.built = True
+        self._decoded = (None, None)
+        print(f"[dataset] Built {self.cache_dir.name} from {len(self.chunks)} row groups "
+              f"in {meta['build_seconds']}s ({meta['n_train']} train / {meta['n_valid']} valid rows)")
+        return train, valid
+
+    def iter_valid(self, columns=()):
+        """(X, y, frame of the extra table `columns`) of the validation rows, one row group at a time."""
+        if not hasattr(self, "is_valid"):
+            self.scan()
+        for chunk in range(len(self.chunks)):
+            lo, hi = self.offsets[chunk], self.offsets[chunk + 1]
+            rows = np.flatnonzero(self.is_valid[lo:hi])
+            if not len(rows):
+                continue
+            path, rg, parts = self.chunks[chunk]
+            keys = pd.DataFrame(index=range(len(rows)))
+            read = [c for c in columns if c not in parts]
+            if read:
+                df = pq.ParquetFile(path).read_row_group(rg, columns=read).to_pandas()
+                keys = df.iloc[rows].reset_index(drop=True)
+            for c in columns:
+                if c in parts:
+                    keys[c] = parts[c]
+            yield self.decode(chunk)[rows], self.labels[lo:hi][rows], keys[list(columns)]
+        self._decoded = (None, None)
+
+    def write_valid(self, x_path: Path, y_path: Path) -> None:
+        """Stream the validation rows to Parquet (X with feature columns, y with the label)."""
+        x_writer = y_writer = None
+        for X, y, _ in self.iter_valid():
+            x = pa.Table.from_pandas(pd.DataFrame(X, columns=self.feature_names), preserve_index=False)
+            y = pa.table({self.spec["label"]: y})
+            x_writer = x_writer or pq.ParquetWriter(x_path, x.schema)
+            y_writer = y_writer or pq.ParquetWriter(y_path, y.schema)
+            x_writer.write_table(x)
+            y_writer.write_table(y)
+        for w in (x_writer, y_writer):
+            if w is not None:
+                w.close()
@@ -1,54 +1,161 @@
+# src/models/evaluate_model.py
+"""
+Model evaluation.
+
+    python -m src.models.evaluate_model                      # RMSE / MAE / MAPE / WAPE on X_valid
+    python -m src.models.evaluate_model --holdout            # + WRMSSE of a 28-day holdout forecast
+    python -m src.models.evaluate_model --forecast data/processed/forecast_28d.parquet --start-day 1914
+
+Point metrics score the lag model on the saved validation rows. WRMSSE
+(src/models/wrmsse.py) scores a (series x 28 days) forecast over the 12 M5
+levels: --holdout forecasts the last 28 days of sales_train_validation.csv
+from the days before with RecursiveForecaster; --forecast scores a file in
+the submission layout (id, F1..F28) or batch_score's long layout.
+"""
+import argparse
+import json
+import time
+from pathlib import Path
+
 import joblib
-import pandas as pd
 import numpy as np
+import pandas as pd
 import matplotlib.pyplot as plt
 from sklearn.metrics import mean_squared_error, mean_absolute_error
 
-# --- Load model ---
-print("Loading model...")
-model = joblib.load("models/baseline_lightgbm.joblib")
-
-# --- Load processed data ---
-print("Loading processed data...")
-X_valid = pd.read_parquet("data/processed/X_valid.parquet")
-y_valid = pd.read_parquet("data/processed/y_valid.parquet")["sales"]
-
-# --- Run predictions ---
-print("Making predictions...")
-y_pred = model.predict(X_valid)
-
-# # Separate features and target
-# y_true = df["sales"]
-# X = df.drop(columns=["sales"])
-
-# # --- Run predictions ---
-# print("Making predictions...")
-# y_pred = model.predict(X)
-
-# --- Calculate metrics ---
-rmse = np.sqrt(mean_squared_error(y_valid, y_pred))
-mae = mean_absolute_error(y_valid, y_pred)
-mape = np.mean(np.abs((y_valid - y_pred) / y_valid)) * 100
-
-# Save metrics to file
-metrics_df = pd.DataFrame({
-    "RMSE": [rmse],
-    "MAE": [mae],
-    "MAPE (%)": [mape]
-})
-metrics_df.to_csv("reports/metrics.csv", index=False)
-
-print("\nModel Evaluation:")
-print(metrics_df)
-
-# --- Plot Actual vs Predicted ---
-plt.figure(figsize=(10, 5))
-plt.scatter(y_valid[:500], y_pred[:500], alpha=0.5)
-plt.xlabel("Actual Sales")
-plt.ylabel("Predicted Sales")
-plt.title("Actual vs Predicted Sales (Sample)")
-plt.grid(True)
-plt.savefig("reports/figures/actual_vs_predicted.png", dpi=300)
-plt.close()
-
-print("Evaluation complete. Metrics and plots saved in 'reports/'.")
+from src.models.wrmsse import WRMSSE, forecast_matrix
+
+RAW_PATH = Path("data/raw")
+PROCESSED_PATH = Path("data/processed")
+MODELS_PATH = Path("models")
+REPORTS_PATH = Path("reports")
+
+
+def point_metrics(y_true, y_pred) -> dict:
+    y_true = np.asarray(y_true, dtype=np.float64)
+    y_pred = np.asarray(y_pred, dtype=np.float64)
+    # zero-sales days have no percentage error; MAPE is over the days with sales, WAPE over all
+    sold = y_true != 0
+    return {
+        "RMSE": np.sqrt(mean_squared_error(y_true, y_pred)),
+        "MAE": mean_absolute_error(y_true, y_pred),
+        "MAPE (%)": np.mean(np.abs((y_true[sold] - y_pred[sold]) / y_true[sold])) * 100 if sold.any() else np.nan,
+        "WAPE (%)": np.abs(y_true - y_pred).sum() / max(np.abs(y_true).sum(), 1e-9) * 100,
+    }
+
+
+def evaluate_valid(model_path: Path = MODELS_PATH / "baseline_lightgbm.joblib",
+                   processed_dir: Path = PROCESSED_PATH, reports_dir: Path = REPORTS_PATH) -> pd.DataFrame:
+    # --- Load model ---
+    print("Loading model...")
+    model = joblib.load(model_path)
+
+    # --- Load processed data ---
+    print("Loading processed data...")
+    X_valid = pd.read_parquet(processed_dir / "X_valid.parquet")
+    y_valid = pd.read_parquet(processed_dir / "y_valid.parquet")["sales"]
+
+    # --- Run predictions ---
+    print("Making predictions...")
+    y_pred = model.predict(X_valid)
+
+    # --- Calculate metrics ---
+    metrics_df = pd.DataFrame({k: [v] for k, v in point_metrics(y_valid, y_pred).items()})
+    metrics_df.to_csv(reports_dir / "metrics.csv", index=False)
+
+    print("\nModel Evaluation:")
+    print(metrics_df)
+
+    # --- Plot Actual vs Predicted ---
+    (reports_dir / "figures").mkdir(parents=True, exist_ok=True)
+    plt.figure(figsize=(10, 5))
+    plt.scatter(y_valid[:500], y_pred[:500], alpha=0.5)
+    plt.xlabel("Actual Sales")
+    plt.ylabel("Predicted Sales")
+    plt.title("Actual vs Predicted Sales (Sample)")
+    plt.grid(True)
+    plt.savefig(reports_dir / "figures" / "actual_vs_predicted.png", dpi=300)
+    plt.close()
+    return metrics_df
+
+
+def evaluate_wrmsse(forecast: pd.DataFrame = None, start_day: int = None, horizon: int = 28,
+                    raw_dir: Path = RAW_PATH, models_dir: Path = MODELS_PATH,
+                    reports_dir: Path = REPORTS_PATH) -> dict:
+    """
+    WRMSSE of `forecast` (or, when None, of a holdout forecast of the last
+    `horizon` days) with the per-level scores and the per-aggregate breakdown
+    written to reports/.
+    """
+    start = time.perf_counter()
+    if forecast is None:
+        from src.models.recursive_forecast import RecursiveForecaster
+
+        days = [c for c in pd.read_csv(raw_dir / "sales_train_validation.csv", nrows=0).columns if c.startswith("d_")]
+        start_day = int(days[-1][2:]) - horizon + 1
+        forecaster = RecursiveForecaster.from_files(models_dir / "baseline_lightgbm.joblib",
+                                                    models_dir / "feature_columns.json",
+                                                    models_dir / "cat_mappings.json", raw_dir, end_day=start_day - 1)
+        forecast = forecaster.to_frame(forecaster.forecast(horizon))
+        print(f"[wrmsse] Holdout forecast of d_{start_day}..d_{start_day + horizon - 1} "
+              f"for {len(forecast)} series in {time.perf_counter() - start:.2f}s")
+    elif "F1" in forecast.columns:
+        horizon = sum(1 for c in forecast.columns if c[:1] == "F" and c[1:].isdigit())
+    else:
+        # long layout: the dates give the window
+        dates = pd.to_datetime(forecast["date"])
+        horizon = dates.nunique()
+        if start_day is None:
+            calendar = pd.read_csv(raw_dir / "calendar.csv", usecols=["d", "date"])
+            day = calendar.loc[pd.to_datetime(calendar["date"]) == dates.min(), "d"]
+            start_day = int(str(day.iloc[0])[2:])
+
+    t = time.perf_counter()
+    evaluator, actual, ids = WRMSSE.from_raw(raw_dir, start_day, horizon)
+    if actual is None:
+        raise ValueError(f"No actuals in {raw_dir} for the {horizon}-day forecast window")
+    pred = forecast_matrix(forecast, ids)
+    missing = np.isnan(pred).any(axis=1)
+    if missing.any():
+        raise ValueError(f"Forecast is missing {int(missing.sum())} of {len(ids)} series / days")
+    loaded = time.perf_counter()
+    result = evaluator.score(actual, pred)
+    breakdown = evaluator.breakdown(actual, pred)
+    scored = time.perf_counter()
+
+    reports_dir.mkdir(parents=True, exist_ok=True)
+    levels = pd.DataFrame({"level": list(result["levels"]), "wrmsse": list(result["levels"].values())})
+    levels.to_csv(reports_dir / "wrmsse_levels.csv", index=False)
+    breakdown.to_csv(reports_dir / "wrmsse_breakdown.csv", index=False)
+    result.update(start_day=start_day, horizon=horizon, series=len(ids), aggregates=len(breakdown),
+                  load_seconds=round(loaded - t, 3), score_seconds=round(scored - loaded, 4))
+    with open(reports_dir / "wrmsse.json", "w", encoding="utf-8") as f:
+        json.dump(result, f, indent=2)
+
+    print(f"\nWRMSSE: {result['wrmsse']:.4f} ({len(ids)} series, {len(breakdown)} aggregates, "
+          f"setup {loaded - t:.2f}s, scoring {scored - loaded:.4f}s)")
+    print(levels.to_string(index=False))
+    return result
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Evaluate the forecasting models")
+    parser.add_argument("--holdout", action="store_true",
+                        help="also score WRMSSE of a forecast of the last 28 days of sales_train_validation.csv")
+    parser.add_argument("--forecast", type=Path, help="score WRMSSE of this forecast file instead")
+    parser.add_argument("--start-day", type=int, help="first forecast day of --forecast (default: after the sales file)")
+    parser.add_argument("--skip-valid", action="store_true", help="skip the point metrics on X_valid")
+    parser.add_argument("--raw", type=Path, default=RAW_PATH)
+    parser.add_argument("--models", type=Path, default=MODELS_PATH)
+    parser.add_argument("--reports", type=Path, default=REPORTS_PATH)
+    args = parser.parse_args()
+
+    if not args.skip_valid:
+        evaluate_valid(args.models / "baseline_lightgbm.joblib", PROCESSED_PATH, args.reports)
+    if args.forecast is not None:
+        evaluate_wrmsse(pd.read_parquet(args.forecast), args.start_day, raw_dir=args.raw,
+                        models_dir=args.models, reports_dir=args.reports)
+    elif args.holdout:
+        evaluate_wrmsse(raw_dir=args.raw, models_dir=args.models, reports_dir=args.reports)
+
+    print("Evaluation complete. Metrics and plots saved in 'reports/'.")
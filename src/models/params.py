@@ -0,0 +1,37 @@
+# src/models/params.py
+"""
+LightGBM configs shared by the training scripts.
+
+NOLAG_PARAMS / NOLAG_ROUNDS are the no-lag model: train_model_nolag.py,
+train_shards.py, backtest.py and trial 0 of tune.py all import them. When a
+search has run they already include its best config (tuned_params).
+"""
+import json
+import os
+from pathlib import Path
+
+MODELS_PATH = Path("models")
+BEST_PARAMS_FILES = {"lag": "best_params.json", "nolag": "best_params_nolag.json"}
+
+
+def tuned_params(kind: str, params: dict, rounds: int, models_dir: Path = MODELS_PATH):
+    """(params, rounds) with the search's best config applied when models/best_params*.json exists."""
+    path = Path(models_dir) / BEST_PARAMS_FILES[kind]
+    if os.environ.get("USE_TUNED_PARAMS", "1") == "0" or not path.exists():
+        return params, rounds
+    with open(path, "r", encoding="utf-8") as f:
+        best = json.load(f)
+    return {**params, **best["params"]}, best["num_boost_round"]
+
+
+NOLAG_PARAMS = {
+    "objective": "regression",
+    "metric": ["rmse", "l1"],  # early stopping watches the first one
+    "boosting_type": "gbdt",
+    "learning_rate": 0.05,
+    "num_leaves": 31,
+    "verbosity": -1,
+}
+NOLAG_ROUNDS = 300
+NOLAG_STOPPING_ROUNDS = 30
+NOLAG_PARAMS, NOLAG_ROUNDS = tuned_params("nolag", NOLAG_PARAMS, NOLAG_ROUNDS)  # models/best_params_nolag.json
@@ -0,0 +1,268 @@
+# src/models/recursive_forecast.py
+"""
+Recursive multi-day forecasts for the lag model (models/baseline_lightgbm.joblib).
+
+    python -m src.models.recursive_forecast --horizon 28 --out data/processed/forecast_28d.parquet
+
+The last sales of every series sit in a (series x days) matrix with room for
+the horizon. Each step builds the feature rows of day t+1 for all series at
+once, scores them with one batched predict, writes the predictions into the
+matrix and moves on. Lags are column reads, rolling sums / sums of squares
+and EWM states are updated with the new column instead of being recomputed
+over the window. Calendar features are per-day scalars, prices come from a
+(series x week) table built once, and series ids are encoded once.
+
+History features are rounded through float32 exactly like the stored
+training table, so on actual history the rows equal the training rows.
+"""
+import argparse
+import json
+import time
+from pathlib import Path
+from typing import Dict, List, Optional, Sequence
+
+import joblib
+import numpy as np
+import pandas as pd
+
+from src.features.engine import _FEATURE_RE, _ewm_step, ewm_last
+from src.features.schema import FLOAT_FEATURE_DTYPE, PRICE_DTYPES
+
+RAW_PATH = Path("data/raw")
+MODELS_PATH = Path("models")
+SERIES_COLS = ["id", "item_id", "dept_id", "cat_id", "store_id", "state_id"]
+CALENDAR_NUMERIC = ["wm_yr_wk", "wday", "month", "year", "snap_CA", "snap_TX", "snap_WI"]
+CALENDAR_CODED = ["weekday", "event_name_1", "event_type_1", "event_name_2", "event_type_2"]
+DATE_FEATURES = {
+    "dayofweek": lambda ts: ts.dayofweek,
+    "quarter": lambda ts: ts.quarter,
+    "date_year": lambda ts: ts.year,
+    "date_month": lambda ts: ts.month,
+    "date_day": lambda ts: ts.day,
+}
+
+
+def _code(levels: Sequence[str], value) -> int:
+    if pd.isna(value):
+        return -1
+    try:
+        return levels.index(str(value))
+    except ValueError:
+        return -1
+
+
+class RecursiveForecaster:
+    def __init__(self, model, feature_cols: List[str], cat_maps: Dict[str, list], series: pd.DataFrame,
+                 history: np.ndarray, last_day: int, calendar: pd.DataFrame, prices: pd.DataFrame,
+                 ewm_state: Optional[Dict[float, np.ndarray]] = None, clip: bool = True):
+        self.model = model
+        self.feature_cols = feature_cols
+        self.cat_maps = cat_maps
+        self.ids = series["id"].astype(str).tolist()
+        self.row_of = {s: i for i, s in enumerate(self.ids)}
+        self.history = np.asarray(history, dtype=np.float64)
+        self.last_day = last_day
+        self.clip = clip
+
+        # column plan: what fills each feature column
+        self.plan = []
+        lookback = 1
+        for j, col in enumerate(feature_cols):
+            m = _FEATURE_RE.match(col)
+            if col in SERIES_COLS:
+                self.plan.append((j, "series", col))
+            elif col == "sell_price":
+                self.plan.append((j, "price", None))
+            elif col == "d" or col in CALENDAR_NUMERIC or col in CALENDAR_CODED or col in DATE_FEATURES:
+                self.plan.append((j, "calendar", col))
+            elif m and m.group(1):
+                k = int(m.group(1))
+                self.plan.append((j, "lag", k))
+                lookback = max(lookback, k)
+            elif m and m.group(2):
+                w = int(m.group(3))
+                self.plan.append((j, "rolling", (m.group(2), w)))
+                lookback = max(lookback, w)
+            elif m and m.group(4):
+                self.plan.append((j, "ewm", float(m.group(4))))
+            else:
+                raise ValueError(f"Don't know how to build feature {col!r} for a forecast")
+        if self.history.shape[1] < lookback:
+            raise ValueError(f"Need at least {lookback} days of history, got {self.history.shape[1]}")
+        self.lookback = lookback
+        self.windows = sorted({arg[1] for _, kind, arg in self.plan if kind == "rolling"})
+        self.spans = sorted({arg for _, kind, arg in self.plan if kind == "ewm"})
+        ewm_state = ewm_state or {}
+        missing = [s for s in self.spans if s not in ewm_state]
+        if missing:
+            raise ValueError(f"EWM features need an initial state for spans {missing}")
+        self.ewm_state = {s: np.asarray(ewm_state[s], dtype=np.float64) for s in self.spans}
+
+        # series codes, encoded once
+        self.series_codes = {}
+        for col in SERIES_COLS:
+            if col in feature_cols:
+                levels = self.cat_maps.get(col, [])
+                pos = {v: i for i, v in enumerate(levels)}
+                self.series_codes[col] = np.array([pos.get(str(v), -1) for v in series[col]], dtype=np.float64)
+
+        cal = calendar.copy()
+        cal["day"] = cal["d"].astype(str).str.rsplit("_", n=1).str[-1].astype(int)
+        self.calendar = cal.set_index("day")
+        self.stores = series["store_id"].astype(str).to_numpy()
+        self.items = series["item_id"].astype(str).to_numpy()
+        self.prices = prices
+
+    @classmethod
+    def from_files(cls, model_path: Path = MODELS_PATH / "baseline_lightgbm.joblib",
+                   feature_path: Path = MODELS_PATH / "feature_columns.json",
+                   cat_path: Path = MODELS_PATH / "cat_mappings.json", raw_dir: Path = RAW_PATH,
+                   ids: Optional[Sequence[str]] = None, end_day: Optional[int] = None,
+                   **kwargs) -> "RecursiveForecaster":
+        """
+        Model + artifacts and the latest actuals of sales_train_validation.csv.
+        With `end_day`, history stops at d_<end_day> (holdout forecasts / backtests).
+        """
+        model = joblib.load(model_path)
+        with open(feature_path, "r", encoding="utf-8") as f:
+            feature_cols = json.load(f)
+        with open(cat_path, "r", encoding="utf-8") as f:
+            cat_maps = json.load(f)
+
+        days = [c for c in pd.read_csv(raw_dir / "sales_train_validation.csv", nrows=0).columns if c.startswith("d_")]
+        if end_day is not None:
+            days = [d for d in days if int(d[2:]) <= end_day]
+        spans = [float(m.group(4)) for m in map(_FEATURE_RE.match, feature_cols) if m and m.group(4)]
+        lookback = max([int(m.group(1) or m.group(3)) for m in map(_FEATURE_RE.match, feature_cols)
+                        if m and not m.group(4)] + [1])
+        # EWM states need the whole history; otherwise only the last `lookback` days are read
+        use_days = days if spans else days[-lookback:]
+        sales = pd.read_csv(raw_dir / "sales_train_validation.csv", usecols=SERIES_COLS + use_days)
+        if ids is not None:
+            sales = sales[sales["id"].isin(set(ids))]
+        y = sales[use_days].to_numpy(dtype=np.float64)
+        ewm_state = {}
+        if spans:
+            ewm_state = {s: ewm_last(y, s) for s in spans}
+
+        last_day = int(days[-1][2:])
+        calendar = pd.read_csv(raw_dir / "calendar.csv")
+        first_week = int(calendar.loc[calendar["d"] == f"d_{last_day}", "wm_yr_wk"].iloc[0])
+        prices = pd.read_csv(raw_dir / "sell_prices.csv", dtype=PRICE_DTYPES)
+        prices = prices[(prices["wm_yr_wk"] >= first_week).to_numpy()]
+        return cls(model, feature_cols, cat_maps, sales[SERIES_COLS].reset_index(drop=True), y[:, -lookback:],
+                   last_day, calendar, prices, ewm_state=ewm_state, **kwargs)
+
+    def _calendar_row(self, day: int) -> dict:
+        if day not in self.calendar.index:
+            raise ValueError(f"calendar.csv has no row for d_{day}")
+        row = self.calendar.loc[day]
+        ts = pd.Timestamp(row["date"])
+        values = {"d": float(day)}
+        for col in CALENDAR_NUMERIC:
+            values[col] = float(row[col]) if col in row.index and pd.notna(row[col]) else np.nan
+        for col in CALENDAR_CODED:
+            values[col] = float(_code(self.cat_maps.get(col, []), row.get(col)))
+        for col, fn in DATE_FEATURES.items():
+            values[col] = float(fn(ts))
+        return values
+
+    def _price_table(self, rows: np.ndarray, weeks: Sequence[int]) -> Dict[int, np.ndarray]:
+        """sell_price per requested series for each week (NaN when not on sale)."""
+        keys = pd.MultiIndex.from_arrays([self.stores[rows], self.items[rows]])
+        out = {}
+        for week in weeks:
+            sub = self.prices[(self.prices["wm_yr_wk"] == week).to_numpy()]
+            sub = sub.set_index([sub["store_id"].astype(str), sub["item_id"].astype(str)])["sell_price"]
+            sub = sub[~sub.index.duplicated()]
+            out[week] = sub.reindex(keys).to_numpy(dtype=np.float64)
+        return out
+
+    def forecast(self, horizon: int = 28, ids: Optional[Sequence[str]] = None) -> np.ndarray:
+        """(series, horizon) predictions for days last_day+1 .. last_day+horizon, in `ids` order (default: all)."""
+        if horizon < 1:
+            raise ValueError(f"horizon must be at least 1 day, got {horizon}")
+        rows = np.arange(len(self.ids)) if ids is None else np.array([self.row_of[s] for s in ids], dtype=np.int64)
+        n, L = len(rows), self.lookback
+        Y = np.empty((n, L + horizon))
+        Y[:, :L] = self.history[rows, -L:]
+
+        days = [self.last_day + 1 + h for h in range(horizon)]
+        calendar = {day: self._calendar_row(day) for day in days}
+        prices = self._price_table(rows, sorted({int(calendar[d]["wm_yr_wk"]) for d in days}))
+
+        # running window sums over the L columns before the first forecast day
+        sums = {w: Y[:, L - w:L].sum(axis=1) for w in self.windows}
+        sqsums = {w: (Y[:, L - w:L] ** 2).sum(axis=1) for w in self.windows}
+        ewm_state = {s: self.ewm_state[s][rows].copy() for s in self.spans}
+
+        X = np.empty((n, len(self.feature_cols)))
+        for j, kind, arg in self.plan:
+            if kind == "series":
+                X[:, j] = self.series_codes[arg][rows]
+
+        to_table = lambda v: v.astype(FLOAT_FEATURE_DTYPE).astype(np.float64)  # same rounding as the stored table
+        for h, day in enumerate(days):
+            c = L + h  # matrix column of `day`
+            for j, kind, arg in self.plan:
+                if kind == "calendar":
+                    X[:, j] = calendar[day][arg]
+                elif kind == "price":
+                    X[:, j] = prices[int(calendar[day]["wm_yr_wk"])]
+                elif kind == "lag":
+                    X[:, j] = to_table(Y[:, c - arg])
+                elif kind == "rolling":
+                    stat, w = arg
+                    s, ss = sums[w], sqsums[w]
+                    if stat == "mean":
+                        v = s / w
+                    elif stat == "std":
+                        v = np.sqrt(np.maximum((ss - s * s / w) / (w - 1), 0.0)) if w > 1 else np.full(n, np.nan)
+                    elif stat == "min":
+                        v = Y[:, c - w:c].min(axis=1)
+                    else:
+                        v = Y[:, c - w:c].max(axis=1)
+                    X[:, j] = to_table(v)
+                elif kind == "ewm":
+                    X[:, j] = to_table(ewm_state[arg])
+
+            pred = np.asarray(self.model.predict(pd.DataFrame(X, columns=self.feature_cols)), dtype=np.float64)
+            Y[:, c] = np.maximum(pred, 0.0) if self.clip else pred
+
+            # slide the windows by one day
+            for w in self.windows:
+                sums[w] += Y[:, c] - Y[:, c - w]
+                sqsums[w] += Y[:, c] ** 2 - Y[:, c - w] ** 2
+            for s in self.spans:
+                ewm_state[s] = _ewm_step(ewm_state[s], Y[:, c], 2.0 / (s + 1.0))
+        return Y[:, L:]
+
+    def dates(self, horizon: int = 28) -> List[str]:
+        return [str(self.calendar.loc[self.last_day + 1 + h, "date"]) for h in range(horizon)]
+
+    def to_frame(self, preds: np.ndarray, ids: Optional[Sequence[str]] = None) -> pd.DataFrame:
+        """M5 submission layout: id, F1..F<horizon>."""
+        out = pd.DataFrame(preds, columns=[f"F{h + 1}" for h in range(preds.shape[1])])
+        out.insert(0, "id", list(ids) if ids is not None else self.ids)
+        return out
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Recursive multi-day forecast with the lag model")
+    parser.add_argument("--horizon", type=int, default=28)
+    parser.add_argument("--raw", type=Path, default=RAW_PATH)
+    parser.add_argument("--models", type=Path, default=MODELS_PATH)
+    parser.add_argument("--out", type=Path, default=Path("data/processed/forecast_28d.parquet"))
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    forecaster = RecursiveForecaster.from_files(args.models / "baseline_lightgbm.joblib",
+                                                args.models / "feature_columns.json",
+                                                args.models / "cat_mappings.json", args.raw)
+    loaded = time.perf_counter()
+    preds = forecaster.forecast(args.horizon)
+    done = time.perf_counter()
+    args.out.parent.mkdir(parents=True, exist_ok=True)
+    forecaster.to_frame(preds).to_parquet(args.out, index=False)
+    print(f"Forecast {len(forecaster.ids)} series x {args.horizon} days "
+          f"(load {loaded - start:.2f}s, forecast {done - loaded:.2f}s) -> {args.out}")
@@ -0,0 +1,242 @@
+# src/models/registry.py
+"""
+Versioned model registry: models/registry/<kind>/<version>/ holds one model
+with the feature list and category levels it was trained on, and
+models/registry/<kind>/CURRENT names the version the APIs serve
+(kind "nolag" for app_nolag, "lag" for app.py).
+
+    python -m src.models.registry register --kind nolag --promote
+    python -m src.models.registry register --kind lag --model models/baseline_lightgbm.joblib \
+        --features models/feature_columns.json --cats models/cat_mappings.json
+    python -m src.models.registry promote --kind nolag v20260101-120000
+    python -m src.models.registry list --kind nolag
+
+A version directory is model.joblib, feature_columns.json, cat_mappings.json
+and version.json (written last; a directory without it is ignored). With
+--bundle (the default for nolag) it is also a full serving bundle
+(src/features/serving_bundle.py), so a swap brings its own pre-encoded
+lookup tables. Versions are never modified after registration; promoting
+rewrites CURRENT atomically, and running APIs pick it up with
+RegistryWatcher or POST /registry/reload.
+"""
+import argparse
+import json
+import os
+import shutil
+import threading
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Callable, List, Optional, Tuple
+
+import joblib
+
+from src.api.cache import model_fingerprint
+
+BASE_DIR = Path(__file__).resolve().parents[2]
+REGISTRY_PATH = BASE_DIR / "models" / "registry"
+MODELS_PATH = BASE_DIR / "models"
+
+# what train_model_nolag.py / train_model.py write, per kind
+DEFAULT_ARTIFACTS = {
+    "nolag": ("baseline_lightgbm_nolag.joblib", "feature_columns_nolag.json", "cat_mappings_nolag.json"),
+    "lag": ("baseline_lightgbm.joblib", "feature_columns.json", "cat_mappings.json"),
+}
+
+
+def version_dir(kind: str, version: str, registry_dir: Path = REGISTRY_PATH) -> Path:
+    return Path(registry_dir) / kind / version
+
+
+def read_version(kind: str, version: str, registry_dir: Path = REGISTRY_PATH) -> Optional[dict]:
+    try:
+        with open(version_dir(kind, version, registry_dir) / "version.json", "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def list_versions(kind: str, registry_dir: Path = REGISTRY_PATH) -> List[dict]:
+    """version.json of every complete version, oldest first."""
+    root = Path(registry_dir) / kind
+    if not root.is_dir():
+        return []
+    versions = [read_version(kind, p.name, registry_dir) for p in root.iterdir() if p.is_dir()]
+    return sorted((v for v in versions if v), key=lambda v: v["registered_at"])
+
+
+def current_version(kind: str, registry_dir: Path = REGISTRY_PATH) -> Optional[str]:
+    try:
+        with open(Path(registry_dir) / kind / "CURRENT", "r", encoding="utf-8") as f:
+            return f.read().strip() or None
+    except OSError:
+        return None
+
+
+def promote(kind: str, version: str, registry_dir: Path = REGISTRY_PATH) -> None:
+    if read_version(kind, version, registry_dir) is None:
+        raise FileNotFoundError(f"No registered {kind} version {version} in {registry_dir}")
+    path = Path(registry_dir) / kind / "CURRENT"
+    tmp = path.with_name(f"CURRENT.{os.getpid()}.tmp")
+    with open(tmp, "w", encoding="utf-8") as f:
+        f.write(version + "\n")
+    os.replace(tmp, path)  # readers see the old or the new version, never a partial file
+
+
+def resolve(spec: str, registry_dir: Path = REGISTRY_PATH) -> Tuple[str, Optional[str]]:
+    """"nolag" -> (nolag, its CURRENT version), "lag/v2026..." -> (lag, v2026...)."""
+    kind, _, version = spec.partition("/")
+    return kind, version or current_version(kind, registry_dir)
+
+
+def register(kind: str, model_path: Path, feature_path: Path, cat_path: Path, version: Optional[str] = None,
+             registry_dir: Path = REGISTRY_PATH, bundle: bool = False, raw_dir: Optional[Path] = None,
+             processed_dir: Optional[Path] = None, notes: str = "") -> dict:
+    """Copy a trained model and its artifacts into a new version; returns its version.json."""
+    version = version or datetime.now(timezone.utc).strftime("v%Y%m%d-%H%M%S")
+    out_dir = version_dir(kind, version, registry_dir)
+    if out_dir.exists():
+        raise FileExistsError(f"{out_dir} already exists; versions are immutable")
+    with open(feature_path, "r", encoding="utf-8") as f:
+        train_cols = json.load(f)
+    with open(cat_path, "r", encoding="utf-8") as f:
+        cat_maps = json.load(f)
+
+    if bundle:
+        from src.features import serving_bundle
+
+        sources = {k: v for k, v in (("raw_dir", raw_dir), ("processed_dir", processed_dir)) if v is not None}
+        serving_bundle.build_bundle(out_dir, model_path=model_path, feature_path=feature_path, cat_path=cat_path,
+                                    **sources)
+    else:
+        tmp_dir = out_dir.with_name(out_dir.name + ".tmp")
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+        tmp_dir.mkdir(parents=True)
+        shutil.copyfile(model_path, tmp_dir / "model.joblib")
+        shutil.copyfile(feature_path, tmp_dir / "feature_columns.json")
+        shutil.copyfile(cat_path, tmp_dir / "cat_mappings.json")
+        tmp_dir.rename(out_dir)
+
+    meta = {
+        "version": version,
+        "kind": kind,
+        "registered_at": datetime.now(timezone.utc).isoformat(),
+        "fingerprint": model_fingerprint(out_dir / "model.joblib", train_cols, cat_maps),
+        "n_features": len(train_cols),
+        "bundle": bundle,
+        "source": str(model_path),
+        "notes": notes,
+    }
+    tmp = out_dir / "version.json.tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(meta, f, indent=2)
+    os.replace(tmp, out_dir / "version.json")
+    return meta
+
+
+def load_version(kind: str, version: str, registry_dir: Path = REGISTRY_PATH) -> dict:
+    """
+    Model and artifacts of one version, plus its mapped ServingIndex when the
+    version is a bundle (index None otherwise).
+    """
+    meta = read_version(kind, version, registry_dir)
+    if meta is None:
+        raise FileNotFoundError(f"No registered {kind} version {version} in {registry_dir}")
+    path = version_dir(kind, version, registry_dir)
+    if meta.get("bundle"):
+        from src.features.serving_bundle import load_bundle
+
+        loaded = load_bundle(path)
+    else:
+        with open(path / "feature_columns.json", "r", encoding="utf-8") as f:
+            train_cols = json.load(f)
+        with open(path / "cat_mappings.json", "r", encoding="utf-8") as f:
+            cat_maps = json.load(f)
+        loaded = {"model": joblib.load(path / "model.joblib"), "train_cols": train_cols, "cat_maps": cat_maps,
+                  "index": None}
+    loaded.update(version=version, kind=kind, path=path, meta=meta, fingerprint=meta["fingerprint"])
+    return loaded
+
+
+class RegistryWatcher:
+    """
+    Daemon thread that re-reads <kind>/CURRENT every `interval` seconds and
+    calls `on_change(version)` when it names another version. Every worker
+    process runs its own watcher, so one promote reaches all of them. If
+    on_change raises, the error is printed and the same version is retried on
+    the next poll; the running version stays in service meanwhile.
+    """
+
+    def __init__(self, kind: str, on_change: Callable[[str], None], current: Optional[str],
+                 registry_dir: Path = REGISTRY_PATH, interval: float = 10.0):
+        self.kind = kind
+        self.on_change = on_change
+        self.current = current
+        self.registry_dir = Path(registry_dir)
+        self.interval = interval
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name=f"registry-{kind}", daemon=True)
+
+    def start(self) -> "RegistryWatcher":
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self._stop.set()
+
+    def check(self) -> bool:
+        """Swap now if CURRENT changed; True when a new version was activated."""
+        with self._lock:  # the poll thread and a reload request never load the same version twice
+            version = current_version(self.kind, self.registry_dir)
+            if version is None or version == self.current:
+                return False
+            self.on_change(version)
+            self.current = version
+            return True
+
+    def _run(self) -> None:
+        while not self._stop.wait(self.interval):
+            try:
+                self.check()
+            except Exception as e:
+                print(f"[registry] Could not activate {self.kind} version from CURRENT: {e!r}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Register, promote and list model versions")
+    parser.add_argument("command", choices=["register", "promote", "list"])
+    parser.add_argument("version", nargs="?", help="version to promote (register: optional explicit name)")
+    parser.add_argument("--kind", choices=sorted(DEFAULT_ARTIFACTS), default="nolag")
+    parser.add_argument("--model", type=Path)
+    parser.add_argument("--features", type=Path)
+    parser.add_argument("--cats", type=Path)
+    parser.add_argument("--bundle", action=argparse.BooleanOptionalAction, default=None,
+                        help="also build the serving index into the version (default: on for nolag)")
+    parser.add_argument("--raw", type=Path, help="raw data for --bundle (default data/raw)")
+    parser.add_argument("--processed", type=Path, help="processed data for --bundle (default data/processed)")
+    parser.add_argument("--notes", default="")
+    parser.add_argument("--promote", action="store_true", help="make the new version CURRENT")
+    parser.add_argument("--registry", type=Path, default=REGISTRY_PATH)
+    args = parser.parse_intermixed_args()  # the version may follow the options
+
+    if args.command == "register":
+        model_name, feature_name, cat_name = DEFAULT_ARTIFACTS[args.kind]
+        bundle = args.kind == "nolag" if args.bundle is None else args.bundle
+        meta = register(args.kind, args.model or MODELS_PATH / model_name, args.features or MODELS_PATH / feature_name,
+                        args.cats or MODELS_PATH / cat_name, args.version, args.registry, bundle,
+                        args.raw, args.processed, args.notes)
+        print(f"[registry] Registered {args.kind}/{meta['version']} (fingerprint {meta['fingerprint']})")
+        if args.promote:
+            promote(args.kind, meta["version"], args.registry)
+            print(f"[registry] {args.kind} CURRENT -> {meta['version']}")
+    elif args.command == "promote":
+        if not args.version:
+            parser.error("promote needs a version")
+        promote(args.kind, args.version, args.registry)
+        print(f"[registry] {args.kind} CURRENT -> {args.version}")
+    else:
+        current = current_version(args.kind, args.registry)
+        for v in list_versions(args.kind, args.registry):
+            mark = "*" if v["version"] == current else " "
+            print(f"{mark} {v['version']}  {v['registered_at']}  {v['fingerprint']}  "
+                  f"{'bundle' if v['bundle'] else 'model'}  {v['notes']}")
@@ -0,0 +1,144 @@
+# src/models/train_shards.py
+"""
+Per-store / per-store x dept no-lag models, trained in parallel.
+
+    python -m src.models.train_shards --level store --workers 4
+    python -m src.models.train_shards --level store_dept
+
+Every shard gets its own out-of-core TrainingData (rows filtered to the shard,
+cached like the global dataset) and trains on a ProcessPoolExecutor worker.
+The shards read a table hive-partitioned on the level's keys, written once to
+data/processed/shard_tables/ when the feature table isn't (partitioned_source),
+so each shard decodes only its own rows rather than the whole table.
+Cores are split between the pool and LightGBM: each worker trains with
+cpu_count // workers threads, so the two levels of parallelism never
+oversubscribe the box.
+
+Shard models use the global feature list and category levels
+(models/feature_columns_nolag.json, cat_mappings_nolag.json), so the API's
+serving index encodes a request once for any shard. Results go to
+models/shards/<level>/<shard>.joblib plus manifest.json (written last), which
+ShardRouter (src/api/shard_router.py) reads.
+"""
+import argparse
+import json
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from datetime import datetime, timezone
+from pathlib import Path
+
+import joblib
+import lightgbm as lgb
+from lightgbm import early_stopping
+
+from src.features.schema import read_features
+from src.models.dataset import NOLAG_SPEC, PROCESSED_PATH, TrainingData, partitioned_source
+from src.models.params import NOLAG_PARAMS, NOLAG_ROUNDS, NOLAG_STOPPING_ROUNDS
+
+MODELS_PATH = Path("models")
+SHARDS_PATH = MODELS_PATH / "shards"
+LEVELS = {"store": ["store_id"], "store_dept": ["store_id", "dept_id"]}
+MIN_ROWS = 1000  # smaller shards are left to the coarser level / global model
+
+
+def shard_name(values) -> str:
+    return "__".join(str(v) for v in values)
+
+
+def list_shards(level: str, processed_dir: Path = PROCESSED_PATH) -> list:
+    keys = LEVELS[level]
+    combos = read_features(processed_dir, columns=keys).drop_duplicates()
+    return sorted(tuple(str(v) for v in row) for row in combos.itertuples(index=False))
+
+
+def train_shard(level: str, values: tuple, processed_dir: Path, out_dir: Path, train_cols: list,
+                cat_maps: dict, num_threads: int) -> dict:
+    """Worker: build (or load) the shard dataset, train, save. Returns its manifest entry."""
+    start = time.perf_counter()
+    filters = dict(zip(LEVELS[level], values))
+    data = TrainingData(processed_dir, NOLAG_SPEC, filters=filters, cat_mappings=cat_maps,
+                        params={"num_threads": num_threads})
+    if data.feature_names != train_cols:
+        raise ValueError(f"Feature table columns don't match feature_columns_nolag.json for shard {values}")
+    entry = {"keys": filters, "name": shard_name(values)}
+    train_set, valid_set = data.datasets()
+    n_train, n_valid = train_set.construct().num_data(), valid_set.construct().num_data()
+    if n_train < MIN_ROWS or n_valid == 0:
+        return {**entry, "skipped": f"{n_train} train rows"}
+
+    model = lgb.train({**NOLAG_PARAMS, "num_threads": num_threads}, train_set, num_boost_round=NOLAG_ROUNDS,
+                      valid_sets=[valid_set], valid_names=["valid"],
+                      callbacks=[early_stopping(NOLAG_STOPPING_ROUNDS, first_metric_only=True, verbose=False)])
+    path = out_dir / f"{entry['name']}.joblib"
+    joblib.dump(model, path)
+    return {
+        **entry,
+        "path": path.name,
+        "rows_train": n_train,
+        "rows_valid": n_valid,
+        "rmse": model.best_score["valid"]["rmse"],
+        "best_iteration": model.best_iteration,
+        "seconds": round(time.perf_counter() - start, 3),
+    }
+
+
+def train_shards(level: str = "store", workers=None, processed_dir: Path = PROCESSED_PATH,
+                 models_dir: Path = MODELS_PATH) -> dict:
+    start = time.perf_counter()
+    with open(models_dir / "feature_columns_nolag.json", "r", encoding="utf-8") as f:
+        train_cols = json.load(f)
+    with open(models_dir / "cat_mappings_nolag.json", "r", encoding="utf-8") as f:
+        cat_maps = json.load(f)
+
+    shards = list_shards(level, processed_dir)
+    source_dir = partitioned_source(processed_dir, LEVELS[level])
+    cores = os.cpu_count() or 1
+    workers = max(1, min(workers or cores, len(shards)))
+    num_threads = max(1, cores // workers)
+    out_dir = models_dir / "shards" / level
+    out_dir.mkdir(parents=True, exist_ok=True)
+    print(f"[shards] {len(shards)} {level} shards on {workers} workers x {num_threads} LightGBM threads")
+
+    entries = []
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        futures = [pool.submit(train_shard, level, values, source_dir, out_dir, train_cols, cat_maps, num_threads)
+                   for values in shards]
+        for fut in as_completed(futures):
+            e = fut.result()
+            entries.append(e)
+            if "skipped" in e:
+                print(f"[shards] {e['name']}: skipped ({e['skipped']})")
+            else:
+                print(f"[shards] {e['name']}: rmse {e['rmse']:.4f} @ {e['best_iteration']} "
+                      f"on {e['rows_train']} rows in {e['seconds']}s")
+
+    entries.sort(key=lambda e: e["name"])
+    manifest = {
+        "created_at": datetime.now(timezone.utc).isoformat(),
+        "level": level,
+        "keys": LEVELS[level],
+        "feature_columns": train_cols,
+        "params": {**NOLAG_PARAMS, "num_boost_round": NOLAG_ROUNDS},
+        "workers": workers,
+        "num_threads": num_threads,
+        "build_seconds": round(time.perf_counter() - start, 3),
+        "shards": [e for e in entries if "skipped" not in e],
+        "skipped": [e for e in entries if "skipped" in e],
+    }
+    with open(out_dir / "manifest.json", "w", encoding="utf-8") as f:
+        json.dump(manifest, f, indent=2)
+    return manifest
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Train per-store / per-store x dept no-lag models in parallel")
+    parser.add_argument("--level", choices=sorted(LEVELS), default="store")
+    parser.add_argument("--workers", type=int, default=None, help="worker processes (default: one per core)")
+    parser.add_argument("--processed", type=Path, default=PROCESSED_PATH)
+    parser.add_argument("--models", type=Path, default=MODELS_PATH)
+    args = parser.parse_args()
+
+    manifest = train_shards(args.level, args.workers, args.processed, args.models)
+    print(f"Trained {len(manifest['shards'])} {args.level} shards in {manifest['build_seconds']}s "
+          f"-> {args.models / 'shards' / args.level / 'manifest.json'}")
@@ -0,0 +1,279 @@
+# src/models/tune.py
+"""
+Parallel hyperparameter search for the lag / no-lag LightGBM models.
+
+    python -m src.models.tune --model nolag --trials 40 --workers 4
+    python -m src.models.tune --model lag --trials 60 --min-rounds 25 --max-rounds 1000
+
+Every trial trains on the same cached binary dataset the training scripts use
+(TrainingData, data/processed/lgb_cache): it is built once, then each worker
+process loads train.bin / valid.bin once and reuses it for all its trials, so
+no trial re-reads or re-bins the feature table. Trials run on a
+ProcessPoolExecutor with cores split between the pool and LightGBM like
+train_shards.
+
+Configurations are sampled at random from SEARCH_SPACE and pruned by
+asynchronous successive halving: at the rung budgets min_rounds * eta^k a
+trial reports its best validation RMSE so far to a table shared by all
+workers, and stops unless it is in the top 1/eta of the scores already
+reported at that rung. Most rounds are spent on the promising configurations.
+Surviving trials run to max_rounds with early stopping. Trial 0 is the
+configuration the scripts currently train (never pruned), so the leaderboard
+shows what the search gained over it.
+
+The leaderboard goes to reports/hpo/<model>-<timestamp>/leaderboard.csv, plus
+summary.json. When the best trial beats the current configuration, its
+params and best iteration are written to models/best_params.json (lag) or
+models/best_params_nolag.json. train_model.py, train_model_nolag.py,
+train_shards.py and the backtests then train with them via
+src.models.params.tuned_params() (USE_TUNED_PARAMS=0 ignores the file).
+
+Trials are scored on the cached random validation split, the same rows the
+training scripts early-stop on; confirm a new config with the backtest.
+"""
+import argparse
+import json
+import math
+import multiprocessing
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from datetime import datetime, timezone
+from pathlib import Path
+
+import lightgbm as lgb
+import numpy as np
+import pandas as pd
+from lightgbm import early_stopping
+from lightgbm.callback import EarlyStopException
+
+from src.models.dataset import LAG_SPEC, NOLAG_SPEC, PROCESSED_PATH, TrainingData
+from src.models.params import BEST_PARAMS_FILES, MODELS_PATH
+
+REPORTS_PATH = Path("reports") / "hpo"
+
+# (low, high, scale); min_data_in_leaf starts at LightGBM's default because the
+# cached dataset was pre-filtered with it and may only be made stricter
+SEARCH_SPACE = {
+    "learning_rate": (0.01, 0.3, "log"),
+    "num_leaves": (15, 511, "int_log"),
+    "min_data_in_leaf": (20, 1000, "int_log"),
+    "feature_fraction": (0.4, 1.0, "uniform"),
+    "bagging_fraction": (0.4, 1.0, "uniform"),
+    "lambda_l2": (1e-3, 30.0, "log"),
+}
+FIXED_PARAMS = {"objective": "regression", "boosting_type": "gbdt", "metric": ["rmse", "l1"], "verbosity": -1}
+
+
+def sample_params(rng: np.random.Generator) -> dict:
+    params = {}
+    for name, (low, high, scale) in SEARCH_SPACE.items():
+        if scale in ("log", "int_log"):
+            value = math.exp(rng.uniform(math.log(low), math.log(high)))
+        else:
+            value = rng.uniform(low, high)
+        params[name] = int(round(value)) if scale.startswith("int") else round(float(value), 6)
+    params["bagging_freq"] = 1 if params["bagging_fraction"] < 1.0 else 0
+    return params
+
+
+def rung_budgets(min_rounds: int, max_rounds: int, eta: int) -> list:
+    budgets, b = [], min_rounds
+    while b < max_rounds:
+        budgets.append(b)
+        b *= eta
+    return budgets
+
+
+class HalvingPruner:
+    """
+    LightGBM callback for one trial: at each rung budget, record the trial's
+    best validation RMSE so far in the shared `rungs` table and stop training
+    unless it ranks in the top 1/eta there. Rungs with fewer than eta scores
+    promote everything (nothing to compare with yet).
+    """
+
+    def __init__(self, rungs, lock, budgets: list, eta: int, exempt: bool = False):
+        self.rungs = rungs
+        self.lock = lock
+        self.budgets = {b: k for k, b in enumerate(budgets)}
+        self.eta = eta
+        self.exempt = exempt
+        self.best = (math.inf, 0, None)  # (rmse, iteration, evaluation list)
+        self.pruned_at = None
+        self.rounds = 0  # trained, not kept: lgb.train drops the trees after the best iteration
+        self.order = 25  # before early_stopping, so it sees every round
+
+    def __call__(self, env) -> None:
+        self.rounds = env.iteration + 1
+        rmse = next(r[2] for r in env.evaluation_result_list if r[1] == "rmse")
+        if rmse < self.best[0]:
+            self.best = (rmse, env.iteration, env.evaluation_result_list)
+        rung = self.budgets.get(env.iteration + 1)
+        if rung is None:
+            return
+        with self.lock:
+            scores = list(self.rungs.get(rung, [])) + [self.best[0]]
+            self.rungs[rung] = scores
+        if self.exempt or len(scores) < self.eta:
+            return
+        cutoff = sorted(scores)[max(1, len(scores) // self.eta) - 1]
+        if self.best[0] > cutoff:
+            self.pruned_at = env.iteration + 1
+            raise EarlyStopException(self.best[1], self.best[2])
+
+
+_worker = {}
+
+
+def _init_worker(cache_dir: str, dataset_params: dict, rungs, lock) -> None:
+    # one load of the cached binary per process, reused by every trial it runs
+    train = lgb.Dataset(str(Path(cache_dir) / "train.bin"), params=dataset_params)
+    valid = lgb.Dataset(str(Path(cache_dir) / "valid.bin"), reference=train, params=dataset_params)
+    _worker.update(train=train, valid=valid, rungs=rungs, lock=lock)
+
+
+def run_trial(trial: int, params: dict, budgets: list, eta: int, max_rounds: int, stopping_rounds: int,
+              num_threads: int, exempt: bool = False) -> dict:
+    """Worker: train one configuration with the shared pruner; returns its leaderboard row."""
+    start = time.perf_counter()
+    pruner = HalvingPruner(_worker["rungs"], _worker["lock"], budgets, eta, exempt)
+    # the binary was pre-filtered at the default min_data_in_leaf (<= every trial's); without this LightGBM
+    # compares against the previous trial's value on the shared Dataset and refuses to go lower
+    model = lgb.train({**params, **FIXED_PARAMS, "num_threads": num_threads, "feature_pre_filter": False},
+                      _worker["train"],
+                      num_boost_round=max_rounds, valid_sets=[_worker["valid"]], valid_names=["valid"],
+                      callbacks=[early_stopping(stopping_rounds, first_metric_only=True, verbose=False), pruner])
+    rounds = pruner.rounds
+    if pruner.pruned_at is not None:
+        status = "pruned"
+    elif rounds < max_rounds:
+        status = "early_stopped"
+    else:
+        status = "complete"
+    return {
+        "trial": trial,
+        "status": status,
+        "valid_rmse": model.best_score["valid"]["rmse"],
+        "valid_mae": model.best_score["valid"]["l1"],
+        "best_iteration": model.best_iteration,
+        "rounds": rounds,
+        "seconds": round(time.perf_counter() - start, 3),
+        **params,
+    }
+
+
+def current_config(kind: str):
+    """(spec, params, rounds) the training scripts train with now (tuned or hard-coded)."""
+    if kind == "lag":
+        from src.models.train_model import NUM_BOOST_ROUND, PARAMS
+        return LAG_SPEC, PARAMS, NUM_BOOST_ROUND
+    from src.models.params import NOLAG_PARAMS, NOLAG_ROUNDS
+    return NOLAG_SPEC, NOLAG_PARAMS, NOLAG_ROUNDS
+
+
+def tune(kind: str = "nolag", trials: int = 40, workers=None, min_rounds: int = 25, max_rounds: int = 1000,
+         eta: int = 3, stopping_rounds: int = 30, seed: int = 0, processed_dir: Path = PROCESSED_PATH,
+         models_dir: Path = MODELS_PATH, reports_dir: Path = REPORTS_PATH, write_best: bool = True) -> dict:
+    start = time.perf_counter()
+    spec, current, current_rounds = current_config(kind)
+    data = TrainingData(processed_dir, spec)
+    data.datasets()  # build the cache once, before any worker loads it
+
+    cores = os.cpu_count() or 1
+    workers = max(1, min(workers or max(1, cores // 2), trials))
+    num_threads = max(1, cores // workers)
+    budgets = rung_budgets(min_rounds, max_rounds, eta)
+    print(f"[tune] {kind}: {trials} trials on {workers} workers x {num_threads} LightGBM threads, "
+          f"rungs at {budgets} rounds (eta {eta}), up to {max_rounds} rounds")
+
+    # trial 0 is the current configuration with the scripts' round budget
+    rng = np.random.default_rng(seed)
+    configs = [{k: current[k] for k in list(SEARCH_SPACE) + ["bagging_freq"] if k in current}]
+    configs += [sample_params(rng) for _ in range(trials - 1)]
+
+    results = []
+    with multiprocessing.Manager() as manager:
+        rungs, lock = manager.dict(), manager.Lock()
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                                 initargs=(str(data.cache_dir), {**data.params, "num_threads": num_threads},
+                                           rungs, lock)) as pool:
+            futures = [pool.submit(run_trial, i, params, budgets, eta, current_rounds if i == 0 else max_rounds,
+                                   stopping_rounds, num_threads, i == 0) for i, params in enumerate(configs)]
+            for fut in as_completed(futures):
+                r = fut.result()
+                results.append(r)
+                print(f"[tune] trial {r['trial']}: {r['status']} at {r['rounds']} rounds, "
+                      f"RMSE {r['valid_rmse']:.4f} @ {r['best_iteration']} ({r['seconds']}s)")
+
+    board = pd.DataFrame(results).sort_values(["valid_rmse", "trial"]).reset_index(drop=True)
+    board.insert(0, "rank", range(1, len(board) + 1))
+    run_dir = reports_dir / f"{kind}-{datetime.now().strftime('%Y%m%d-%H%M%S')}"
+    run_dir.mkdir(parents=True, exist_ok=True)
+    board.to_csv(run_dir / "leaderboard.csv", index=False)
+
+    best = board[board["status"] != "pruned"].iloc[0]  # trial 0 is never pruned
+    baseline = board[board["trial"] == 0].iloc[0]
+    best_params = {k: int(best[k]) if k == "bagging_freq" or SEARCH_SPACE[k][2].startswith("int") else float(best[k])
+                   for k in list(SEARCH_SPACE) + ["bagging_freq"] if k in board.columns and pd.notna(best[k])}
+    rounds_trained = int(board["rounds"].sum())
+    summary = {
+        "created_at": datetime.now(timezone.utc).isoformat(),
+        "model": kind,
+        "trials": trials,
+        "workers": workers,
+        "num_threads": num_threads,
+        "eta": eta,
+        "rung_budgets": budgets,
+        "max_rounds": max_rounds,
+        "dataset": data.cache_dir.name,
+        "best": {"trial": int(best["trial"]), "valid_rmse": float(best["valid_rmse"]),
+                 "valid_mae": float(best["valid_mae"]), "num_boost_round": int(best["best_iteration"]),
+                 "params": best_params},
+        "current": {"valid_rmse": float(baseline["valid_rmse"]), "valid_mae": float(baseline["valid_mae"])},
+        "pruned": int((board["status"] == "pruned").sum()),
+        "rounds_trained": rounds_trained,
+        "rounds_without_pruning": current_rounds + max_rounds * (trials - 1),
+        "seconds": round(time.perf_counter() - start, 3),
+    }
+    improved = int(best["trial"]) != 0 and best["valid_rmse"] < baseline["valid_rmse"]
+    if write_best and improved:
+        path = models_dir / BEST_PARAMS_FILES[kind]
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump({"created_at": summary["created_at"], "params": best_params,
+                       "num_boost_round": summary["best"]["num_boost_round"],
+                       "valid_rmse": summary["best"]["valid_rmse"], "run_dir": str(run_dir)}, f, indent=2)
+        summary["written"] = str(path)
+    with open(run_dir / "summary.json", "w", encoding="utf-8") as f:
+        json.dump(summary, f, indent=2)
+    summary["run_dir"] = str(run_dir)
+    return summary
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Parallel LightGBM hyperparameter search with successive halving")
+    parser.add_argument("--model", choices=["lag", "nolag"], default="nolag")
+    parser.add_argument("--trials", type=int, default=40, help="configurations to try, including the current one")
+    parser.add_argument("--workers", type=int, default=None, help="parallel trials (default: half the cores)")
+    parser.add_argument("--min-rounds", type=int, default=25, help="first rung budget (boosting rounds)")
+    parser.add_argument("--max-rounds", type=int, default=1000)
+    parser.add_argument("--eta", type=int, default=3, help="keep the top 1/eta at each rung")
+    parser.add_argument("--stopping-rounds", type=int, default=30)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--processed", type=Path, default=PROCESSED_PATH)
+    parser.add_argument("--models", type=Path, default=MODELS_PATH)
+    parser.add_argument("--reports", type=Path, default=REPORTS_PATH)
+    parser.add_argument("--no-write", action="store_true", help="only write the leaderboard")
+    args = parser.parse_args()
+    if args.trials < 1 or args.eta < 2:
+        parser.error("--trials must be >= 1 and --eta >= 2")
+
+    summary = tune(args.model, args.trials, args.workers, args.min_rounds, args.max_rounds, args.eta,
+                   args.stopping_rounds, args.seed, args.processed, args.models, args.reports, not args.no_write)
+    best, current = summary["best"], summary["current"]
+    print(f"Searched {args.trials} {args.model} configs in {summary['seconds']}s ({summary['pruned']} pruned, "
+          f"{summary['rounds_trained']} of {summary['rounds_without_pruning']} rounds): best RMSE "
+          f"{best['valid_rmse']:.4f} (trial {best['trial']}) vs current {current['valid_rmse']:.4f} "
+          f"-> {summary['run_dir']}/")
+    if "written" in summary:
+        print(f"Best params written to {summary['written']}")
@@ -0,0 +1,166 @@
+# src/models/wrmsse.py
+"""
+M5 WRMSSE over the 12 aggregation levels, with a sparse aggregation matrix.
+
+Every aggregate series of every level (total, state, store, ..., item x store)
+is a row of one 0/1 scipy.sparse matrix A over the bottom-level series, so
+aggregating a (series x days) matrix for the whole hierarchy is a single
+A @ Y. Scales (mean squared one-day change of each aggregate's training
+history, from its first sale on) and weights (its dollar sales over the last
+28 training days) are computed once; scoring a forecast is then one sparse
+mat-mul of the error matrix plus a few vector ops.
+
+    evaluator, actual, ids = WRMSSE.from_raw(Path("data/raw"), start_day=1886)
+    evaluator.score(actual, forecast)   # {"wrmsse": ..., "levels": {"total": ..., ...}}
+"""
+from pathlib import Path
+from typing import List, Optional, Sequence, Tuple
+
+import numpy as np
+import pandas as pd
+from scipy import sparse
+
+from src.features.schema import PRICE_DTYPES
+
+RAW_PATH = Path("data/raw")
+SERIES_COLS = ["id", "item_id", "dept_id", "cat_id", "store_id", "state_id"]
+WEIGHT_DAYS = 28
+
+# (name, group columns) for the 12 M5 levels; [] is the grand total
+LEVELS = [
+    ("total", []),
+    ("state", ["state_id"]),
+    ("store", ["store_id"]),
+    ("cat", ["cat_id"]),
+    ("dept", ["dept_id"]),
+    ("state_cat", ["state_id", "cat_id"]),
+    ("state_dept", ["state_id", "dept_id"]),
+    ("store_cat", ["store_id", "cat_id"]),
+    ("store_dept", ["store_id", "dept_id"]),
+    ("item", ["item_id"]),
+    ("item_state", ["item_id", "state_id"]),
+    ("item_store", ["item_id", "store_id"]),
+]
+
+
+def aggregation_matrix(series: pd.DataFrame) -> Tuple[sparse.csr_matrix, pd.DataFrame]:
+    """
+    (n_aggregates x n_series) 0/1 matrix over the rows of `series` and the
+    level / key of each aggregate row.
+    """
+    n = len(series)
+    blocks, labels = [], []
+    for name, cols in LEVELS:
+        if cols:
+            key = series[cols[0]].astype(str)
+            for c in cols[1:]:
+                key = key + "_" + series[c].astype(str)
+            codes, keys = pd.factorize(key, sort=True)
+        else:
+            codes, keys = np.zeros(n, dtype=np.int64), ["Total"]
+        blocks.append(sparse.csr_matrix((np.ones(n, dtype=np.float64), (codes, np.arange(n))),
+                                        shape=(len(keys), n)))
+        labels.append(pd.DataFrame({"level": name, "key": keys}))
+    return sparse.vstack(blocks, format="csr"), pd.concat(labels, ignore_index=True)
+
+
+class WRMSSE:
+    def __init__(self, series: pd.DataFrame, train: np.ndarray, dollars: np.ndarray):
+        """
+        series:  bottom-level ids / hierarchy columns, one row per series
+        train:   (series x days) training sales, oldest day first
+        dollars: per-series dollar sales of the last 28 training days
+        """
+        self.ids = series["id"].astype(str).to_numpy()
+        self.A, self.labels = aggregation_matrix(series)
+        self.level_names = [name for name, _ in LEVELS]
+        self.level_codes = pd.Categorical(self.labels["level"], categories=self.level_names).codes
+
+        agg = np.asarray(self.A @ np.asarray(train, dtype=np.float64))
+        diffs = np.diff(agg, axis=1) ** 2
+        first = np.argmax(agg != 0, axis=1)  # leading zeros (series not on sale yet) don't count
+        counted = np.arange(diffs.shape[1])[None, :] >= first[:, None]
+        self.scale = (diffs * counted).sum(axis=1) / np.maximum(counted.sum(axis=1), 1)
+
+        # each level's weights sum to 1; the 12 levels count equally
+        total = float(np.sum(dollars)) or 1.0
+        self.weights = np.asarray(self.A @ np.asarray(dollars, dtype=np.float64)) / total / len(LEVELS)
+
+    @classmethod
+    def from_raw(cls, raw_dir: Path = RAW_PATH, start_day: Optional[int] = None, horizon: int = 28,
+                 ids: Optional[Sequence[str]] = None) -> Tuple["WRMSSE", Optional[np.ndarray], List[str]]:
+        """
+        Evaluator for forecasts of d_<start_day> .. d_<start_day + horizon - 1>
+        trained on the days before, plus the actuals of that window (None when
+        the sales files don't reach it) and the series ids in row order.
+        Defaults to the first day after sales_train_validation.csv; actuals are
+        read from sales_train_evaluation.csv when it covers more days.
+        """
+        raw_dir = Path(raw_dir)
+        path = raw_dir / "sales_train_validation.csv"
+        days = [c for c in pd.read_csv(path, nrows=0).columns if c.startswith("d_")]
+        start_day = int(days[-1][2:]) + 1 if start_day is None else start_day
+        window = [f"d_{start_day + h}" for h in range(horizon)]
+        if window[-1] not in days and (raw_dir / "sales_train_evaluation.csv").exists():
+            path = raw_dir / "sales_train_evaluation.csv"
+            days = [c for c in pd.read_csv(path, nrows=0).columns if c.startswith("d_")]
+        train_days = [d for d in days if int(d[2:]) < start_day]
+        has_actuals = window[-1] in days
+
+        sales = pd.read_csv(path, usecols=SERIES_COLS + train_days + (window if has_actuals else []))
+        if ids is not None:
+            sales = sales.set_index("id").loc[list(ids)].reset_index()
+        train = sales[train_days].to_numpy(dtype=np.float64)
+
+        # dollar sales of the last 28 training days: units x that week's price
+        calendar = pd.read_csv(raw_dir / "calendar.csv", usecols=["d", "wm_yr_wk"])
+        weight_days = train_days[-WEIGHT_DAYS:]
+        weeks = calendar.set_index("d").loc[weight_days, "wm_yr_wk"].to_numpy()
+        prices = pd.read_csv(raw_dir / "sell_prices.csv", dtype=PRICE_DTYPES)
+        prices = prices[prices["wm_yr_wk"].isin(set(weeks))].astype({"store_id": str, "item_id": str})
+        table = prices.pivot_table(index=["store_id", "item_id"], columns="wm_yr_wk", values="sell_price")
+        keys = pd.MultiIndex.from_arrays([sales["store_id"].astype(str), sales["item_id"].astype(str)])
+        price = table.reindex(index=keys, columns=weeks).to_numpy(dtype=np.float64)
+        dollars = np.nansum(sales[weight_days].to_numpy(dtype=np.float64) * price, axis=1)
+
+        actual = sales[window].to_numpy(dtype=np.float64) if has_actuals else None
+        return cls(sales[SERIES_COLS], train, dollars), actual, sales["id"].astype(str).tolist()
+
+    def breakdown(self, actual: np.ndarray, forecast: np.ndarray) -> pd.DataFrame:
+        """One row per aggregate series: weight, scale, RMSSE and its share of the WRMSSE."""
+        err = np.asarray(self.A @ (np.asarray(forecast, dtype=np.float64) - np.asarray(actual, dtype=np.float64)))
+        mse = np.mean(err ** 2, axis=1)
+        # a series that never changed has no scale; it also has no sales, hence no weight
+        rmsse = np.sqrt(np.divide(mse, self.scale, out=np.zeros_like(mse), where=self.scale > 0))
+        out = self.labels.copy()
+        out["weight"] = self.weights * len(LEVELS)
+        out["scale"] = self.scale
+        out["rmsse"] = rmsse
+        out["contribution"] = self.weights * rmsse
+        return out
+
+    def score(self, actual: np.ndarray, forecast: np.ndarray) -> dict:
+        """Overall WRMSSE and the WRMSSE of each level (their mean is the overall score)."""
+        contribution = self.weights * self.breakdown(actual, forecast)["rmsse"].to_numpy()
+        per_level = np.bincount(self.level_codes, weights=contribution, minlength=len(LEVELS)) * len(LEVELS)
+        return {
+            "wrmsse": float(contribution.sum()),
+            "levels": {name: float(v) for name, v in zip(self.level_names, per_level)},
+        }
+
+
+def forecast_matrix(frame: pd.DataFrame, ids: Sequence[str]) -> np.ndarray:
+    """
+    (series x horizon) matrix in `ids` order (NaN where missing) from either an
+    M5 submission frame (id, F1..Fh) or a long frame of item_id, store_id,
+    date, prediction (batch_score output).
+    """
+    if "F1" in frame.columns:
+        cols = sorted((c for c in frame.columns if c[:1] == "F" and c[1:].isdigit()), key=lambda c: int(c[1:]))
+        return frame.set_index(frame["id"].astype(str)).reindex(list(ids))[cols].to_numpy(dtype=np.float64)
+
+    suffix = str(ids[0]).rsplit("_", 1)[-1] if len(ids) else "validation"
+    series_id = frame["item_id"].astype(str) + "_" + frame["store_id"].astype(str) + "_" + suffix
+    wide = pd.DataFrame({"id": series_id, "date": pd.to_datetime(frame["date"]), "prediction": frame["prediction"]}) \
+        .pivot_table(index="id", columns="date", values="prediction", aggfunc="first").sort_index(axis=1)
+    return wide.reindex(list(ids)).to_numpy(dtype=np.float64)
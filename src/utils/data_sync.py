@@ -0,0 +1,249 @@
+# src/utils/data_sync.py
+"""
+Manifest-driven mirror of a storage prefix into a local directory, used by
+bootstrap_data.ensure_data on a cold container start.
+
+    python -m src.utils.data_sync --source-dir /mnt/m5 --prefixes raw/,processed/ --dest data
+    python -m src.utils.data_sync --account-url https://acct.blob.core.windows.net --container retail-forecasting
+
+Files are downloaded by a bounded thread pool sharing one backend client, in
+ranged chunks to `<file>.part`. An interrupted download resumes from the
+bytes already on disk when the remote version is unchanged (`<file>.part.json`
+records it). A finished file is checked against the remote size and MD5 (when
+the backend has one) before it is renamed into place, so a file at its final
+path is always complete. `<dest>/.sync_manifest.json` records the version,
+size and MD5 of every synced file; a file whose remote version and size match
+the manifest and whose local size is unchanged is skipped without reading it.
+
+Backends list (name, size, md5, version) and read byte ranges:
+LocalBackend mirrors a directory (offline runs, tests), AzureBackend a blob
+container. Leading "data/" in a remote name is dropped, so data/raw/x.csv
+lands in <dest>/raw/x.csv.
+"""
+import argparse
+import hashlib
+import json
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Iterable, Iterator, List, Optional
+
+MANIFEST_NAME = ".sync_manifest.json"
+CHUNK_SIZE = 8 * 2 ** 20
+WORKERS = 8
+RETRIES = 3
+
+
+@dataclass
+class RemoteFile:
+    name: str
+    size: int
+    md5: Optional[str]  # hex digest, None when the backend does not store one
+    version: str  # changes whenever the content does (etag, mtime)
+
+
+class LocalBackend:
+    """A directory as the remote store; `md5=True` hashes each file while listing."""
+
+    def __init__(self, root: Path, md5: bool = False):
+        self.root = Path(root)
+        self.md5 = md5
+
+    def list(self, prefix: str) -> Iterator[RemoteFile]:
+        base = self.root / prefix
+        paths = [base] if base.is_file() else sorted(p for p in base.rglob("*") if p.is_file())
+        for p in paths:
+            st = p.stat()
+            yield RemoteFile(p.relative_to(self.root).as_posix(), st.st_size,
+                             file_md5(p) if self.md5 else None, f"{st.st_size}-{st.st_mtime_ns}")
+
+    def read(self, name: str, offset: int, length: int) -> bytes:
+        with open(self.root / name, "rb") as f:
+            f.seek(offset)
+            return f.read(length)
+
+
+class AzureBackend:
+    """A blob container; one ContainerClient is shared by every download thread."""
+
+    def __init__(self, account_url: str, container: str, sas_token: Optional[str] = None):
+        from azure.storage.blob import BlobServiceClient
+
+        if sas_token:
+            print("[sync] Using SAS token for BlobServiceClient")
+            credential = sas_token
+        else:
+            from azure.identity import DefaultAzureCredential
+
+            print("[sync] Using DefaultAzureCredential for BlobServiceClient")
+            credential = DefaultAzureCredential(exclude_interactive_browser_credential=True)
+        self.client = BlobServiceClient(account_url=account_url, credential=credential).get_container_client(container)
+
+    def list(self, prefix: str) -> Iterator[RemoteFile]:
+        for blob in self.client.list_blobs(name_starts_with=prefix):
+            md5 = blob.content_settings.content_md5 if blob.content_settings else None
+            yield RemoteFile(blob.name, blob.size, bytes(md5).hex() if md5 else None, str(blob.etag))
+
+    def read(self, name: str, offset: int, length: int) -> bytes:
+        return self.client.download_blob(name, offset=offset, length=length).readall()
+
+
+def file_md5(path: Path, block: int = CHUNK_SIZE) -> str:
+    h = hashlib.md5()
+    with open(path, "rb") as f:
+        for buf in iter(lambda: f.read(block), b""):
+            h.update(buf)
+    return h.hexdigest()
+
+
+def local_path(dest: Path, name: str) -> Path:
+    parts = Path(name).parts
+    if parts and parts[0] == "data":
+        parts = parts[1:]
+    return dest.joinpath(*parts)
+
+
+def load_manifest(dest: Path) -> dict:
+    try:
+        with open(dest / MANIFEST_NAME, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def _write_json(path: Path, obj) -> None:
+    tmp = path.with_name(path.name + ".tmp")
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(obj, f, indent=2)
+    os.replace(tmp, path)
+
+
+def is_current(dest: Path, remote: RemoteFile, entry: Optional[dict]) -> bool:
+    if not entry or entry.get("version") != remote.version or entry.get("size") != remote.size:
+        return False
+    target = local_path(dest, remote.name)
+    return target.is_file() and target.stat().st_size == remote.size
+
+
+def _read_chunk(backend, name: str, offset: int, length: int) -> bytes:
+    for attempt in range(RETRIES):
+        try:
+            data = backend.read(name, offset, length)
+            if len(data) != length:
+                raise IOError(f"short read at {offset}: {len(data)} of {length} bytes")
+            return data
+        except Exception:
+            if attempt == RETRIES - 1:
+                raise
+            time.sleep(0.5 * 2 ** attempt)
+
+
+def download(backend, remote: RemoteFile, target: Path, chunk_size: int = CHUNK_SIZE) -> dict:
+    """Ranged download into target.part, resumed when the remote version is unchanged; verified, then renamed."""
+    target.parent.mkdir(parents=True, exist_ok=True)
+    part = target.with_name(target.name + ".part")
+    state = part.with_name(part.name + ".json")
+
+    resumed = 0
+    h = hashlib.md5()
+    try:
+        with open(state, "r", encoding="utf-8") as f:
+            same = json.load(f).get("version") == remote.version
+    except (OSError, ValueError):
+        same = False
+    if same and part.exists() and part.stat().st_size <= remote.size:
+        with open(part, "rb") as f:
+            for buf in iter(lambda: f.read(chunk_size), b""):
+                h.update(buf)
+        resumed = part.stat().st_size
+    else:
+        part.unlink(missing_ok=True)
+        _write_json(state, {"name": remote.name, "version": remote.version, "size": remote.size})
+
+    with open(part, "ab") as f:
+        for offset in range(resumed, remote.size, chunk_size):
+            data = _read_chunk(backend, remote.name, offset, min(chunk_size, remote.size - offset))
+            f.write(data)
+            f.flush()  # what is on disk is what a resume hashes and continues from
+            h.update(data)
+
+    size, md5 = part.stat().st_size, h.hexdigest()
+    if size != remote.size or (remote.md5 is not None and md5 != remote.md5):
+        part.unlink(missing_ok=True)
+        state.unlink(missing_ok=True)
+        raise IOError(f"{remote.name}: got {size} bytes md5 {md5}, expected {remote.size} bytes md5 {remote.md5}")
+    os.replace(part, target)
+    state.unlink(missing_ok=True)
+    return {"size": size, "md5": md5, "version": remote.version, "resumed_bytes": resumed}
+
+
+def sync(backend, prefixes: Iterable[str], dest: Path, workers: int = WORKERS, chunk_size: int = CHUNK_SIZE) -> dict:
+    """Mirror every file under `prefixes` into `dest`; returns counts, bytes and seconds."""
+    start = time.perf_counter()
+    dest = Path(dest)
+    dest.mkdir(parents=True, exist_ok=True)
+    manifest = load_manifest(dest)
+
+    remotes: List[RemoteFile] = [r for p in prefixes for r in backend.list(p) if not r.name.endswith("/")]
+    todo = [r for r in remotes if not is_current(dest, r, manifest.get(r.name))]
+    total = sum(r.size for r in todo)
+    print(f"[sync] {len(remotes)} files, {len(remotes) - len(todo)} up to date, "
+          f"{len(todo)} to download ({total / 2 ** 20:.1f} MB) with {workers} workers")
+
+    def fetch(remote: RemoteFile):
+        for attempt in range(2):  # a file that fails verification is fetched again from scratch
+            try:
+                return download(backend, remote, local_path(dest, remote.name), chunk_size)
+            except IOError:
+                if attempt == 1:
+                    raise
+
+    done_bytes, resumed, failed = 0, 0, []
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as pool:
+        futures = {pool.submit(fetch, r): r for r in todo}
+        for fut in as_completed(futures):
+            remote = futures[fut]
+            try:
+                entry = fut.result()
+            except Exception as e:
+                failed.append(remote.name)
+                print(f"[sync] FAILED {remote.name}: {e}")
+                continue
+            manifest[remote.name] = {k: entry[k] for k in ("size", "md5", "version")}
+            _write_json(dest / MANIFEST_NAME, manifest)  # progress survives a crash mid-sync
+            done_bytes += entry["size"]
+            resumed += entry["resumed_bytes"]
+            note = f" (resumed at {entry['resumed_bytes'] / 2 ** 20:.1f} MB)" if entry["resumed_bytes"] else ""
+            print(f"[sync] {remote.name} {entry['size'] / 2 ** 20:.1f} MB{note}")
+
+    seconds = time.perf_counter() - start
+    print(f"[sync] Downloaded {done_bytes / 2 ** 20:.1f} MB in {seconds:.1f}s "
+          f"({done_bytes / 2 ** 20 / seconds if seconds else 0:.1f} MB/s)")
+    if failed:
+        raise RuntimeError(f"{len(failed)} file(s) failed to sync: {failed[:10]}")
+    return {"files": len(remotes), "downloaded": len(todo), "skipped": len(remotes) - len(todo),
+            "bytes": done_bytes, "resumed_bytes": resumed, "seconds": round(seconds, 3)}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Mirror a storage prefix into a local directory")
+    parser.add_argument("--source-dir", type=Path, help="local directory to mirror (instead of Azure)")
+    parser.add_argument("--md5", action="store_true", help="hash local source files to verify downloads")
+    parser.add_argument("--account-url", default=os.environ.get("STORAGE_ACCOUNT_URL"))
+    parser.add_argument("--container", default=os.environ.get("BLOB_CONTAINER_NAME", "retail-forecasting"))
+    parser.add_argument("--prefixes", default="data/raw/,data/processed/")
+    parser.add_argument("--dest", type=Path, default=Path(__file__).resolve().parents[2] / "data")
+    parser.add_argument("--workers", type=int, default=WORKERS)
+    parser.add_argument("--chunk-mb", type=float, default=CHUNK_SIZE / 2 ** 20)
+    args = parser.parse_args()
+
+    if args.source_dir:
+        src = LocalBackend(args.source_dir, md5=args.md5)
+    elif args.account_url:
+        src = AzureBackend(args.account_url, args.container, os.environ.get("STORAGE_SAS_TOKEN"))
+    else:
+        parser.error("--source-dir or --account-url (STORAGE_ACCOUNT_URL) is required")
+    prefixes = [p.strip() for p in args.prefixes.split(",") if p.strip()]
+    sync(src, prefixes, args.dest, args.workers, int(args.chunk_mb * 2 ** 20))
@@ -0,0 +1,107 @@
+# src/utils/synthetic.py
+"""
+Synthetic M5-shaped data: calendar.csv / sales_train_validation.csv /
+sell_prices.csv frames with the real column names, id formats and hierarchy
+(3 states, 10 stores, 3 categories, 7 departments), at any number of series
+and days. For benchmarks and offline runs; the numbers are random.
+
+    calendar, sales, prices = make_m5(n_series=10_000, n_days=365)
+    write_m5(Path("/tmp/m5"), n_series=1000)
+"""
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+STORES = ["CA_1", "CA_2", "CA_3", "CA_4", "TX_1", "TX_2", "TX_3", "WI_1", "WI_2", "WI_3"]
+DEPTS = ["FOODS_1", "FOODS_2", "FOODS_3", "HOBBIES_1", "HOBBIES_2", "HOUSEHOLD_1", "HOUSEHOLD_2"]
+EVENTS = [("SuperBowl", "Sporting"), ("ValentinesDay", "Cultural"), ("Easter", "Cultural"),
+          ("Thanksgiving", "National"), ("Christmas", "National"), ("Ramadan starts", "Religious")]
+START_DATE = "2011-01-29"
+
+
+def make_calendar(n_days: int, start: str = START_DATE, seed: int = 0) -> pd.DataFrame:
+    rng = np.random.default_rng(seed)
+    dates = pd.date_range(start, periods=n_days, freq="D")
+    week = np.arange(n_days) // 7  # M5 weeks start on Saturday, like START_DATE
+    cal = pd.DataFrame({
+        "date": dates.strftime("%Y-%m-%d"),
+        "wm_yr_wk": 11101 + (week // 52) * 100 + week % 52,
+        "weekday": dates.day_name(),
+        "wday": (dates.dayofweek.to_numpy() + 2) % 7 + 1,
+        "month": dates.month,
+        "year": dates.year,
+        "d": [f"d_{i + 1}" for i in range(n_days)],
+    })
+    event = np.where(rng.random(n_days) < 0.03, rng.integers(0, len(EVENTS), n_days), -1)
+    cal["event_name_1"] = [EVENTS[e][0] if e >= 0 else None for e in event]
+    cal["event_type_1"] = [EVENTS[e][1] if e >= 0 else None for e in event]
+    cal["event_name_2"] = None
+    cal["event_type_2"] = None
+    for state, first in (("CA", 1), ("TX", 6), ("WI", 2)):
+        day = dates.day.to_numpy()
+        cal[f"snap_{state}"] = ((day >= first) & (day < first + 10)).astype(int)
+    return cal
+
+
+def make_sales(n_series: int, n_days: int, seed: int = 0) -> pd.DataFrame:
+    """Wide sales: one row per item x store (stores outermost, like M5), d_1..d_<n_days>."""
+    rng = np.random.default_rng(seed)
+    n_items = -(-n_series // len(STORES))
+    item_dept = np.array(DEPTS)[np.arange(n_items) % len(DEPTS)]
+    items = np.array([f"{d}_{i // len(DEPTS) + 1:03d}" for i, d in enumerate(item_dept)], dtype=object)
+    store = np.repeat(np.array(STORES, dtype=object), n_items)[:n_series]
+    item = np.tile(items, len(STORES))[:n_series]
+    dept = np.tile(item_dept.astype(object), len(STORES))[:n_series]
+    series = pd.DataFrame({
+        "id": item + "_" + store + "_validation",
+        "item_id": item,
+        "dept_id": dept,
+        "cat_id": [d.rsplit("_", 1)[0] for d in dept],
+        "store_id": store,
+        "state_id": [s.split("_")[0] for s in store],
+    })
+
+    # intermittent demand: per-series rate, weekly pattern, zeros before the launch day
+    rate = rng.lognormal(mean=0.0, sigma=1.0, size=n_series)[:, None]
+    weekly = 1.0 + 0.3 * np.sin(2 * np.pi * np.arange(n_days) / 7)[None, :]
+    units = rng.poisson(rate * weekly).astype(np.int32)
+    launch = np.where(rng.random(n_series) < 0.2, rng.integers(0, max(n_days // 2, 1), n_series), 0)
+    units[np.arange(n_days)[None, :] < launch[:, None]] = 0
+    days = pd.DataFrame(units, columns=[f"d_{i + 1}" for i in range(n_days)])
+    return pd.concat([series, days], axis=1)
+
+
+def make_prices(sales: pd.DataFrame, calendar: pd.DataFrame, seed: int = 0) -> pd.DataFrame:
+    """One price per (store, item, week) in the calendar, with occasional price changes."""
+    rng = np.random.default_rng(seed)
+    weeks = np.unique(calendar["wm_yr_wk"].to_numpy())
+    pairs = sales[["store_id", "item_id"]].drop_duplicates()
+    n = len(pairs)
+    base = np.round(rng.lognormal(mean=1.2, sigma=0.6, size=n), 2)
+    change = np.where(rng.random((n, len(weeks))) < 0.05, rng.uniform(0.8, 1.1, (n, len(weeks))), 1.0)
+    price = np.round(base[:, None] * np.cumprod(change, axis=1), 2)
+    return pd.DataFrame({
+        "store_id": np.repeat(pairs["store_id"].to_numpy(), len(weeks)),
+        "item_id": np.repeat(pairs["item_id"].to_numpy(), len(weeks)),
+        "wm_yr_wk": np.tile(weeks, n),
+        "sell_price": price.ravel(),
+    })
+
+
+def make_m5(n_series: int = 1000, n_days: int = 365, seed: int = 0):
+    """(calendar, sales, prices) frames shaped like the M5 raw files."""
+    calendar = make_calendar(n_days, seed=seed)
+    sales = make_sales(n_series, n_days, seed=seed)
+    return calendar, sales, make_prices(sales, calendar, seed=seed)
+
+
+def write_m5(out_dir: Path, n_series: int = 1000, n_days: int = 365, seed: int = 0) -> Path:
+    """Write the three frames under the M5 file names, e.g. as an offline data/raw."""
+    out_dir = Path(out_dir)
+    out_dir.mkdir(parents=True, exist_ok=True)
+    calendar, sales, prices = make_m5(n_series, n_days, seed)
+    calendar.to_csv(out_dir / "calendar.csv", index=False)
+    sales.to_csv(out_dir / "sales_train_validation.csv", index=False)
+    prices.to_csv(out_dir / "sell_prices.csv", index=False)
+    return out_dir
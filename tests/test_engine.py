@@ -0,0 +1,61 @@
+# tests/test_engine.py
+import numpy as np
+import pandas as pd
+import pytest
+
+from src.features.engine import build_lag_features, config_from_columns
+
+
+@pytest.fixture
+def sales():
+    """Long sales of series with different lengths and gaps, rows shuffled."""
+    rng = np.random.default_rng(0)
+    frames = []
+    for i, n_days in enumerate([60, 45, 3, 90]):
+        y = rng.poisson(3.0, n_days).astype(np.float64)
+        y[rng.random(n_days) < 0.1] = np.nan
+        frames.append(pd.DataFrame({"id": f"s{i}", "date": pd.date_range("2011-01-29", periods=n_days),
+                                    "sales": y}))
+    df = pd.concat(frames, ignore_index=True)
+    return df.sample(frac=1.0, random_state=0).reset_index(drop=True)
+
+
+def _reference(df, lags, windows, stats, spans):
+    """The same features with pandas groupby shift / rolling / ewm."""
+    ordered = df.sort_values(["id", "date"])
+    grouped = ordered.groupby("id")["sales"]
+    prev = grouped.shift(1)
+    out = {}
+    for k in lags:
+        out[f"lag_{k}"] = grouped.shift(k)
+    for w in windows:
+        rolled = prev.groupby(ordered["id"]).rolling(w)
+        for stat in stats:
+            out[f"rolling_{stat}_{w}"] = getattr(rolled, stat)().reset_index(level=0, drop=True)
+    for span in spans:
+        out[f"ewm_{span:g}"] = prev.groupby(ordered["id"]).transform(
+            lambda s: s.ewm(span=span, adjust=False, ignore_na=True).mean())
+    return {name: values.reindex(df.index).to_numpy() for name, values in out.items()}
+
+
+def test_matches_pandas_groupby(sales):
+    lags, windows, stats, spans = [1, 7, 28], [7, 28], ["mean", "std", "min", "max"], [7.0, 28.0]
+    got = build_lag_features(sales, lags=lags, windows=windows, stats=stats, ewm_spans=spans)
+    expected = _reference(sales, lags, windows, stats, spans)
+    assert set(got) == set(expected)
+    for name, values in expected.items():
+        np.testing.assert_allclose(got[name], values, rtol=1e-9, atol=1e-9, equal_nan=True, err_msg=name)
+
+
+def test_windows_stay_inside_series(sales):
+    got = build_lag_features(sales, lags=[1], windows=[3], stats=["mean"])
+    first = sales.groupby("id")["date"].transform("min") == sales["date"]
+    assert np.isnan(got["lag_1"][first.to_numpy()]).all()
+    # the 3-day series never has 3 earlier days
+    assert np.isnan(got["rolling_mean_3"][(sales["id"] == "s2").to_numpy()]).all()
+
+
+def test_config_from_columns():
+    columns = ["id", "sales", "lag_7", "lag_28", "rolling_mean_7", "rolling_std_7", "rolling_mean_28", "ewm_7"]
+    assert config_from_columns(columns) == {"lags": [7, 28], "windows": [7, 28], "stats": ["mean", "std"],
+                                            "ewm_spans": [7.0]}
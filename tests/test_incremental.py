@@ -0,0 +1,54 @@
+# tests/test_incremental.py
+import pandas as pd
+import pytest
+
+from src.etl.build_features import feature_engineering, melt_sales, merge_data
+from src.etl.incremental import init_state, update_features
+from src.features.schema import apply_compact_schema, read_features
+from src.utils.synthetic import write_m5
+
+CONFIG = {"lags": [1, 7, 14], "windows": [7, 14], "stats": ["mean", "std", "min", "max"], "ewm_spans": [7.0]}
+NEW_DAYS = 5
+
+
+def _full_build(raw_dir, drop_days=0):
+    """The in-memory build of build_features, optionally without the last `drop_days` sales days."""
+    calendar = pd.read_csv(raw_dir / "calendar.csv")
+    sales = pd.read_csv(raw_dir / "sales_train_validation.csv")
+    prices = pd.read_csv(raw_dir / "sell_prices.csv")
+    if drop_days:
+        sales = sales.iloc[:, :-drop_days]
+    df = apply_compact_schema(merge_data(melt_sales(sales), calendar, prices))
+    return apply_compact_schema(feature_engineering(df, CONFIG))
+
+
+def _sorted(df):
+    return df.sort_values(["id", "d"]).reset_index(drop=True)
+
+
+@pytest.fixture
+def workspace(tmp_path):
+    raw = write_m5(tmp_path / "raw", n_series=40, n_days=70)
+    processed = tmp_path / "processed"
+    processed.mkdir()
+    _full_build(raw, drop_days=NEW_DAYS).to_parquet(processed / "train_features.parquet", index=False)
+    return raw, processed, tmp_path / "state"
+
+
+def test_update_matches_full_rebuild(workspace):
+    raw, processed, state_dir = workspace
+    init_state(processed, raw, state_dir)
+    assert update_features(processed, raw, state_dir) == 40 * NEW_DAYS
+
+    got = _sorted(read_features(processed))
+    expected = _sorted(_full_build(raw))
+    assert list(got.columns) == list(expected.columns)
+    pd.testing.assert_frame_equal(got, expected, check_dtype=False, check_categorical=False)
+
+
+def test_update_is_idempotent(workspace):
+    raw, processed, state_dir = workspace
+    init_state(processed, raw, state_dir)
+    update_features(processed, raw, state_dir)
+    assert update_features(processed, raw, state_dir) == 0
+    assert len(read_features(processed, columns=["d"])) == 40 * 70
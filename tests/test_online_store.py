@@ -0,0 +1,52 @@
+# tests/test_online_store.py
+import json
+
+import numpy as np
+import pandas as pd
+
+from src.etl.build_features import feature_engineering, melt_sales, merge_data
+from src.features.online_store import OnlineFeatureStore
+from src.features.schema import apply_compact_schema
+from src.utils.synthetic import write_m5
+
+CONFIG = {"lags": [3, 7], "windows": [7], "stats": ["mean", "max"], "ewm_spans": [7.0]}
+AHEAD = 3
+
+
+def _build(raw_dir, drop_days=0):
+    calendar = pd.read_csv(raw_dir / "calendar.csv")
+    sales = pd.read_csv(raw_dir / "sales_train_validation.csv")
+    prices = pd.read_csv(raw_dir / "sell_prices.csv")
+    if drop_days:
+        sales = sales.iloc[:, :-drop_days]
+    df = apply_compact_schema(merge_data(melt_sales(sales), calendar, prices))
+    return apply_compact_schema(feature_engineering(df, CONFIG))
+
+
+def test_days_past_the_etl(tmp_path):
+    """Lags match the full table on every extra day, windows on the first one and are NaN after it."""
+    raw = write_m5(tmp_path / "raw", n_series=20, n_days=60)
+    processed = tmp_path / "processed"
+    processed.mkdir()
+    _build(raw, drop_days=AHEAD).to_parquet(processed / "train_features.parquet", index=False)
+    OnlineFeatureStore.build(processed, tmp_path / "store")
+    store = OnlineFeatureStore.load(tmp_path / "store")
+    assert store.end_day - store.last_day == AHEAD
+
+    windows = ["rolling_mean_7", "rolling_max_7", "ewm_7"]
+    assert json.loads((tmp_path / "store" / "store.json").read_text())["known_ahead"] == {
+        "lag_3": AHEAD, "lag_7": AHEAD, **{f: 1 for f in windows}}
+    assert store.missing_features([store.last_day + 1]) == []
+    assert sorted(store.missing_features([store.last_day + 1, store.last_day + 2])) == sorted(windows)
+
+    full = _build(raw)
+    for ahead in range(1, AHEAD + 1):
+        rows = full[full["date"] == store.date_of(store.last_day + ahead)]
+        row, col, _ = store.positions(rows["date"].astype(str), store_ids=rows["store_id"].astype(str),
+                                      item_ids=rows["item_id"].astype(str))
+        for f in store.features:
+            got = store.arrays[f][row, col]
+            if ahead > 1 and f in windows:
+                assert np.isnan(got).all(), f
+            else:
+                np.testing.assert_allclose(got, rows[f].to_numpy(), rtol=1e-5, equal_nan=True, err_msg=f)
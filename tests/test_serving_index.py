@@ -0,0 +1,113 @@
+# tests/test_serving_index.py
+import numpy as np
+import pandas as pd
+import pytest
+
+from src.features.serving_index import ServingIndex
+from src.utils.synthetic import write_m5
+
+TRAIN_COLS = ["item_id", "dept_id", "cat_id", "store_id", "state_id", "wm_yr_wk", "weekday", "wday", "month",
+              "year", "event_name_1", "event_type_1", "event_name_2", "event_type_2", "snap_CA", "snap_TX",
+              "snap_WI", "sell_price", "dayofweek", "quarter", "date_year", "date_month", "date_day"]
+
+
+def preprocess_reference(raw_df, calendar, sell_prices, item_to_meta, cat_maps):
+    """The original pandas preprocess_input of app_nolag.py, kept as the reference."""
+    df = raw_df.copy()
+    df["date"] = pd.to_datetime(df["date"])
+
+    def fill_meta_row(row):
+        item = row.get("item_id")
+        if item in item_to_meta:
+            row["dept_id"] = item_to_meta[item]["dept_id"]
+            row["cat_id"] = item_to_meta[item]["cat_id"]
+            row["state_id"] = item_to_meta[item]["state_id"]
+            row["store_id"] = row.get("store_id", item_to_meta[item]["store_id"])
+        return row
+    df = df.apply(fill_meta_row, axis=1)
+
+    cal = calendar.copy()
+    cal["date"] = pd.to_datetime(cal["date"])
+    df = df.merge(cal, on="date", how="left")
+    df = df.merge(sell_prices, on=["store_id", "item_id", "wm_yr_wk"], how="left")
+
+    df["date_year"] = df["date"].dt.year
+    df["date_month"] = df["date"].dt.month
+    df["date_day"] = df["date"].dt.day
+    df["dayofweek"] = df["date"].dt.dayofweek
+    df["quarter"] = df["date"].dt.quarter
+    df["wday"] = df["date"].dt.weekday
+    df["sell_price"] = df["sell_price"].fillna(-1)
+
+    for col, levels in cat_maps.items():
+        if col in df.columns:
+            # = pd.Categorical(values, categories=levels).codes, without the unknown-value deprecation
+            df[col] = pd.Index(levels).get_indexer(df[col].astype(str))
+        else:
+            df[col] = -1
+    for m in [c for c in TRAIN_COLS if c not in df.columns]:
+        df[m] = -1
+    return df[TRAIN_COLS].to_numpy(dtype=np.float64)
+
+
+@pytest.fixture(scope="module")
+def sources(tmp_path_factory):
+    raw = write_m5(tmp_path_factory.mktemp("raw"), n_series=40, n_days=60)
+    calendar = pd.read_csv(raw / "calendar.csv")
+    sell_prices = pd.read_csv(raw / "sell_prices.csv")
+    sales = pd.read_csv(raw / "sales_train_validation.csv")
+    item_meta = sales[["item_id", "dept_id", "cat_id", "store_id", "state_id"]].drop_duplicates(subset=["item_id"])
+    items = sorted(item_meta["item_id"])
+    # trained on part of the data: one item and most stores have no category level
+    cat_maps = {
+        "item_id": items[:-1],
+        "dept_id": sorted(sales["dept_id"].unique()),
+        "cat_id": sorted(sales["cat_id"].unique()),
+        "store_id": ["CA_1", "CA_2"],
+        "state_id": ["CA", "TX"],
+        "weekday": sorted(calendar["weekday"].unique()),
+    }
+    for col in ["event_name_1", "event_type_1", "event_name_2", "event_type_2"]:
+        cat_maps[col] = sorted(calendar[col].dropna().unique())
+    index = ServingIndex.build(calendar, sell_prices, item_meta, cat_maps)
+    item_to_meta = item_meta.set_index("item_id").to_dict(orient="index")
+    return index, calendar, sell_prices, item_to_meta, cat_maps, items
+
+
+def _check(sources, rows):
+    index, calendar, sell_prices, item_to_meta, cat_maps, _ = sources
+    raw_df = pd.DataFrame(rows)
+    expected = preprocess_reference(raw_df, calendar, sell_prices, item_to_meta, cat_maps)
+    store_ids = raw_df["store_id"] if "store_id" in raw_df.columns else [None] * len(raw_df)
+    got = index.transform(store_ids, raw_df["item_id"], raw_df["date"], TRAIN_COLS)
+    np.testing.assert_array_equal(got, expected)
+
+    plan = index.row_plan(TRAIN_COLS)
+    for i, row in enumerate(rows):
+        out = index.fill_row(plan, row.get("store_id"), row["item_id"], row["date"], np.empty(len(TRAIN_COLS)))
+        np.testing.assert_array_equal(out, expected[i], err_msg=str(row))
+
+
+def test_matches_reference(sources):
+    items = sources[-1]
+    rows = [{"store_id": store, "item_id": item, "date": date}
+            for store in ["CA_1", "CA_2", "TX_1", "WI_3"]
+            for item in items
+            for date in ["2011-01-29", "2011-02-15", "2011-03-29"]]
+    _check(sources, rows)
+
+
+def test_unknown_store_item_and_date(sources):
+    items = sources[-1]
+    _check(sources, [
+        {"store_id": "XX_9", "item_id": items[0], "date": "2011-02-01"},     # unknown store
+        {"store_id": "CA_1", "item_id": "FOODS_9_999", "date": "2011-02-01"},  # unknown item
+        {"store_id": "CA_1", "item_id": items[-1], "date": "2011-02-01"},    # item without a trained level
+        {"store_id": "CA_1", "item_id": items[0], "date": "2010-12-31"},     # before the calendar
+        {"store_id": "CA_1", "item_id": items[0], "date": "2016-06-19"},     # after the calendar
+    ])
+
+
+def test_missing_store_uses_item_store(sources):
+    items = sources[-1]
+    _check(sources, [{"item_id": item, "date": "2011-03-01"} for item in items])
@@ -0,0 +1,68 @@
+# tests/test_wrmsse.py
+import numpy as np
+import pandas as pd
+import pytest
+
+from src.models.wrmsse import LEVELS, WRMSSE, aggregation_matrix
+
+
+def _series(rows):
+    return pd.DataFrame(rows, columns=["id", "item_id", "dept_id", "cat_id", "store_id", "state_id"])
+
+
+@pytest.fixture
+def evaluator():
+    """Two items of one department in one store: every level above the item is their sum."""
+    series = _series([
+        ["A_CA_1_validation", "A", "FOODS_1", "FOODS", "CA_1", "CA"],
+        ["B_CA_1_validation", "B", "FOODS_1", "FOODS", "CA_1", "CA"],
+    ])
+    train = np.array([
+        [1, 2, 1, 2],  # one-day changes 1, -1, 1                   -> scale 1
+        [0, 2, 4, 2],  # on sale from day 2: changes 2, -2          -> scale 4
+    ])                 # total 1, 4, 5, 4: changes 3, 1, -1         -> scale 11/3
+    dollars = np.array([3.0, 1.0])
+    return WRMSSE(series, train, dollars)
+
+
+def test_scales_and_weights(evaluator):
+    table = evaluator.breakdown(np.zeros((2, 2)), np.zeros((2, 2)))
+    scale = table.set_index(["level", "key"])["scale"]
+    assert scale[("total", "Total")] == pytest.approx(11 / 3)
+    assert scale[("item", "A")] == pytest.approx(1.0)
+    assert scale[("item", "B")] == pytest.approx(4.0)
+    # weights sum to 1 within every level
+    assert table.groupby("level")["weight"].sum().to_numpy() == pytest.approx(np.ones(len(LEVELS)))
+    assert table.set_index(["level", "key"])["weight"][("item_store", "A_CA_1")] == pytest.approx(0.75)
+
+
+def test_hand_computed_score(evaluator):
+    actual = np.array([[2, 2], [2, 2]])
+    forecast = np.array([[3, 1], [4, 2]])
+    # item A: errors 1, -1 -> mse 1 -> rmsse 1; item B: errors 2, 0 -> mse 2 -> rmsse sqrt(2/4)
+    # total: errors 3, -1 -> mse 5 -> rmsse sqrt(5 / (11/3))
+    total = np.sqrt(15 / 11)
+    item = 0.75 * 1.0 + 0.25 * np.sqrt(0.5)
+    result = evaluator.score(actual, forecast)
+    assert result["levels"]["total"] == pytest.approx(total)
+    assert result["levels"]["store_dept"] == pytest.approx(total)
+    assert result["levels"]["item_store"] == pytest.approx(item)
+    assert result["wrmsse"] == pytest.approx((9 * total + 3 * item) / 12)
+    assert evaluator.score(actual, actual)["wrmsse"] == 0.0
+
+
+def test_aggregation_matrix():
+    series = _series([
+        ["A_CA_1_validation", "A", "FOODS_1", "FOODS", "CA_1", "CA"],
+        ["A_TX_1_validation", "A", "FOODS_1", "FOODS", "TX_1", "TX"],
+        ["B_TX_1_validation", "B", "HOBBIES_1", "HOBBIES", "TX_1", "TX"],
+    ])
+    A, labels = aggregation_matrix(series)
+    counts = labels["level"].value_counts()
+    assert counts["total"] == 1 and counts["state"] == 2 and counts["item"] == 2 and counts["item_store"] == 3
+    # every level covers every bottom series exactly once
+    for name, _ in LEVELS:
+        rows = A[(labels["level"] == name).to_numpy()]
+        assert rows.sum(axis=0).tolist() == [[1, 1, 1]]
+    item_a = A[((labels["level"] == "item") & (labels["key"] == "A")).to_numpy()].toarray()
+    assert item_a.tolist() == [[1, 1, 0]]